@@ -0,0 +1,231 @@
+# analytics.py
+
+import datetime
+import json
+from collections import Counter
+
+ALL_TAGS = '*'  # Псевдотег для итогов по всем задачам (задача с несколькими тегами учитывается один раз)
+NO_TAG = ''     # Задачи без тегов
+REFRESH_BATCH_SIZE = 500
+
+# Показатели сводной таблицы stats_daily
+METRIC_CREATED = 'created'
+METRIC_COMPLETED = 'completed'
+METRIC_OVERDUE = 'overdue_delta'  # +1 в день, когда задача стала просроченной, -1 в день ее запоздалого завершения
+
+
+def _day(value):
+    """Дата в формате YYYY-MM-DD из строки даты/времени или None."""
+    try:
+        return datetime.date.fromisoformat(value[:10]).isoformat() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _next_day(day):
+    return (datetime.date.fromisoformat(day) + datetime.timedelta(days=1)).isoformat()
+
+
+def task_contributions(task, completed_at):
+    """Вклад одной задачи в сводную таблицу: список (тег, день, показатель, +1/-1)."""
+    tags = [tag.strip() for tag in (task['tags'] or '').split(',') if tag.strip()] or [NO_TAG]
+    created_day = _day(task['created_at'])
+    done_day = _day(completed_at) or created_day if task['is_completed'] else None
+    due_day = _day(task['due_date'])
+
+    facts = []
+    if created_day:
+        facts.append((created_day, METRIC_CREATED, 1))
+    if done_day:
+        facts.append((done_day, METRIC_COMPLETED, 1))
+    # Серия повторяющейся задачи не бывает просроченной: просрочиваются ее вхождения
+    if due_day and not task['recurrence_rule']:
+        if not done_day or done_day > due_day:
+            facts.append((_next_day(due_day), METRIC_OVERDUE, 1))
+        if done_day and done_day > due_day:
+            facts.append((done_day, METRIC_OVERDUE, -1))
+    return [[tag, day, metric, delta] for tag in tags + [ALL_TAGS] for day, metric, delta in facts]
+
+
+class TaskAnalytics:
+    """Материализованные сводки по задачам: количество по тегу × дню × показателю.
+
+    Сводка обновляется инкрементально по журналу изменений: пересчитывается
+    вклад только тех задач, что менялись после последнего водяного знака.
+    Запросы за год читают тысячи строк сводки, а не все задачи.
+    """
+    def __init__(self, conn, changelog, archive, readonly=False):
+        self.conn = conn
+        self.changelog = changelog
+        self.archive = archive
+        self.readonly = readonly
+
+    def create_schema(self):
+        """Создает сводную таблицу, таблицу вкладов задач и состояние обновления."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                tag TEXT NOT NULL,
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (tag, metric, day)
+            ) WITHOUT ROWID
+        ''')
+        # Последний учтенный вклад каждой задачи: его вычитают перед добавлением нового
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_members (
+                task_id INTEGER PRIMARY KEY,
+                contributions TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def watermark(self):
+        """Номер изменения журнала, до которого учтена сводка (None — сводка еще не построена)."""
+        row = self.conn.execute("SELECT value FROM stats_state WHERE key = 'last_seq'").fetchone()
+        return row[0] if row else None
+
+    def reset(self):
+        """Сбрасывает водяной знак: следующий refresh() пересчитает сводку целиком."""
+        with self.conn:
+            self.conn.execute("DELETE FROM stats_state WHERE key = 'last_seq'")
+
+    def refresh(self):
+        """Догоняет сводку до текущего состояния журнала; возвращает число пересчитанных задач."""
+        if self.readonly:
+            return 0
+        watermark = self.watermark()
+        last_seq = self.changelog.last_seq()
+        if watermark is None:
+            return self.rebuild()
+        if last_seq <= watermark:
+            return 0
+        changed = [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT task_id FROM task_changes WHERE seq > ? AND seq <= ?", (watermark, last_seq))]
+        with self.conn:
+            for start in range(0, len(changed), REFRESH_BATCH_SIZE):
+                self._apply(changed[start:start + REFRESH_BATCH_SIZE])
+            self._set_watermark(last_seq)
+        return len(changed)
+
+    def rebuild(self):
+        """Полностью пересчитывает сводку (первый запуск на существующей БД)."""
+        last_seq = self.changelog.last_seq()
+        with self.conn:
+            self.conn.execute("DELETE FROM stats_daily")
+            self.conn.execute("DELETE FROM stats_members")
+            ids = [row[0] for row in self.conn.execute(f"SELECT id FROM {self.archive.union_source()}")]
+            for start in range(0, len(ids), REFRESH_BATCH_SIZE):
+                self._apply(ids[start:start + REFRESH_BATCH_SIZE])
+            self._set_watermark(last_seq)
+        return len(ids)
+
+    def _set_watermark(self, seq):
+        self.conn.execute("INSERT OR REPLACE INTO stats_state (key, value) VALUES ('last_seq', ?)", (seq,))
+
+    def _apply(self, task_ids):
+        """Заменяет вклад задач task_ids в сводке на вычисленный по их текущему состоянию."""
+        placeholders = ", ".join("?" for _ in task_ids)
+        tasks = {row['id']: row for row in self.conn.execute(
+            f"SELECT id, tags, created_at, due_date, is_completed, recurrence_rule "
+            f"FROM {self.archive.union_source()} WHERE id IN ({placeholders})", task_ids)}
+        completed_at = dict(self.conn.execute(f'''
+            SELECT task_id, MAX(changed_at) FROM task_changes
+            WHERE field = 'is_completed' AND new_value = 1 AND task_id IN ({placeholders})
+            GROUP BY task_id
+        ''', task_ids).fetchall())
+        old = dict(self.conn.execute(
+            f"SELECT task_id, contributions FROM stats_members WHERE task_id IN ({placeholders})", task_ids).fetchall())
+
+        delta = Counter()
+        members = []
+        for task_id in task_ids:
+            for tag, day, metric, value in json.loads(old.get(task_id, '[]')):
+                delta[(tag, day, metric)] -= value
+            if task_id in tasks:
+                new = task_contributions(tasks[task_id], completed_at.get(task_id))
+                for tag, day, metric, value in new:
+                    delta[(tag, day, metric)] += value
+                members.append((task_id, json.dumps(new, ensure_ascii=False)))
+
+        self.conn.executemany("DELETE FROM stats_members WHERE task_id = ?", [(task_id,) for task_id in task_ids])
+        self.conn.executemany("INSERT INTO stats_members (task_id, contributions) VALUES (?, ?)", members)
+        self.conn.executemany('''
+            INSERT INTO stats_daily (tag, day, metric, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (tag, metric, day) DO UPDATE SET count = count + excluded.count
+        ''', [(tag, day, metric, value) for (tag, day, metric), value in delta.items() if value])
+        self.conn.execute("DELETE FROM stats_daily WHERE count = 0")
+
+    def tags(self):
+        """Теги, встречающиеся в сводке."""
+        self.refresh()
+        rows = self.conn.execute(
+            "SELECT DISTINCT tag FROM stats_daily WHERE tag NOT IN (?, ?) ORDER BY tag", (ALL_TAGS, NO_TAG))
+        return [row[0] for row in rows]
+
+    def weekly_completion(self, start_date, end_date, tag=ALL_TAGS, window_weeks=4):
+        """Создано и завершено по неделям, доля завершения и скользящее среднее за window_weeks недель."""
+        self.refresh()
+        rows = self.conn.execute('''
+            WITH weekly AS (
+                SELECT date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days') AS week,
+                       SUM(CASE WHEN metric = 'created' THEN count ELSE 0 END) AS created,
+                       SUM(CASE WHEN metric = 'completed' THEN count ELSE 0 END) AS completed
+                FROM stats_daily
+                WHERE tag = ? AND metric IN ('created', 'completed') AND day BETWEEN ? AND ?
+                GROUP BY week
+            )
+            SELECT week, created, completed,
+                   SUM(completed) OVER recent * 1.0 / NULLIF(SUM(created) OVER recent, 0) AS rolling_rate
+            FROM weekly
+            WINDOW recent AS (ORDER BY week ROWS BETWEEN ? PRECEDING AND CURRENT ROW)
+            ORDER BY week
+        ''', (tag, start_date, end_date, window_weeks - 1))
+        return [dict(row, rate=row['completed'] / row['created'] if row['created'] else None) for row in rows]
+
+    def overdue_trend(self, start_date, end_date, tag=ALL_TAGS):
+        """Число просроченных незавершенных задач на каждый день периода (нарастающий итог)."""
+        self.refresh()
+        rows = self.conn.execute('''
+            SELECT day, backlog FROM (
+                SELECT day, SUM(SUM(count)) OVER (ORDER BY day) AS backlog
+                FROM stats_daily
+                WHERE tag = ? AND metric = 'overdue_delta' AND day <= ?
+                GROUP BY day
+            ) WHERE day >= ?
+        ''', (tag, end_date, start_date))
+        changes = dict(rows.fetchall())
+        before = self.conn.execute('''
+            SELECT COALESCE(SUM(count), 0) FROM stats_daily
+            WHERE tag = ? AND metric = 'overdue_delta' AND day < ?
+        ''', (tag, start_date)).fetchone()[0]
+        # Дни без изменений наследуют значение предыдущего дня
+        trend, current = [], before
+        day = datetime.date.fromisoformat(start_date)
+        last = datetime.date.fromisoformat(end_date)
+        while day <= last:
+            current = changes.get(day.isoformat(), current)
+            trend.append((day.isoformat(), current))
+            day += datetime.timedelta(days=1)
+        return trend
+
+    def tag_summary(self, start_date, end_date):
+        """Итоги по тегам за период, отсортированные по числу завершенных задач."""
+        self.refresh()
+        rows = self.conn.execute('''
+            SELECT tag,
+                   SUM(CASE WHEN metric = 'created' THEN count ELSE 0 END) AS created,
+                   SUM(CASE WHEN metric = 'completed' THEN count ELSE 0 END) AS completed,
+                   RANK() OVER (ORDER BY SUM(CASE WHEN metric = 'completed' THEN count ELSE 0 END) DESC) AS place
+            FROM stats_daily
+            WHERE tag != ? AND metric IN ('created', 'completed') AND day BETWEEN ? AND ?
+            GROUP BY tag
+            ORDER BY place, tag
+        ''', (ALL_TAGS, start_date, end_date))
+        return [dict(row) for row in rows]
@@ -0,0 +1,151 @@
+# api_loadtest.py
+
+"""Нагрузочный тест API-сервера: пропускная способность и хвостовые задержки.
+
+Запуск (сервер должен быть запущен):
+    python api_loadtest.py --port 8765 --clients 32 --duration 10 --write-ratio 0.1
+
+Воспроизводимая БД для замеров (задачи с длинными сжатыми деталями):
+    python api_loadtest.py --make-db bench.db --tasks 12000 --details-words 800
+    python api_server.py --db bench.db --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from database import DatabaseManager
+from details_store import make_preview
+
+# Словарь для названий и деталей задач тестовой БД
+BENCH_WORDS = "план встреча отчет задача проект идея заметка код ревью релиз".split()
+
+
+def make_database(path, tasks, details_words, seed=1):
+    """Создает БД для замеров: каждая десятая задача важная, детали — details_words слов."""
+    rng = random.Random(seed)
+    details = [" ".join(rng.choice(BENCH_WORDS) for _ in range(details_words)) for _ in range(tasks)]
+    db = DatabaseManager(path)
+    try:
+        with db.conn:
+            first_id = db.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM tasks").fetchone()[0]
+            db.conn.executemany(
+                "INSERT INTO tasks (title, details_preview, tags, is_important, created_at) "
+                "VALUES (?, ?, ?, ?, '2026-01-01T00:00:00')",
+                [(f"Задача {i}", make_preview(details[i]), rng.choice(["loadtest", "work", "home"]), i % 10 == 0)
+                 for i in range(tasks)])
+            db.details.insert_many((first_id + i, text) for i, text in enumerate(details))
+    finally:
+        db.close()
+
+
+async def open_client(host, port):
+    return await asyncio.open_connection(host, port)
+
+
+async def rpc(reader, writer, payload):
+    """Отправляет запрос JSON-RPC по keep-alive соединению и читает ответ."""
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(b"POST /rpc HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    await reader.readline()  # Строка статуса
+    length = 0
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+def make_request(request_id, write_ratio):
+    """Случайный запрос из типичной смеси: списки, поиск, теги и изредка запись."""
+    if random.random() < write_ratio:
+        return {"jsonrpc": "2.0", "id": request_id, "method": "add_task",
+                "params": {"title": f"Нагрузочная задача {request_id}", "tags": "loadtest"}}
+    method, params = random.choice([
+        ("get_tasks", {"filter_by": "important"}),
+        ("get_tasks", {"filter_by": "tag", "value": "loadtest", "limit": 50}),
+        ("search_tasks", {"query": "задача"}),
+        ("get_tags_with_counts", {}),
+    ])
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+
+
+async def client_loop(host, port, deadline, write_ratio, batch, latencies, errors):
+    reader, writer = await open_client(host, port)
+    request_id = 0
+    try:
+        while time.perf_counter() < deadline:
+            requests = [make_request(request_id + i, write_ratio) for i in range(batch)]
+            request_id += batch
+            payload = requests if batch > 1 else requests[0]
+            started = time.perf_counter()
+            response = await rpc(reader, writer, payload)
+            latencies.append(time.perf_counter() - started)
+            for item in response if isinstance(response, list) else [response]:
+                if 'error' in item:
+                    errors.append(item['error'])
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(host, port, clients, duration, write_ratio, batch):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client_loop(host, port, deadline, write_ratio, batch, latencies, errors)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    requests = len(latencies)
+    return {
+        "http_requests": requests,
+        "rpc_calls": requests * batch,
+        "elapsed": elapsed,
+        "throughput": requests * batch / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API-сервера Zettelkasten")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=16, help="число параллельных соединений")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность теста, сек")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="доля запросов на запись")
+    parser.add_argument("--batch", type=int, default=1, help="вызовов JSON-RPC в одном HTTP-запросе")
+    parser.add_argument("--make-db", metavar="PATH", help="создать БД для замеров и выйти")
+    parser.add_argument("--tasks", type=int, default=12000, help="число задач в БД для замеров")
+    parser.add_argument("--details-words", type=int, default=800, help="длина деталей задачи в словах")
+    args = parser.parse_args()
+
+    if args.make_db:
+        make_database(args.make_db, args.tasks, args.details_words)
+        print(f"БД для замеров создана: {args.make_db} ({args.tasks} задач)")
+        return
+
+    stats = asyncio.run(run(args.host, args.port, args.clients, args.duration, args.write_ratio, args.batch))
+    print(f"HTTP-запросов: {stats['http_requests']}, вызовов RPC: {stats['rpc_calls']} за {stats['elapsed']:.1f} с")
+    print(f"Пропускная способность: {stats['throughput']:.0f} вызовов/с")
+    print(f"Задержка: p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс, "
+          f"p99 {stats['p99_ms']:.1f} мс, макс. {stats['max_ms']:.1f} мс")
+    print(f"Ошибок: {stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# api_server.py
+
+"""Локальный API-сервер (JSON-RPC 2.0 поверх HTTP/1.1) для доступа к задачам из других программ.
+
+Запуск:  python api_server.py --db zettelkasten.db --port 8765
+
+POST /rpc           — JSON-RPC 2.0, одиночный запрос или пакет (массив запросов)
+GET  /tasks?filter_by=...&value=...   — потоковая выгрузка задач (NDJSON, chunked)
+GET  /health        — проверка доступности
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import threading
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+from database import DatabaseManager
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_READERS = 4
+STREAM_PAGE_SIZE = 500
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# Коды ошибок JSON-RPC 2.0
+PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, INTERNAL_ERROR = -32700, -32600, -32601, -32602, -32603
+
+
+def _report(db, start_date, end_date, completed_only=False):
+    filter_by = 'completed_between' if completed_only else 'date_range'
+    return db.load_details(db.get_tasks(filter_by=filter_by, start_date=start_date, end_date=end_date))
+
+
+# Методы API: имя -> (выполняется писателем?, функция(db, **params))
+METHODS = {
+    'get_tasks': (False, lambda db, filter_by='all', value=None, start_date=None, end_date=None, limit=None:
+                  db.get_tasks(filter_by, value, start_date, end_date, limit)),
+    'get_task': (False, lambda db, task_id: db.get_task_by_id(task_id)),
+    'search_tasks': (False, lambda db, query: db.search_tasks(query)),
+    'get_tags_with_counts': (False, lambda db: dict(db.get_tags_with_counts())),
+    'get_smart_view_counts': (False, lambda db, today=None: db.smart_views.counts(today)),
+    'get_reminders': (False, lambda db, task_id: db.get_reminders_for_task(task_id)),
+    'get_due_reminders': (False, lambda db, now: db.get_due_reminders(now)),
+    'get_report': (False, _report),
+    'get_changes': (False, lambda db, since_seq=0, limit=1000:
+                    [change for change, _ in zip(db.changelog.iter_changes(since_seq), range(limit))]),
+    'get_backlinks': (False, lambda db, task_id: db.links.get_backlinks(task_id)),
+    'add_task': (True, DatabaseManager.add_task),
+    'update_task': (True, lambda db, task_id, data: db.update_task(task_id, data)),
+    'update_task_status': (True, lambda db, task_id, is_completed: db.update_task_status(task_id, is_completed)),
+    'update_task_importance': (True, lambda db, task_id, is_important: db.update_task_importance(task_id, is_important)),
+    'complete_occurrence': (True, lambda db, series_id, occurrence_date: db.complete_occurrence(series_id, occurrence_date)),
+    'add_reminder': (True, lambda db, task_id, reminder_datetime: db.add_reminder(task_id, reminder_datetime)),
+    'delete_reminder': (True, lambda db, reminder_id: db.delete_reminder(reminder_id)),
+    'replace_reminders': (True, lambda db, task_id, datetimes: db.replace_all_reminders_for_task(task_id, datetimes)),
+}
+# Сигнатуры методов: параметры запроса проверяются до вызова
+SIGNATURES = {name: inspect.signature(func) for name, (_, func) in METHODS.items()}
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class TaskStore:
+    """Пул читающих соединений и единственный писатель поверх DatabaseManager.
+
+    Каждый поток пула держит собственное соединение (sqlite3 не разделяет
+    соединения между потоками); все записи сериализуются в одном потоке.
+    """
+    def __init__(self, db_name, readers=DEFAULT_READERS):
+        self.db_name = db_name
+        self._local = threading.local()
+        # Писатель создается первым: он выполняет миграции, которые нужны читателям
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer",
+                                         initializer=self._open, initargs=(False,))
+        self.writer.submit(lambda: None).result()
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader",
+                                          initializer=self._open, initargs=(True,))
+
+    def _open(self, readonly):
+        """Открывает соединение текущего потока; оно закрывается вместе с потоком."""
+        self._local.db = DatabaseManager(self.db_name, readonly=readonly)
+
+    def _call(self, func, params):
+        db = self._local.db
+        if isinstance(params, dict):
+            return func(db, **params)
+        return func(db, *params)
+
+    async def call(self, method, params):
+        """Выполняет метод API в нужном пуле и возвращает результат."""
+        if method not in METHODS:
+            raise RpcError(METHOD_NOT_FOUND, f"Метод не найден: {method}")
+        is_write, func = METHODS[method]
+        params = {} if params is None else params
+        self._check_params(method, params)
+        executor = self.writer if is_write else self.readers
+        loop = asyncio.get_running_loop()
+        # Ошибки внутри метода (в том числе TypeError) — внутренние, а не ошибки параметров
+        return await loop.run_in_executor(executor, self._call, func, params)
+
+    @staticmethod
+    def _check_params(method, params):
+        """Сверяет параметры запроса с сигнатурой метода; первый аргумент — соединение."""
+        try:
+            if isinstance(params, dict):
+                SIGNATURES[method].bind(None, **params)
+            elif isinstance(params, list):
+                SIGNATURES[method].bind(None, *params)
+            else:
+                raise TypeError("params должен быть объектом или массивом")
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e)) from e
+
+    async def stream_tasks(self, filter_args, page_size=STREAM_PAGE_SIZE):
+        """Асинхронно отдает страницы задач; поток-читатель ждет, пока клиент заберет страницу."""
+        loop = asyncio.get_running_loop()
+        pages = asyncio.Queue(maxsize=2)
+        done = object()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for page in self._local.db.iter_tasks(page_size=page_size, **filter_args):
+                    if cancelled.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(pages.put(page), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(pages.put(done), loop).result()
+
+        producer = loop.run_in_executor(self.readers, produce)
+        try:
+            while (page := await pages.get()) is not done:
+                yield page
+        finally:
+            # Клиент отключился: освобождаем поток-читатель, который может ждать места в очереди
+            cancelled.set()
+            while not producer.done():
+                while not pages.empty():
+                    pages.get_nowait()
+                await asyncio.sleep(0.01)
+
+    def close(self):
+        self.readers.shutdown(wait=True)
+        self.writer.shutdown(wait=True)
+
+
+class ApiServer:
+    """Минимальный HTTP/1.1 сервер на asyncio с поддержкой keep-alive."""
+    def __init__(self, store):
+        self.store = store
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, 413, {"error": "Слишком большой запрос"})
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.route(writer, method, target, body)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, target, body):
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/health':
+            await self._send(writer, 200, {"status": "ok"})
+        elif method == 'POST' and url.path == '/rpc':
+            await self._send(writer, 200, await self.handle_rpc(body))
+        elif method == 'GET' and url.path == '/tasks':
+            await self._stream_tasks(writer, dict(parse_qsl(url.query)))
+        else:
+            await self._send(writer, 404, {"error": "Не найдено"})
+
+    async def handle_rpc(self, body):
+        """Обрабатывает одиночный или пакетный запрос JSON-RPC."""
+        try:
+            payload = json.loads(body or b'null')
+        except json.JSONDecodeError:
+            return self._error(None, PARSE_ERROR, "Некорректный JSON")
+        if isinstance(payload, list):
+            if not payload:
+                return self._error(None, INVALID_REQUEST, "Пустой пакет")
+            # Чтения из пакета выполняются параллельно в пуле, записи — по очереди в писателе
+            responses = await asyncio.gather(*(self._handle_single(item) for item in payload))
+            return [response for response in responses if response is not None]
+        return await self._handle_single(payload)
+
+    async def _handle_single(self, request):
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return self._error(None, INVALID_REQUEST, "Некорректный запрос")
+        request_id = request.get('id')
+        try:
+            result = await self.store.call(request['method'], request.get('params'))
+        except RpcError as e:
+            return self._error(request_id, e.code, str(e))
+        except Exception as e:
+            return self._error(request_id, INTERNAL_ERROR, str(e))
+        if 'id' not in request:
+            return None  # Уведомление: ответ не требуется
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    @staticmethod
+    def _error(request_id, code, message):
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    async def _send(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def _stream_tasks(self, writer, query):
+        """Отдает задачи в формате NDJSON частями (chunked), не собирая весь ответ в памяти."""
+        filter_args = {key: query[key] for key in ('filter_by', 'value', 'start_date', 'end_date') if key in query}
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        async with aclosing(self.store.stream_tasks(filter_args)) as pages:
+            async for page in pages:
+                chunk = "".join(json.dumps(task, ensure_ascii=False) + "\n" for task in page).encode('utf-8')
+                writer.write(f"{len(chunk):X}\r\n".encode('latin-1') + chunk + b"\r\n")
+                await writer.drain()  # Обратное давление: не читаем из БД быстрее, чем клиент принимает
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(db_name, host=DEFAULT_HOST, port=DEFAULT_PORT, readers=DEFAULT_READERS, ready=None):
+    """Запускает сервер и работает до отмены задачи."""
+    store = TaskStore(db_name, readers)
+    api = ApiServer(store)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"API-сервер Zettelkasten слушает http://{host}:{port} (читателей: {readers})")
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный API-сервер Zettelkasten")
+    parser.add_argument("--db", default="zettelkasten.db", help="путь к файлу БД")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS, help="число читающих соединений")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.readers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# archive.py
+
+import datetime
+import os
+from urllib.request import pathname2url
+
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_AFTER_DAYS = 30  # Через сколько дней после завершения задача уходит в архив
+ARCHIVE_BATCH_SIZE = 500  # Задач за одну транзакцию переноса
+ARCHIVE_INDEXES = {  # Индексы archive.tasks: имя -> колонка
+    'idx_archive_tasks_due_date': 'due_date',
+    'idx_archive_tasks_content_hash': 'content_hash',
+    'idx_archive_tasks_title': 'title',  # Ссылки [[Название]] на архивные задачи
+}
+
+
+def archive_path_for(db_name):
+    """Возвращает путь к файлу архива рядом с основной БД."""
+    if db_name == ":memory:":
+        return ":memory:"
+    root, ext = os.path.splitext(db_name)
+    return f"{root}_archive{ext or '.db'}"
+
+
+class TaskArchive:
+    """Холодное хранилище: давно завершенные задачи переносятся в подключенный файл архива."""
+    def __init__(self, conn, archive_path):
+        self.conn = conn
+        self.archive_path = archive_path
+        self._columns = None
+        self.attached = False
+
+    def attach(self, readonly=False):
+        """Подключает файл архива через ATTACH DATABASE и приводит его схему к основной.
+
+        В режиме только для чтения отсутствующий архив не создается: запросы
+        тогда обращаются лишь к основной таблице.
+        """
+        attached = [row[1] for row in self.conn.execute("PRAGMA database_list")]
+        if ARCHIVE_SCHEMA not in attached:
+            if readonly:
+                if not os.path.exists(self.archive_path):
+                    self.attached = False
+                    return
+                uri = f"file:{pathname2url(os.path.abspath(self.archive_path))}?mode=ro"
+                self.conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (uri,))
+            else:
+                self.conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+                # Действует только для нового файла архива: до создания первой таблицы
+                self.conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.auto_vacuum = INCREMENTAL")
+                self.conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = WAL")
+        self.attached = True
+        if not readonly:
+            self.sync_schema()
+            self._recover_interrupted_moves()
+
+    def sync_schema(self):
+        """Создает archive.tasks или добавляет в нее колонки, появившиеся в main.tasks."""
+        self._columns = None
+        main_columns = self.conn.execute("PRAGMA main.table_info(tasks)").fetchall()
+        archive_columns = {row[1] for row in self.conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info(tasks)")}
+        if not archive_columns:
+            column_defs = ", ".join(
+                f"{col['name']} {col['type']}" + (" PRIMARY KEY" if col['pk'] else "")
+                for col in main_columns
+            )
+            self.conn.execute(f"CREATE TABLE {ARCHIVE_SCHEMA}.tasks ({column_defs}, archived_at TEXT)")
+        else:
+            for col in main_columns:
+                if col['name'] not in archive_columns:
+                    self.conn.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.tasks ADD COLUMN {col['name']} {col['type']}")
+        for index_name, column in ARCHIVE_INDEXES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.{index_name} ON tasks ({column})")
+        # Напоминания переносятся вместе с задачей, чтобы возврат из архива их не терял
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.reminders (
+                id INTEGER PRIMARY KEY,
+                task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+                reminder_datetime TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_reminders_task ON reminders (task_id)")
+        self.conn.commit()
+
+    @property
+    def columns(self):
+        """Список колонок main.tasks, общий для горячей и холодной таблиц."""
+        if self._columns is None:
+            self._columns = [row[1] for row in self.conn.execute("PRAGMA main.table_info(tasks)")]
+        return self._columns
+
+    def union_source(self, columns=None, marked=False):
+        """SQL-источник, объединяющий горячие и архивные задачи под именем tasks.
+
+        columns ограничивает набор колонок; marked добавляет колонку archived (1 — задача в архиве).
+        """
+        cols = ", ".join(columns or self.columns)
+        if not self.attached:
+            return f"(SELECT {cols}, 0 AS archived FROM main.tasks) AS tasks" if marked else "main.tasks AS tasks"
+        hot, cold = (", 0 AS archived", ", 1") if marked else ("", "")
+        return (f"(SELECT {cols}{hot} FROM main.tasks "
+                f"UNION ALL SELECT {cols}{cold} FROM {ARCHIVE_SCHEMA}.tasks) AS tasks")
+
+    def reminders_source(self):
+        """SQL-источник напоминаний горячих и архивных задач под именем reminders."""
+        if not self.attached:
+            return "main.reminders AS reminders"
+        cols = "id, task_id, reminder_datetime"
+        return (f"(SELECT {cols} FROM main.reminders "
+                f"UNION ALL SELECT {cols} FROM {ARCHIVE_SCHEMA}.reminders) AS reminders")
+
+    def contains(self, task_id):
+        """Проверяет, находится ли задача в архиве."""
+        if not self.attached:
+            return False
+        row = self.conn.execute(f"SELECT 1 FROM {ARCHIVE_SCHEMA}.tasks WHERE id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def get_task(self, task_id):
+        """Возвращает архивную задачу в том же виде, что и main.tasks."""
+        if not self.attached:
+            return None
+        cols = ", ".join(self.columns)
+        row = self.conn.execute(f"SELECT {cols} FROM {ARCHIVE_SCHEMA}.tasks WHERE id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def archive_batch(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        """Переносит в архив одну порцию задач, завершенных раньше older_than_days дней назад.
+
+        Время завершения берется из журнала изменений; для задач, завершенных до
+        его появления, используется дата создания. Возвращает число перенесенных задач.
+        """
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=older_than_days)).isoformat()
+        ids = [row[0] for row in self.conn.execute('''
+            SELECT t.id FROM main.tasks AS t
+            WHERE t.is_completed = 1 AND COALESCE(
+                (SELECT MAX(c.changed_at) FROM task_changes AS c
+                 WHERE c.task_id = t.id AND c.field = 'is_completed'),
+                t.created_at) < ?
+            LIMIT ?
+        ''', (cutoff, batch_size))]
+        if ids:
+            self._move(ids, "main", ARCHIVE_SCHEMA, logged_as='archived')
+        return len(ids)
+
+    def archive_completed(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        """Переносит в архив все подходящие задачи порциями, каждая в своей транзакции."""
+        total = 0
+        while moved := self.archive_batch(older_than_days, batch_size):
+            total += moved
+        return total
+
+    def restore(self, task_id):
+        """Возвращает задачу из архива в основную таблицу (например, перед изменением)."""
+        if not self.contains(task_id):
+            return False
+        self._move([task_id], ARCHIVE_SCHEMA, "main", logged_as='restored')
+        return True
+
+    def restore_many(self, task_ids):
+        """Возвращает из архива те задачи из task_ids, что там находятся; возвращает их число."""
+        if not self.attached or not task_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in task_ids)
+        archived = [row[0] for row in self.conn.execute(
+            f"SELECT id FROM {ARCHIVE_SCHEMA}.tasks WHERE id IN ({placeholders})", list(task_ids))]
+        if archived:
+            self._move(archived, ARCHIVE_SCHEMA, "main", logged_as='restored')
+        return len(archived)
+
+    def _recover_interrupted_moves(self):
+        """Завершает перенос, прерванный между двумя фазами: архивная копия считается основной."""
+        with self.conn:
+            mark = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM task_changes").fetchone()[0]
+            self.conn.execute(f"DELETE FROM main.task_details WHERE task_id IN (SELECT id FROM {ARCHIVE_SCHEMA}.tasks)")
+            self.conn.execute(f"DELETE FROM main.reminders WHERE task_id IN (SELECT id FROM {ARCHIVE_SCHEMA}.tasks)")
+            self.conn.execute(f"DELETE FROM main.tasks WHERE id IN (SELECT id FROM {ARCHIVE_SCHEMA}.tasks)")
+            self.conn.execute("UPDATE task_changes SET field = 'archived' WHERE seq > ? AND field = 'deleted'", (mark,))
+
+    def _move(self, ids, source, target, logged_as):
+        """Переносит строки между схемами и помечает это в журнале изменений.
+
+        В режиме WAL транзакция над двумя файлами не атомарна при сбое, поэтому
+        перенос идет в две фазы: сначала копия, затем удаление из источника.
+        Сбой между фазами оставляет дубликат (его убирает _recover_interrupted_moves),
+        но никогда не теряет задачу.
+        """
+        cols = ", ".join(self.columns)
+        placeholders = ", ".join("?" for _ in ids)
+        mark = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM task_changes").fetchone()[0]
+        rename_sql = "UPDATE task_changes SET field = ? WHERE seq > ? AND field IN ('deleted', 'created')"
+        with self.conn:
+            if target == ARCHIVE_SCHEMA:
+                self.conn.execute(f'''
+                    INSERT INTO {target}.tasks ({cols}, archived_at)
+                    SELECT {cols}, ? FROM {source}.tasks WHERE id IN ({placeholders})
+                ''', [datetime.datetime.now().isoformat(), *ids])
+            else:
+                self.conn.execute(f'''
+                    INSERT INTO {target}.tasks ({cols})
+                    SELECT {cols} FROM {source}.tasks WHERE id IN ({placeholders})
+                ''', ids)
+            # Детали и напоминания переносятся вместе с задачей (таблицы есть в обеих схемах)
+            self.conn.execute(f'''
+                INSERT OR REPLACE INTO {target}.task_details (task_id, compressed, body)
+                SELECT task_id, compressed, body FROM {source}.task_details WHERE task_id IN ({placeholders})
+            ''', ids)
+            self.conn.execute(f'''
+                INSERT OR REPLACE INTO {target}.reminders (id, task_id, reminder_datetime)
+                SELECT id, task_id, reminder_datetime FROM {source}.reminders WHERE task_id IN ({placeholders})
+            ''', ids)
+            # Триггеры журнала видят перенос как удаление/создание — переименовываем эти записи
+            self.conn.execute(rename_sql, (logged_as, mark))
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {source}.task_details WHERE task_id IN ({placeholders})", ids)
+            self.conn.execute(f"DELETE FROM {source}.reminders WHERE task_id IN ({placeholders})", ids)
+            self.conn.execute(f"DELETE FROM {source}.tasks WHERE id IN ({placeholders})", ids)
+            self.conn.execute(rename_sql, (logged_as, mark))
@@ -0,0 +1,241 @@
+# backup.py
+
+import datetime
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+BACKUP_DIR = "backups"
+PAGES_PER_STEP = 256     # Страниц за один шаг копирования (блокировка держится только на шаг)
+STEP_PAUSE = 0.005       # Пауза между шагами, сек — дает приложению писать в БД
+SNAPSHOT_INTERVAL_HOURS = 24
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def copy_database(source, target):
+    """Копирует БД целиком через Connection.backup; source и target — соединения или пути к файлам."""
+    source_conn = source if isinstance(source, sqlite3.Connection) else sqlite3.connect(source)
+    try:
+        target_conn = target if isinstance(target, sqlite3.Connection) else sqlite3.connect(target)
+        try:
+            source_conn.backup(target_conn)
+        finally:
+            if target_conn is not target:
+                target_conn.close()
+    finally:
+        if source_conn is not source:
+            source_conn.close()
+
+
+class BackupManager:
+    """Онлайн-резервные копии одного файла БД: пошаговое копирование, сжатие, ротация и восстановление."""
+    def __init__(self, db_name, backup_dir=BACKUP_DIR, keep_last=10, max_age_days=30):
+        self.db_name = db_name
+        self.backup_dir = backup_dir
+        self.keep_last = keep_last
+        self.max_age_days = max_age_days
+        self.stem = os.path.splitext(os.path.basename(db_name))[0]
+
+    def snapshot_path(self, stamp):
+        """Путь к сжатому снимку с заданной меткой времени."""
+        return os.path.join(self.backup_dir, f"{self.stem}-{stamp}.db.gz")
+
+    def list_snapshots(self):
+        """Возвращает снимки этой БД, от новых к старым, в виде (метка, путь)."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        prefix, suffix = f"{self.stem}-", ".db.gz"
+        snapshots = []
+        for name in os.listdir(self.backup_dir):
+            stamp = name[len(prefix):-len(suffix)] if name.startswith(prefix) and name.endswith(suffix) else ""
+            try:
+                datetime.datetime.strptime(stamp, STAMP_FORMAT)
+            except ValueError:
+                continue  # Чужой файл (например, снимок архива с похожим префиксом)
+            snapshots.append((stamp, os.path.join(self.backup_dir, name)))
+        return sorted(snapshots, reverse=True)
+
+    def is_due(self, interval_hours=SNAPSHOT_INTERVAL_HOURS):
+        """Проверяет, пора ли делать очередной снимок."""
+        snapshots = self.list_snapshots()
+        if not snapshots:
+            return True
+        last = datetime.datetime.strptime(snapshots[0][0], STAMP_FORMAT)
+        return datetime.datetime.now() - last >= datetime.timedelta(hours=interval_hours)
+
+    def create_snapshot(self, stamp=None, pages=PAGES_PER_STEP, progress=None):
+        """Копирует БД пошагово через Connection.backup, сжимает снимок и применяет ротацию.
+
+        Работает через собственное соединение, поэтому может выполняться в фоновом
+        потоке. Возвращает статистику: размеры, длительность, пропускную способность
+        и время, в течение которого исходная БД была заблокирована.
+        """
+        if not os.path.exists(self.db_name):
+            return None
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = stamp or datetime.datetime.now().strftime(STAMP_FORMAT)
+        target_path = self.snapshot_path(stamp)
+        fd, raw_path = tempfile.mkstemp(suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+
+        step_times = []
+        last_tick = time.perf_counter()
+
+        def on_step(status, remaining, total):
+            nonlocal last_tick
+            now = time.perf_counter()
+            # Интервал между вызовами — это шаг копирования плюс пауза после предыдущего шага
+            step_times.append(max(now - last_tick - (STEP_PAUSE if step_times else 0), 0.0))
+            last_tick = now
+            if progress:
+                progress(total - remaining, total)
+
+        started = time.perf_counter()
+        source = sqlite3.connect(self.db_name)
+        target = sqlite3.connect(raw_path)
+        try:
+            source.backup(target, pages=pages, progress=on_step, sleep=STEP_PAUSE)
+        finally:
+            target.close()
+            source.close()
+        copied = time.perf_counter()
+
+        raw_size = os.path.getsize(raw_path)
+        with open(raw_path, "rb") as src, gzip.open(target_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(raw_path)
+        finished = time.perf_counter()
+
+        self.rotate()
+        duration = finished - started
+        return {
+            "path": target_path,
+            "stamp": stamp,
+            "db_bytes": raw_size,
+            "compressed_bytes": os.path.getsize(target_path),
+            "duration": duration,
+            "copy_duration": copied - started,
+            "throughput_mb_s": raw_size / (1024 * 1024) / duration if duration else 0.0,
+            "steps": len(step_times),
+            "locked_total": sum(step_times),
+            "locked_max": max(step_times, default=0.0),
+        }
+
+    def rotate(self):
+        """Удаляет снимки сверх keep_last и старше max_age_days, но всегда оставляет последний."""
+        snapshots = self.list_snapshots()
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.max_age_days)
+        removed = []
+        for index, (stamp, path) in enumerate(snapshots):
+            too_old = datetime.datetime.strptime(stamp, STAMP_FORMAT) < cutoff
+            if index > 0 and (index >= self.keep_last or too_old):
+                os.remove(path)
+                removed.append(path)
+        return removed
+
+    def _unpack(self, snapshot_path):
+        """Распаковывает снимок во временный файл и возвращает путь к нему."""
+        fd, raw_path = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(fd, "wb") as dst, gzip.open(snapshot_path, "rb") as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return raw_path
+
+    def verify_snapshot(self, snapshot_path):
+        """Проверяет целостность снимка через PRAGMA integrity_check."""
+        raw_path = self._unpack(snapshot_path)
+        try:
+            conn = sqlite3.connect(raw_path)
+            try:
+                result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                conn.close()
+            return result == "ok"
+        except (sqlite3.DatabaseError, OSError, EOFError):
+            return False
+        finally:
+            os.remove(raw_path)
+
+    def restore_snapshot(self, snapshot_path, target, verify=True):
+        """Восстанавливает снимок в открытое соединение или файл после проверки целостности.
+
+        target — sqlite3.Connection (содержимое заменяется «на лету») или путь к файлу.
+        Возвращает False, если снимок поврежден и восстановление не выполнялось.
+        verify=False пропускает проверку снимка, уже проверенного вызывающим.
+        """
+        if verify and not self.verify_snapshot(snapshot_path):
+            return False
+        raw_path = self._unpack(snapshot_path)
+        try:
+            copy_database(raw_path, target)
+        finally:
+            os.remove(raw_path)
+        return True
+
+
+class DatabaseBackups:
+    """Согласованные снимки основной БД и файла архива с общей меткой времени."""
+    def __init__(self, db, backup_dir=BACKUP_DIR):
+        self.db = db
+        self.main = BackupManager(db.db_name, backup_dir)
+        self.archive = BackupManager(db.archive.archive_path, backup_dir)
+
+    def is_due(self, interval_hours=SNAPSHOT_INTERVAL_HOURS):
+        """Проверяет, пора ли делать очередной снимок."""
+        return self.main.is_due(interval_hours)
+
+    def list_snapshots(self):
+        """Возвращает метки и пути снимков основной БД, от новых к старым."""
+        return self.main.list_snapshots()
+
+    def create_snapshot(self, progress=None):
+        """Делает снимки обоих файлов; безопасно вызывать из фонового потока."""
+        stamp = datetime.datetime.now().strftime(STAMP_FORMAT)
+        return [stats for stats in (self.main.create_snapshot(stamp, progress=progress),
+                                    self.archive.create_snapshot(stamp))
+                if stats is not None]
+
+    def restore(self, stamp):
+        """Восстанавливает основную БД (и архив, если есть его снимок) на момент stamp.
+
+        Оба снимка проверяются до любых изменений: при поврежденном снимке ничего
+        не восстанавливается. Если архив все же не удалось восстановить, основная БД
+        возвращается к состоянию до восстановления. Возвращает False в обоих случаях.
+        """
+        main_snapshot = self.main.snapshot_path(stamp)
+        archive_snapshot = self.archive.snapshot_path(stamp)
+        with_archive = os.path.exists(archive_snapshot) and self.db.archive.archive_path != ":memory:"
+        if not self.main.verify_snapshot(main_snapshot):
+            return False
+        if with_archive and not self.archive.verify_snapshot(archive_snapshot):
+            return False
+        self.db.conn.commit()
+        previous_counters = self.db.autoincrement_counters()
+        if with_archive:
+            fd, rollback_path = tempfile.mkstemp(suffix=".db")
+            os.close(fd)
+            try:
+                copy_database(self.db.conn, rollback_path)  # Основная БД до восстановления — на случай отката
+                self.main.restore_snapshot(main_snapshot, self.db.conn, verify=False)
+                if not self._restore_archive(archive_snapshot):
+                    copy_database(rollback_path, self.db.conn)
+                    return False
+            finally:
+                os.remove(rollback_path)
+        else:
+            self.main.restore_snapshot(main_snapshot, self.db.conn, verify=False)
+        self.db.archive.sync_schema()
+        self.db.reset_after_restore(previous_counters)
+        return True
+
+    def _restore_archive(self, snapshot_path):
+        """Заменяет файл архива проверенным снимком; False — восстановить не удалось."""
+        self.db.conn.execute("DETACH DATABASE archive")
+        try:
+            return self.archive.restore_snapshot(snapshot_path, self.db.archive.archive_path, verify=False)
+        except (sqlite3.DatabaseError, OSError, EOFError):
+            return False
+        finally:
+            self.db.archive.attach()
@@ -0,0 +1,165 @@
+# changelog.py
+
+import json
+
+# Поля задачи, изменения которых попадают в журнал
+TRACKED_FIELDS = ('title', 'details', 'tags', 'due_date', 'is_completed', 'is_important', 'recurrence_rule')
+
+# Локальное время с миллисекундами, сравнимое с datetime.isoformat()
+NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+# Версия набора триггеров: увеличивается при любом изменении их текста в _create_triggers
+TRIGGERS_VERSION = 2
+
+
+class ChangeLog:
+    """Журнал изменений задач (CDC), который ведется триггерами SQLite."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def create_schema(self):
+        """Создает таблицу журнала, индексы и триггеры на таблицах tasks и task_details.
+
+        Триггеры пересоздаются только при смене TRIGGERS_VERSION: обычное открытие
+        БД (в том числе импортом или API-сервером) схему не меняет.
+        """
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS task_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                old_value,
+                new_value,
+                changed_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_task_changes_task ON task_changes (task_id, field, seq)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_task_changes_field_time ON task_changes (field, changed_at)")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS changelog_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        if self._triggers_version() == TRIGGERS_VERSION:
+            return
+        # Версия перепроверяется под блокировкой записи: БД могли обновить из другого процесса
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._triggers_version() != TRIGGERS_VERSION:
+                self._create_triggers()
+                self.conn.execute("INSERT OR REPLACE INTO changelog_state (key, value) VALUES ('triggers', ?)",
+                                  (TRIGGERS_VERSION,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _triggers_version(self):
+        row = self.conn.execute("SELECT value FROM changelog_state WHERE key = 'triggers'").fetchone()
+        return row[0] if row else 0
+
+    def _create_triggers(self):
+        """Пересоздает триггеры, чтобы они соответствовали текущему списку полей."""
+        existing = [row[0] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'task_changes_%'")]
+        for name in existing:
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+        self.conn.execute(f'''
+            CREATE TRIGGER task_changes_insert AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO task_changes (task_id, field, old_value, new_value, changed_at)
+                VALUES (NEW.id, 'created', NULL, NEW.title, {NOW_SQL});
+            END
+        ''')
+        for field in TRACKED_FIELDS:
+            if field == 'details':
+                continue  # Детали хранятся в task_details — триггер ниже
+            self.conn.execute(f'''
+                CREATE TRIGGER task_changes_{field} AFTER UPDATE OF {field} ON tasks
+                WHEN OLD.{field} IS NOT NEW.{field}
+                BEGIN
+                    INSERT INTO task_changes (task_id, field, old_value, new_value, changed_at)
+                    VALUES (NEW.id, '{field}', OLD.{field}, NEW.{field}, {NOW_SQL});
+                END
+            ''')
+        # Для деталей фиксируется только факт изменения: копии длинных текстов в журнале
+        # свели бы на нет сжатие task_details, а распаковка потребовала бы функции
+        # приложения, которой нет у других соединений (консоль sqlite3, внешние утилиты)
+        self.conn.execute(f'''
+            CREATE TRIGGER task_changes_details AFTER UPDATE OF body ON task_details
+            WHEN OLD.body IS NOT NEW.body
+            BEGIN
+                INSERT INTO task_changes (task_id, field, old_value, new_value, changed_at)
+                VALUES (NEW.task_id, 'details', NULL, NULL, {NOW_SQL});
+            END
+        ''')
+        self.conn.execute(f'''
+            CREATE TRIGGER task_changes_delete AFTER DELETE ON tasks
+            BEGIN
+                INSERT INTO task_changes (task_id, field, old_value, new_value, changed_at)
+                VALUES (OLD.id, 'deleted', OLD.title, NULL, {NOW_SQL});
+            END
+        ''')
+
+    def last_seq(self):
+        """Возвращает номер последнего изменения (водяной знак для экспорта)."""
+        row = self.conn.execute("SELECT MAX(seq) FROM task_changes").fetchone()
+        return row[0] or 0
+
+    def iter_changes(self, since_seq=0, batch_size=1000, fields=None):
+        """Потоково отдает изменения с номером больше since_seq, порциями по batch_size."""
+        query = "SELECT * FROM task_changes WHERE seq > ?"
+        field_params = []
+        if fields:
+            query += f" AND field IN ({', '.join('?' for _ in fields)})"
+            field_params = list(fields)
+        query += " ORDER BY seq LIMIT ?"
+
+        last = since_seq
+        while True:
+            rows = self.conn.execute(query, [last, *field_params, batch_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last = rows[-1]['seq']
+
+    def get_task_history(self, task_id):
+        """Возвращает историю изменений одной задачи в хронологическом порядке."""
+        rows = self.conn.execute("SELECT * FROM task_changes WHERE task_id = ? ORDER BY seq", (task_id,))
+        return [dict(row) for row in rows.fetchall()]
+
+    def export_changes(self, file_path, since_seq=0):
+        """Дописывает изменения после since_seq в файл JSON Lines и возвращает новый водяной знак."""
+        last = since_seq
+        with open(file_path, 'a', encoding='utf-8') as f:
+            for change in self.iter_changes(since_seq):
+                f.write(json.dumps(change, ensure_ascii=False) + "\n")
+                last = change['seq']
+        return last
+
+    def compact(self, up_to_seq=None, after_seq=0, window=None):
+        """Удаляет записи до водяного знака, перекрытые более поздним изменением того же поля.
+
+        Для каждой пары (задача, поле) остается только последнее изменение,
+        поэтому отчеты «завершено за период» продолжают работать после сжатия.
+        after_seq и window ограничивают проверяемые записи диапазоном номеров —
+        так обслуживание сжимает журнал короткими шагами. Возвращает число удаленных записей.
+        """
+        if up_to_seq is None:
+            up_to_seq = self.last_seq()
+        last = up_to_seq if window is None else min(up_to_seq, after_seq + window)
+        cursor = self.conn.execute('''
+            DELETE FROM task_changes
+            WHERE seq > ? AND seq <= ? AND EXISTS (
+                SELECT 1 FROM task_changes AS later
+                WHERE later.task_id = task_changes.task_id
+                  AND later.field = task_changes.field
+                  AND later.seq > task_changes.seq
+                  AND later.seq <= ?
+            )
+        ''', (after_seq, last, up_to_seq))
+        self.conn.commit()
+        return cursor.rowcount
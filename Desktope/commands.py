@@ -0,0 +1,228 @@
+# commands.py
+
+MAX_UNDO_DEPTH = 100
+MAX_PENDING_CHANGES = 200  # При таком числе отложенных изменений запись выполняется сразу
+BOOLEAN_FIELDS = ('is_completed', 'is_important')
+
+
+class Command:
+    """Обратимое действие над задачами."""
+    description = ""
+
+    def do(self, journal):
+        raise NotImplementedError
+
+    def undo(self, journal):
+        raise NotImplementedError
+
+
+class SetFieldCommand(Command):
+    """Изменение одного поля задачи; запись откладывается и объединяется с соседними."""
+    def __init__(self, task_id, field, old_value, new_value, description=""):
+        self.task_id = task_id
+        self.field = field
+        self.old_value = old_value
+        self.new_value = new_value
+        self.description = description
+
+    def do(self, journal):
+        journal.stage(self.task_id, self.field, self.new_value)
+
+    def undo(self, journal):
+        journal.stage(self.task_id, self.field, self.old_value)
+
+
+class EditTaskCommand(Command):
+    """Редактирование задачи в диалоге: поля и напоминания целиком."""
+    description = "Редактирование задачи"
+
+    def __init__(self, task_id, old_data, new_data, old_reminders, new_reminders):
+        self.task_id = task_id
+        self.old_data, self.new_data = old_data, new_data
+        self.old_reminders, self.new_reminders = old_reminders, new_reminders
+
+    def do(self, journal):
+        journal.db.edit_task(self.task_id, dict(self.new_data), self.new_reminders)
+
+    def undo(self, journal):
+        journal.db.edit_task(self.task_id, dict(self.old_data), self.old_reminders)
+
+
+class AddTaskCommand(Command):
+    """Создание задачи; отмена удаляет ее, повтор восстанавливает с тем же ID."""
+    description = "Новая задача"
+
+    def __init__(self, task_data):
+        self.task_data = task_data
+        self.task_id = None
+        self.snapshot = None
+
+    def do(self, journal):
+        if self.snapshot is None:
+            self.task_id = journal.db.add_task(**self.task_data)
+        else:
+            journal.db.restore_task(*self.snapshot)
+
+    def undo(self, journal):
+        self.snapshot = journal.db.delete_task(self.task_id)
+
+
+class CompleteOccurrenceCommand(Command):
+    """Выполнение одного вхождения повторяющейся задачи."""
+    description = "Выполнение повторяющейся задачи"
+
+    def __init__(self, series_id, occurrence_date):
+        self.series_id = series_id
+        self.occurrence_date = occurrence_date
+
+    def do(self, journal):
+        journal.db.complete_occurrence(self.series_id, self.occurrence_date)
+
+    def undo(self, journal):
+        journal.db.uncomplete_occurrence(self.series_id, self.occurrence_date)
+
+
+class BulkEditCommand(Command):
+    """Массовое изменение одного поля у набора задач одним UPDATE.
+
+    Перед выполнением запоминаются прежние значения поля; отмена записывает
+    их обратно одной транзакцией, повтор заново выполняет то же действие.
+    """
+    def __init__(self, task_ids, field, method, *args, description=""):
+        self.task_ids = list(task_ids)
+        self.field = field
+        self.method = method
+        self.args = args
+        self.description = description
+        self.old_values = {}
+
+    def do(self, journal):
+        self.old_values = journal.db.get_field_values(self.task_ids, self.field)
+        getattr(journal.db, self.method)(self.task_ids, *self.args)
+
+    def undo(self, journal):
+        journal.db.apply_field_changes(
+            [(task_id, self.field, value) for task_id, value in self.old_values.items()])
+
+
+class BulkDeleteCommand(Command):
+    """Удаление набора задач; отмена восстанавливает их с прежними ID, напоминаниями и связями."""
+    description = "Удаление задач"
+
+    def __init__(self, task_ids):
+        self.task_ids = list(task_ids)
+        self.snapshots = []
+
+    def do(self, journal):
+        self.snapshots = journal.db.delete_tasks(self.task_ids)
+
+    def undo(self, journal):
+        journal.db.restore_tasks(self.snapshots)
+
+
+class CommandJournal:
+    """Журнал команд перед DatabaseManager: многоуровневая отмена/повтор и отложенная запись.
+
+    Изменения полей (статус, важность) не пишутся в БД сразу, а копятся
+    в pending по ключу (задача, поле): повторные клики по одной задаче
+    перезаписывают значение, а возврат к исходному значению отменяет запись.
+    flush() сохраняет накопленное одной транзакцией. Остальные команды
+    сначала сбрасывают отложенные изменения, затем выполняются сразу.
+    """
+    def __init__(self, db, max_depth=MAX_UNDO_DEPTH, max_pending=MAX_PENDING_CHANGES):
+        self.db = db
+        self.max_depth = max_depth
+        self.max_pending = max_pending
+        self.undo_stack = []
+        self.redo_stack = []
+        self.pending = {}      # (task_id, field) -> новое значение
+        self._committed = {}  # (task_id, field) -> значение в БД на момент первой отложенной правки
+        self.stats = {'staged': 0, 'written': 0, 'flushes': 0}
+
+    def current_value(self, task_id, field):
+        """Значение поля с учетом еще не записанных изменений; из БД читается только само поле."""
+        if (task_id, field) in self.pending:
+            return self.pending[(task_id, field)]
+        return self.db.get_field_values([task_id], field).get(task_id)
+
+    def stage(self, task_id, field, value):
+        """Откладывает запись поля до ближайшего flush()."""
+        key = (task_id, field)
+        if field in BOOLEAN_FIELDS:
+            value = int(bool(value))
+        if key not in self._committed:
+            committed = self.current_value(task_id, field)
+            self._committed[key] = int(bool(committed)) if field in BOOLEAN_FIELDS else committed
+        self.pending[key] = value
+        self.stats['staged'] += 1
+        if len(self.pending) >= self.max_pending:
+            self.flush()
+
+    def clear(self):
+        """Забывает отложенные изменения и историю отмены (например, после восстановления из снимка)."""
+        self.pending.clear()
+        self._committed.clear()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def has_pending(self):
+        return bool(self.pending)
+
+    def flush(self):
+        """Записывает отложенные изменения одной транзакцией; возвращает число записанных полей."""
+        if not self.pending:
+            return 0
+        # Поля, вернувшиеся к исходному значению (например, двойной клик по звезде), не пишутся
+        changes = [(task_id, field, value) for (task_id, field), value in self.pending.items()
+                   if value != self._committed[(task_id, field)]]
+        self.pending.clear()
+        self._committed.clear()
+        if changes:
+            self.db.apply_field_changes(changes)
+        self.stats['written'] += len(changes)
+        self.stats['flushes'] += 1
+        return len(changes)
+
+    def set_field(self, task_id, field, value, description=""):
+        """Создает и выполняет команду изменения поля."""
+        command = SetFieldCommand(task_id, field, self.current_value(task_id, field), value, description)
+        self.execute(command)
+        return command
+
+    def execute(self, command):
+        """Выполняет команду и помещает ее в стек отмены."""
+        if not isinstance(command, SetFieldCommand):
+            self.flush()
+        command.do(self)
+        self.undo_stack.append(command)
+        del self.undo_stack[:-self.max_depth]
+        self.redo_stack.clear()
+        return command
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """Отменяет последнюю команду; возвращает ее или None."""
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        if not isinstance(command, SetFieldCommand):
+            self.flush()
+        command.undo(self)
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self):
+        """Повторяет последнюю отмененную команду; возвращает ее или None."""
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        if not isinstance(command, SetFieldCommand):
+            self.flush()
+        command.do(self)
+        self.undo_stack.append(command)
+        return command
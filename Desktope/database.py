@@ -1,17 +1,77 @@
 # database.py
 
+import os
+import json
 import sqlite3
 import datetime
 from collections import Counter
+from urllib.request import pathname2url
+
+from changelog import ChangeLog, TRACKED_FIELDS
+from archive import TaskArchive, archive_path_for, ARCHIVE_SCHEMA
+from links import LinkIndex
+from recurrence import RecurrenceManager, normalize_rule
+from analytics import TaskAnalytics
+from search_index import TrigramIndex
+from text_index import DetailsTextIndex
+from maintenance import DatabaseMaintenance
+from details_store import DetailsStore, make_preview
+from importer import content_hash
+from smart_views import SmartViews, SMART_VIEWS
+
+def readonly_uri(path):
+    """URI для открытия файла БД только на чтение."""
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+
+def retag(tags, add_tag, remove_tag):
+    """Строка тегов без remove_tag и с add_tag в конце (SQL-функция retag для bulk_retag).
+
+    Теги сравниваются целиком: удаление «раб» не затрагивает «работа»,
+    повторы удаляемого тега убираются все, добавляемый не дублируется.
+    """
+    tags = [tag.strip() for tag in (tags or '').split(',') if tag.strip() and tag.strip() != remove_tag]
+    if add_tag and add_tag not in tags:
+        tags.append(add_tag)
+    return ','.join(tags)
 
 class DatabaseManager:
-    def __init__(self, db_name="zettelkasten.db"):
-        """Инициализация менеджера БД, подключение и создание таблиц."""
-        self.conn = sqlite3.connect(db_name)
+    def __init__(self, db_name="zettelkasten.db", readonly=False):
+        """Инициализация менеджера БД, подключение и создание таблиц.
+
+        readonly=True открывает существующую БД только на чтение, без миграций —
+        так работают читающие соединения API-сервера параллельно с основным.
+        """
+        self.db_name = db_name
+        self.readonly = readonly
+        if readonly:
+            self.conn = sqlite3.connect(readonly_uri(db_name), uri=True)
+        else:
+            self.conn = sqlite3.connect(db_name)
+            # Новая БД сразу создается с пошаговым освобождением места (см. maintenance.py);
+            # для существующей настройка вступит в силу после VACUUM при обслуживании
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL позволяет читателям из других соединений не блокировать запись и наоборот
+            self.conn.execute("PRAGMA journal_mode = WAL")
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.conn.row_factory = sqlite3.Row # Позволяет обращаться к колонкам по имени
+        self.conn.create_function('retag', 3, retag, deterministic=True)
         self.cursor = self.conn.cursor()
-        self._create_tables()
+        self.changelog = ChangeLog(self.conn)
+        self.archive = TaskArchive(self.conn, archive_path_for(db_name))
+        self.details = DetailsStore(self.conn, self.archive)
+        self.links = LinkIndex(self.conn, self.archive)
+        self.recurrence = RecurrenceManager(self.conn, self.changelog)
+        self.smart_views = SmartViews(self.conn, self.changelog, self.recurrence)
+        self.analytics = TaskAnalytics(self.conn, self.changelog, self.archive, readonly=readonly)
+        self.search_index = TrigramIndex(self.conn, self.changelog, readonly=readonly, db_name=db_name)
+        self.text_index = DetailsTextIndex(self.conn, self.changelog, readonly=readonly, db_name=db_name)
+        self.maintenance = DatabaseMaintenance(self.conn, db_name, archive_path_for(db_name))
+        if not readonly:
+            self._create_tables()
+        self.archive.attach(readonly=readonly)
+        if not readonly and self.archive.attached:
+            self.details.create_schema(ARCHIVE_SCHEMA)
+            self.details.migrate_inline(ARCHIVE_SCHEMA)
 
     def _create_tables(self):
         """Создает таблицы tasks и reminders, если они не существуют."""
@@ -19,14 +79,21 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS tasks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
-                details TEXT,
+                details_preview TEXT,
                 tags TEXT,
                 due_date TEXT,
                 is_completed BOOLEAN DEFAULT 0,
                 is_important BOOLEAN DEFAULT 0,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                content_hash TEXT,
+                recurrence_rule TEXT
             )
         ''')
+        # Миграция БД, созданных до появления колонок content_hash, recurrence_rule и details_preview
+        self._add_column_if_missing('tasks', 'content_hash', 'TEXT')
+        self._add_column_if_missing('tasks', 'recurrence_rule', 'TEXT')
+        self._add_column_if_missing('tasks', 'details_preview', 'TEXT')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_content_hash ON tasks (content_hash)")
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS reminders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -36,12 +103,29 @@ class DatabaseManager:
             )
         ''')
         self.conn.commit()
+        self.details.create_schema()
+        self.changelog.create_schema()
+        # Перенос деталей из tasks.details — после пересоздания триггеров, ссылавшихся на колонку
+        self.details.migrate_inline()
+        self.links.create_schema()
+        self.recurrence.create_schema()
+        self.smart_views.create_schema()
+        self.analytics.create_schema()
+        self.search_index.create_schema()
+        self.text_index.create_schema()
+        self.maintenance.create_schema()
 
         # Заполняем данными, если таблица пуста
         self.cursor.execute("SELECT COUNT(id) FROM tasks")
         if self.cursor.fetchone()[0] == 0:
             self._seed_data()
 
+    def _add_column_if_missing(self, table, column, declaration):
+        """Добавляет колонку в существующую таблицу, если ее еще нет."""
+        columns = {row['name'] for row in self.cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
     def _seed_data(self):
         """Добавляет одну тестовую задачу при первом запуске."""
         self.add_task(
@@ -55,8 +139,12 @@ class DatabaseManager:
         """Очищает строку с тегами от пробелов и пустых значений."""
         return ','.join(tag.strip() for tag in tags_string.split(',') if tag.strip())
 
-    def add_task(self, title, details="", tags="", due_date=None, is_important=False):
-        """Добавляет новую задачу в БД."""
+    def add_task(self, title, details="", tags="", due_date=None, is_important=False, recurrence_rule=None):
+        """Добавляет новую задачу в БД.
+
+        Хэш содержимого сохраняется, как у импортированных задач: повторный импорт
+        не создаст дубликат задачи, добавленной вручную.
+        """
         now = datetime.datetime.now().isoformat()
         if isinstance(due_date, datetime.date):
             due_date = due_date.isoformat()
@@ -64,15 +152,103 @@ class DatabaseManager:
         cleaned_tags = self._clean_tags(tags)
 
         self.cursor.execute('''
-            INSERT INTO tasks (title, details, tags, due_date, is_important, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (title, details, cleaned_tags, due_date, is_important, now))
+            INSERT INTO tasks (title, details_preview, tags, due_date, is_important, created_at, recurrence_rule,
+                               content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, make_preview(details), cleaned_tags, due_date, is_important, now, normalize_rule(recurrence_rule),
+              content_hash(title, details, cleaned_tags, due_date)))
+        task_id = self.cursor.lastrowid
+        self.details.insert_many([(task_id, details)])
+        self.links.update_links(task_id, details)
+        # Ссылки, написанные раньше самой задачи, начинают указывать на нее
+        self.links.refresh_targets([task_id], [title])
         self.conn.commit()
-        return self.cursor.lastrowid
+        return task_id
+
+    def get_tasks(self, filter_by='all', value=None, start_date=None, end_date=None, limit=None):
+        """Получает задачи по разным фильтрам и возвращает их как список словарей.
+
+        Для умных списков (overdue, today, week) value — необязательная дата «сегодня».
+        """
+        if filter_by in SMART_VIEWS:
+            tasks = self.smart_views.tasks(filter_by, value)
+            return tasks[:limit] if limit is not None else tasks
+        query, params = self._build_tasks_query(filter_by, value, start_date, end_date, limit)
+        self.cursor.execute(query, params)
+        tasks = [dict(row) for row in self.cursor.fetchall()]
+        tasks = self._with_occurrences(tasks, filter_by, value, start_date, end_date)
+        return tasks[:limit] if limit is not None else tasks
+
+    def iter_tasks(self, filter_by='all', value=None, start_date=None, end_date=None, page_size=500):
+        """Отдает результат get_tasks порциями, не загружая всю выборку в память."""
+        if filter_by in SMART_VIEWS:
+            tasks = self.smart_views.tasks(filter_by, value)
+            for start in range(0, len(tasks), page_size):
+                yield tasks[start:start + page_size]
+            return
+        query, params = self._build_tasks_query(filter_by, value, start_date, end_date)
+        cursor = self.conn.execute(query, params)
+        while rows := cursor.fetchmany(page_size):
+            page = [dict(row) for row in rows]
+            if filter_by not in self.OCCURRENCE_FILTERS:
+                self.recurrence.apply_next_occurrences(page)
+            yield page
+        # Вхождения повторяющихся задач раскрываются только для окна дат и идут последней порцией
+        if filter_by in self.OCCURRENCE_FILTERS:
+            if occurrences := self._with_occurrences([], filter_by, value, start_date, end_date):
+                yield occurrences
 
-    def get_tasks(self, filter_by='all', value=None, start_date=None, end_date=None):
-        """Получает задачи по разным фильтрам и возвращает их как список словарей."""
-        query = "SELECT * FROM tasks"
+    # Фильтры по окну дат, для которых серии раскрываются в отдельные вхождения
+    OCCURRENCE_FILTERS = ('date', 'date_range')
+
+    def _with_occurrences(self, tasks, filter_by, value, start_date, end_date):
+        """Добавляет в выборку вхождения повторяющихся задач.
+
+        Для окна дат (календарь, отчет) серии раскрываются лениво только в пределах окна;
+        в остальных списках серия показывается одной строкой с датой ближайшего вхождения.
+        """
+        if filter_by in self.OCCURRENCE_FILTERS:
+            window = (value, value) if filter_by == 'date' else (start_date, end_date)
+            if None in window:
+                return tasks
+            occurrences = self.recurrence.expand(*window)
+            if not occurrences:
+                return tasks
+            merged = tasks + occurrences
+            merged.sort(key=lambda task: task['created_at'], reverse=True)
+            if filter_by == 'date':
+                merged.sort(key=lambda task: not task['is_important'])
+            else:
+                merged.sort(key=lambda task: task['due_date'])
+            return merged
+        if filter_by in ('completed', 'completed_between'):
+            return tasks
+        if not any(task.get('recurrence_rule') for task in tasks):
+            return tasks
+        self.recurrence.apply_next_occurrences(tasks)
+        # Повторяем порядок ORDER BY is_important DESC, due_date ASC, created_at DESC
+        tasks.sort(key=lambda task: task['created_at'], reverse=True)
+        tasks.sort(key=lambda task: (not task['is_important'], task['due_date'] is not None, task['due_date'] or ''))
+        return tasks
+
+    def complete_occurrence(self, series_id, occurrence_date):
+        """Отмечает выполненным одно вхождение повторяющейся задачи."""
+        return self.recurrence.complete_occurrence(series_id, occurrence_date)
+
+    def uncomplete_occurrence(self, series_id, occurrence_date):
+        """Отменяет выполнение вхождения: оно снова раскрывается из правила серии."""
+        if task_id := self.recurrence.discard_occurrence(series_id, occurrence_date):
+            self.delete_task(task_id)
+        else:
+            self.conn.commit()
+
+    def _build_tasks_query(self, filter_by='all', value=None, start_date=None, end_date=None, limit=None):
+        """Строит SQL-запрос и параметры для фильтра задач."""
+        # Фильтры, которые могут вернуть завершенные задачи, читают и архив
+        if filter_by in ['completed', 'date_range', 'completed_between', 'all']:
+            query = f"SELECT * FROM {self.archive.union_source()}"
+        else:
+            query = "SELECT * FROM tasks"
         params = []
         conditions = []
         
@@ -80,22 +256,27 @@ class DatabaseManager:
             'important': ("is_important = 1", []),
             'completed': ("is_completed = 1", []),
             'tag': ("(tags = ? OR tags LIKE ? OR tags LIKE ? OR tags LIKE ?)", [value, f'{value},%', f'%,{value},%', f'%,{value}']),
-            'date': ("due_date = ?", [value]),
-            'date_range': ("due_date BETWEEN ? AND ?", [start_date, end_date])
+            # Серии повторяющихся задач в окне дат заменяются своими вхождениями
+            'date': ("due_date = ? AND recurrence_rule IS NULL", [value]),
+            'date_range': ("due_date BETWEEN ? AND ? AND recurrence_rule IS NULL", [start_date, end_date]),
+            # Завершенные за период: выборка по индексу журнала изменений, а не перебор всех задач
+            'completed_between': ("is_completed = 1 AND id IN (SELECT task_id FROM task_changes "
+                                  "WHERE field = 'is_completed' AND new_value = 1 AND changed_at BETWEEN ? AND ?)",
+                                  [start_date, f"{end_date}T23:59:59.999"])
         }
 
         # ### ИСПРАВЛЕННАЯ СТРОКА ###
         # Проверяем, что фильтры 'important' и 'completed' работают без значения value
         if filter_by in ['important', 'completed'] or \
            (filter_by in filter_conditions and value is not None) or \
-           filter_by == 'date_range':
+           filter_by in ['date_range', 'completed_between']:
             
             condition, p = filter_conditions[filter_by]
             conditions.append(condition)
             params.extend(p)
 
         # Дополнительное условие для незавершенных задач
-        if filter_by not in ['completed', 'date_range', 'all']:
+        if filter_by not in ['completed', 'date_range', 'completed_between', 'all']:
              conditions.append("is_completed = 0")
         
         if conditions:
@@ -105,54 +286,280 @@ class DatabaseManager:
         order_clauses = {
             'completed': " ORDER BY created_at DESC",
             'date_range': " ORDER BY due_date ASC, created_at DESC",
+            'completed_between': " ORDER BY due_date ASC, created_at DESC",
             'default': " ORDER BY is_important DESC, due_date ASC, created_at DESC"
         }
         query += order_clauses.get(filter_by, order_clauses['default'])
-        
-        self.cursor.execute(query, params)
-        return [dict(row) for row in self.cursor.fetchall()]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, params
+
+    def autoincrement_counters(self):
+        """Счетчики AUTOINCREMENT основной БД: {таблица: последний выданный номер}."""
+        return {row['name']: row['seq'] for row in self.conn.execute("SELECT name, seq FROM main.sqlite_sequence")}
+
+    def reset_after_restore(self, previous_counters):
+        """Приводит производное состояние в соответствие с БД, восстановленной из снимка.
+
+        Снимок мог быть сделан до последних миграций — они применяются заново.
+        Счетчики AUTOINCREMENT (ID задач, номера журнала изменений) продолжаются
+        после previous_counters (см. autoincrement_counters): иначе новые задачи и
+        записи журнала получили бы номера, на которые уже опираются журнал, история
+        команд, кэши и внешние читатели. Кэши очищаются, а сводка статистики и
+        индексы поиска перестраиваются (снимки основной БД и архива делаются не одновременно).
+        """
+        self._create_tables()
+        with self.conn:
+            for name, seq in previous_counters.items():
+                if not self.conn.execute("UPDATE main.sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                                         (seq, name)).rowcount:
+                    self.conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+        self.recurrence.clear_cache()
+        self.smart_views.clear_cache()
+        self.analytics.reset()
+        self.search_index.reset()
+        self.text_index.reset()
+
+    def changelog_horizon(self):
+        """Номер изменения, до которого журнал прочитан всеми его потребителями.
+
+        Записи до этого номера можно сжимать (см. ChangeLog.compact): сводка статистики
+        и индексы поиска их уже учли, а кэши умных списков и повторений зависят
+        только от последнего номера, который сжатие не удаляет.
+        Потребитель без водяного знака (сводку еще не открывали, индекс строится)
+        горизонт не сдерживает: построение читает сами задачи, а задачи, измененные
+        после его начала, видны по последнему изменению поля, которое сжатие оставляет.
+        """
+        watermarks = [self.analytics.watermark(), self.search_index.watermark()]
+        if self.text_index.available():
+            watermarks.append(self.text_index.watermark())
+        return min((watermark for watermark in watermarks if watermark is not None),
+                   default=self.changelog.last_seq())
 
     def get_task_by_id(self, task_id):
-        """Получает одну задачу по ее ID."""
+        """Получает одну задачу по ее ID вместе с полным текстом деталей."""
         self.cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
         row = self.cursor.fetchone()
-        return dict(row) if row else None
+        task = dict(row) if row else self.archive.get_task(task_id)
+        if task is not None:
+            task['details'] = self.details.get(task_id)
+        return task
+
+    def load_details(self, tasks):
+        """Дополняет задачи списка полным текстом деталей (для отчетов); возвращает тот же список."""
+        details = self.details.get_many({task['id'] for task in tasks})
+        for task in tasks:
+            task['details'] = details.get(task['id'], '')
+        return tasks
+
+    def get_tasks_by_ids(self, task_ids):
+        """Получает задачи по списку ID одним запросом: {task_id: задача}."""
+        rows = self.conn.execute(
+            f"SELECT * FROM {self.archive.union_source()} WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(task_ids)),))
+        return {row['id']: dict(row) for row in rows}
+
+    def _ensure_hot(self, task_id):
+        """Возвращает задачу из архива в основную таблицу перед ее изменением."""
+        self.archive.restore(task_id)
 
     def update_task_status(self, task_id, is_completed):
         """Обновляет статус выполнения задачи."""
+        self._ensure_hot(task_id)
         self.cursor.execute("UPDATE tasks SET is_completed = ? WHERE id = ?", (is_completed, task_id))
         self.conn.commit()
 
     def update_task_importance(self, task_id, is_important):
         """Обновляет флаг важности задачи."""
+        self._ensure_hot(task_id)
         self.cursor.execute("UPDATE tasks SET is_important = ? WHERE id = ?", (is_important, task_id))
         self.conn.commit()
         
     def update_task(self, task_id, data: dict):
         """Обновляет данные задачи по словарю."""
+        if self._write_task(task_id, data):
+            self.conn.commit()
+
+    def edit_task(self, task_id, data: dict, reminders):
+        """Записывает поля задачи из диалога и заменяет ее напоминания одной транзакцией."""
+        self._ensure_hot(task_id)
+        with self.conn:
+            self._write_task(task_id, data)
+            self._write_reminders(task_id, reminders)
+
+    def _write_task(self, task_id, data: dict):
+        """Записывает поля и детали задачи без commit; возвращает False, если менять нечего."""
         if 'tags' in data:
             data['tags'] = self._clean_tags(data['tags'])
+        if 'recurrence_rule' in data:
+            data['recurrence_rule'] = normalize_rule(data['recurrence_rule'])
+        details = data.pop('details', None)
             
         # Формируем запрос динамически, чтобы не обновлять лишние поля
         fields_to_update = [f"{key} = ?" for key in data]
-        if not fields_to_update: return
+        if not fields_to_update and details is None: return False
+        self._ensure_hot(task_id)
 
-        query = f"UPDATE tasks SET {', '.join(fields_to_update)} WHERE id = ?"
-        params = list(data.values()) + [task_id]
-        
-        self.cursor.execute(query, params)
+        old_title = self.conn.execute("SELECT title FROM tasks WHERE id = ?", (task_id,)).fetchone() \
+            if 'title' in data else None
+        if fields_to_update:
+            query = f"UPDATE tasks SET {', '.join(fields_to_update)} WHERE id = ?"
+            params = list(data.values()) + [task_id]
+            self.cursor.execute(query, params)
+        if old_title is not None and old_title[0] != data['title']:
+            self.links.refresh_targets(titles=[old_title[0], data['title']])
+        # Детали и связи пересчитываются только при изменении деталей
+        if details is not None:
+            self.details.set_many([(task_id, details)])
+            self.links.update_links(task_id, details)
+        return True
+
+    def apply_field_changes(self, changes):
+        """Записывает набор изменений (task_id, поле, значение) одной транзакцией.
+
+        Изменения одного поля выполняются одним executemany — так журнал команд
+        сбрасывает накопленные клики пользователя.
+        """
+        by_field = {}
+        for task_id, field, value in changes:
+            if field not in TRACKED_FIELDS:
+                raise ValueError(f"Поле нельзя изменить: {field}")
+            by_field.setdefault(field, []).append((value, task_id))
+        self.archive.restore_many({task_id for task_id, _, _ in changes})
+        old_titles = self.get_field_values([task_id for _, task_id in by_field['title']], 'title') \
+            if 'title' in by_field else {}
+        for field, rows in by_field.items():
+            if field == 'details':
+                self.details.set_many((task_id, details) for details, task_id in rows)
+                for details, task_id in rows:
+                    self.links.update_links(task_id, details)
+            else:
+                self.cursor.executemany(f"UPDATE tasks SET {field} = ? WHERE id = ?", rows)
+        if old_titles:
+            self.links.refresh_targets(titles=[*old_titles.values(), *(title for title, _ in by_field['title'])])
         self.conn.commit()
 
-    def search_tasks(self, query_str):
-        """Ищет задачи по строке запроса в названии, деталях или тегах."""
+    def delete_task(self, task_id):
+        """Удаляет задачу и возвращает снимок (задача, напоминания, обратные ссылки) для restore_task."""
+        snapshots = self.delete_tasks([task_id])
+        return snapshots[0] if snapshots else None
+
+    def restore_task(self, task, reminders=(), backlinks=()):
+        """Восстанавливает удаленную задачу с прежним ID по снимку delete_task."""
+        self.restore_tasks([(task, reminders, backlinks)])
+
+    def delete_tasks(self, task_ids):
+        """Удаляет задачи одной транзакцией и возвращает их снимки для restore_tasks."""
+        task_ids = list(task_ids)
+        ids_json = json.dumps(task_ids)
+        self.archive.restore_many(task_ids)
+        in_ids = "IN (SELECT value FROM json_each(?))"
+        tasks = self.load_details(
+            [dict(row) for row in self.conn.execute(f"SELECT * FROM tasks WHERE id {in_ids}", (ids_json,))])
+        reminders, backlinks = {}, {}
+        for task_id, reminder in self.conn.execute(
+                f"SELECT task_id, reminder_datetime FROM reminders WHERE task_id {in_ids}", (ids_json,)):
+            reminders.setdefault(task_id, []).append(reminder)
+        for source_id, target_id in self.conn.execute(
+                f"SELECT source_id, target_id FROM links WHERE target_id {in_ids}", (ids_json,)):
+            backlinks.setdefault(target_id, []).append(source_id)
+        with self.conn:
+            self.conn.execute(f"DELETE FROM links WHERE source_id {in_ids} OR target_id {in_ids}", (ids_json, ids_json))
+            self.conn.execute(f"DELETE FROM link_refs WHERE source_id {in_ids}", (ids_json,))
+            self.conn.execute(f"DELETE FROM tasks WHERE id {in_ids}", (ids_json,))  # Напоминания и детали удаляются каскадно
+        return [(task, reminders.get(task['id'], []), backlinks.get(task['id'], [])) for task in tasks]
+
+    def restore_tasks(self, snapshots):
+        """Восстанавливает задачи по снимкам delete_tasks с прежними ID, напоминаниями и связями."""
+        if not snapshots:
+            return
+        columns = [column for column in snapshots[0][0] if column != 'details']
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [[task[column] for column in columns] for task, _, _ in snapshots])
+            self.details.insert_many((task['id'], task['details']) for task, _, _ in snapshots)
+            self.conn.executemany("INSERT INTO reminders (task_id, reminder_datetime) VALUES (?, ?)",
+                                  [(task['id'], reminder) for task, reminders, _ in snapshots for reminder in reminders])
+            # Исходящие ссылки пересчитываются, когда все задачи уже на месте
+            self.links.update_links_bulk((task['id'], task['details']) for task, _, _ in snapshots)
+            self.links.refresh_targets([task['id'] for task, _, _ in snapshots], [task['title'] for task, _, _ in snapshots])
+            self.conn.executemany("INSERT OR IGNORE INTO links (source_id, target_id) VALUES (?, ?)",
+                                  [(source_id, task['id']) for task, _, backlinks in snapshots for source_id in backlinks])
+
+    def get_field_values(self, task_ids, field):
+        """Текущие значения поля у набора задач: {task_id: значение}."""
+        if field not in TRACKED_FIELDS:
+            raise ValueError(f"Неизвестное поле: {field}")
+        if field == 'details':
+            return self.details.get_many(task_ids)
+        rows = self.conn.execute(
+            f"SELECT id, {field} FROM {self.archive.union_source()} WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(task_ids)),))
+        return {row[0]: row[1] for row in rows}
+
+    def bulk_set_field(self, task_ids, field, value):
+        """Устанавливает одно значение поля у всех задач одним UPDATE; возвращает число строк."""
+        if field not in ('is_completed', 'is_important'):
+            raise ValueError(f"Поле нельзя изменить массово: {field}")
+        return self._bulk_update(task_ids, f"{field} = :value", {'value': value})
+
+    def bulk_retag(self, task_ids, add_tag=None, remove_tag=None):
+        """Добавляет и/или убирает тег у набора задач одним UPDATE; возвращает число измененных задач."""
+        add_tag, remove_tag = (add_tag or '').strip(), (remove_tag or '').strip()
+        if ',' in add_tag or ',' in remove_tag:
+            raise ValueError("Тег не может содержать запятую")
+        if not add_tag and not remove_tag:
+            return 0
+        # Задачи, у которых теги не меняются, не переписываются и не попадают в журнал изменений
+        return self._bulk_update(task_ids, "tags = retag(tags, :add, :remove)", {'add': add_tag, 'remove': remove_tag},
+                                 extra_condition="retag(tags, :add, :remove) IS NOT COALESCE(tags, '')")
+
+    def bulk_shift_due(self, task_ids, days):
+        """Сдвигает срок задач на days дней (задачи без срока не меняются)."""
+        return self._bulk_update(task_ids, "due_date = date(due_date, printf('%+d days', :days))", {'days': days},
+                                 extra_condition="due_date IS NOT NULL")
+
+    def _bulk_update(self, task_ids, assignment, params, extra_condition=None):
+        """Выполняет один UPDATE по списку ID, переданному как JSON-массив, в одной транзакции."""
+        task_ids = list(task_ids)
+        self.archive.restore_many(task_ids)
+        query = f"UPDATE tasks SET {assignment} WHERE id IN (SELECT value FROM json_each(:ids))"
+        if extra_condition:
+            query += f" AND {extra_condition}"
+        with self.conn:
+            cursor = self.conn.execute(query, {**params, 'ids': json.dumps(task_ids)})
+        return cursor.rowcount
+
+    def search_tasks(self, query_str, fuzzy=False):
+        """Ищет задачи по строке запроса в названии, деталях или тегах.
+
+        fuzzy=True — нечеткий поиск по триграммному индексу: находит задачи
+        с опечатками и в транслитерации, результаты упорядочены по сходству.
+        """
+        if fuzzy:
+            tasks = [task for _, task in self.search_index.search(query_str)]
+            return self.recurrence.apply_next_occurrences(tasks)
         search_pattern = f"%{query_str}%"
+        # Сжатые детали распаковываются только у кандидатов из полнотекстового индекса
+        # (или у всех, если индекс не поможет); несжатые LIKE проверяет как есть
+        candidates = self.text_index.candidates(query_str)
+        check_all = candidates is None
+        candidate_ids, indexed_up_to = candidates or ((), None)
+        # Детали читаются только у задач, не совпавших по названию и тегам
         query = """
             SELECT * FROM tasks 
-            WHERE (title LIKE ? OR details LIKE ? OR tags LIKE ?) AND is_completed = 0
+            WHERE (title LIKE ? OR tags LIKE ? OR (
+                SELECT CASE WHEN NOT d.compressed THEN d.body
+                            WHEN ? OR d.task_id > ? OR d.task_id IN (SELECT value FROM json_each(?))
+                            THEN details_text(d.body, d.compressed) END
+                FROM task_details AS d WHERE d.task_id = tasks.id) LIKE ?) AND is_completed = 0
             ORDER BY is_important DESC, due_date ASC, created_at DESC
         """
-        self.cursor.execute(query, (search_pattern, search_pattern, search_pattern))
-        return [dict(row) for row in self.cursor.fetchall()]
+        self.cursor.execute(query, (search_pattern, search_pattern, check_all, indexed_up_to,
+                                    json.dumps(list(candidate_ids)), search_pattern))
+        return self._with_occurrences([dict(row) for row in self.cursor.fetchall()], 'search', None, None, None)
 
     def get_tags_with_counts(self):
         """Собирает все уникальные теги из всех незавершенных задач."""
@@ -162,26 +569,37 @@ class DatabaseManager:
 
     def add_reminder(self, task_id, reminder_datetime):
         """Добавляет напоминание для задачи."""
+        self._ensure_hot(task_id)
         self.cursor.execute("INSERT INTO reminders (task_id, reminder_datetime) VALUES (?, ?)", (task_id, reminder_datetime))
         self.conn.commit()
 
     def get_reminders_for_task(self, task_id):
-        """Получает все напоминания для конкретной задачи."""
-        self.cursor.execute("SELECT * FROM reminders WHERE task_id = ? ORDER BY reminder_datetime ASC", (task_id,))
+        """Получает все напоминания для конкретной задачи (в том числе архивной)."""
+        self.cursor.execute(f"SELECT * FROM {self.archive.reminders_source()} WHERE task_id = ? "
+                            "ORDER BY reminder_datetime ASC", (task_id,))
         return [dict(row) for row in self.cursor.fetchall()]
 
     def delete_reminder(self, reminder_id):
         """Удаляет конкретное напоминание по его ID."""
+        row = self.conn.execute(
+            f"SELECT task_id FROM {self.archive.reminders_source()} WHERE id = ?", (reminder_id,)).fetchone()
+        if row is not None:
+            self._ensure_hot(row[0])
         self.cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
         self.conn.commit()
         
     def replace_all_reminders_for_task(self, task_id, datetimes_list):
         """Полностью заменяет все напоминания для задачи."""
+        self._ensure_hot(task_id)
+        self._write_reminders(task_id, datetimes_list)
+        self.conn.commit()
+
+    def _write_reminders(self, task_id, datetimes_list):
+        """Заменяет напоминания задачи без commit."""
         self.cursor.execute("DELETE FROM reminders WHERE task_id = ?", (task_id,))
         if datetimes_list:
             data_to_insert = [(task_id, dt) for dt in datetimes_list]
             self.cursor.executemany("INSERT INTO reminders (task_id, reminder_datetime) VALUES (?, ?)", data_to_insert)
-        self.conn.commit()
 
     def get_due_reminders(self, current_datetime_iso):
         """Получает все напоминания, время которых уже наступило."""
@@ -195,5 +613,7 @@ class DatabaseManager:
         return [dict(row) for row in self.cursor.fetchall()]
 
     def close(self):
-        """Закрывает соединение с БД."""
+        """Закрывает соединение с БД, обновив статистику планировщика по накопленным запросам."""
+        if not self.readonly:
+            self.conn.execute("PRAGMA optimize")
         self.conn.close()
\ No newline at end of file
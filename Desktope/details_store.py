@@ -0,0 +1,149 @@
+# details_store.py
+
+import json
+import re
+import sqlite3
+import zlib
+
+from archive import ARCHIVE_SCHEMA
+
+COMPRESS_THRESHOLD = 1024   # Байт UTF-8: более короткие детали хранятся как есть
+COMPRESSION_LEVEL = 6
+PREVIEW_CHARS = 200         # Длина превью деталей в строке задачи для списков
+MIGRATION_BATCH_SIZE = 1000
+WHITESPACE = re.compile(r"\s+")
+
+DETAILS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}.task_details (
+        task_id INTEGER PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+        compressed INTEGER NOT NULL DEFAULT 0,
+        body NOT NULL DEFAULT ''
+    )
+'''
+
+
+def encode_details(text):
+    """Тело для task_details: (текст или сжатые zlib байты, признак сжатия)."""
+    text = text or ''
+    raw = text.encode('utf-8')
+    if len(raw) > COMPRESS_THRESHOLD:
+        packed = zlib.compress(raw, COMPRESSION_LEVEL)
+        if len(packed) < len(raw):
+            return packed, 1
+    return text, 0
+
+
+def decode_details(body, compressed, max_chars=None):
+    """Текст деталей из тела task_details; max_chars ограничивает распаковку началом текста."""
+    if body is None:
+        return ''
+    if not compressed:
+        text = body
+    elif max_chars is None:
+        text = zlib.decompress(body).decode('utf-8')
+    else:
+        # Символ UTF-8 занимает не больше 4 байт — распаковывать дальше не нужно
+        text = zlib.decompressobj().decompress(body, max_chars * 4).decode('utf-8', errors='ignore')
+    return text if max_chars is None else text[:max_chars]
+
+
+def make_preview(text):
+    """Начало деталей одной строкой для списков задач."""
+    if not text:
+        return ''
+    head = text[:PREVIEW_CHARS * 4]
+    preview = WHITESPACE.sub(' ', head).strip()
+    if len(preview) > PREVIEW_CHARS or len(head) < len(text):
+        return preview[:PREVIEW_CHARS].rstrip() + '…'
+    return preview
+
+
+class DetailsStore:
+    """Детали задач в отдельной таблице task_details со сжатием длинных текстов.
+
+    В строке задачи хранится только короткое превью (details_preview), поэтому
+    списки не читают полные тексты; полный текст загружается по запросу
+    (подсказка, окно редактирования, отчеты). У каждой задачи есть строка
+    в task_details: изменение деталей — всегда UPDATE, который видит триггер журнала.
+    Для SQL доступна функция details_text(body, compressed[, max_chars]).
+    """
+    def __init__(self, conn, archive):
+        self.conn = conn
+        self.archive = archive
+        conn.create_function('details_text', 2, decode_details, deterministic=True)
+        conn.create_function('details_text', 3, decode_details, deterministic=True)
+
+    def create_schema(self, schema="main"):
+        """Создает таблицу деталей в основной БД или в архиве."""
+        self.conn.execute(DETAILS_TABLE_SQL.format(schema=schema))
+        self.conn.commit()
+
+    def _sources(self):
+        schemas = ["main"] + ([ARCHIVE_SCHEMA] if self.archive.attached else [])
+        return [f"{schema}.task_details" for schema in schemas]
+
+    def get(self, task_id, max_chars=None):
+        """Полный текст деталей задачи (или его первые max_chars символов)."""
+        for source in self._sources():
+            row = self.conn.execute(f"SELECT body, compressed FROM {source} WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None:
+                return decode_details(row[0], row[1], max_chars)
+        return ''
+
+    def get_many(self, task_ids):
+        """Тексты деталей набора задач: {task_id: текст}."""
+        ids_json = json.dumps(list(task_ids))
+        details = {}
+        for source in self._sources():
+            rows = self.conn.execute(
+                f"SELECT task_id, body, compressed FROM {source} WHERE task_id IN (SELECT value FROM json_each(?))",
+                (ids_json,))
+            details.update((row[0], decode_details(row[1], row[2])) for row in rows)
+        return details
+
+    def insert_many(self, rows, schema="main"):
+        """Создает строки деталей для новых задач из пар (task_id, текст); без commit.
+
+        Превью записывает сам вызывающий код вместе со строкой задачи.
+        """
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {schema}.task_details (task_id, body, compressed) VALUES (?, ?, ?)",
+            [(task_id, *encode_details(text)) for task_id, text in rows])
+
+    def set_many(self, rows):
+        """Заменяет детали существующих задач по парам (task_id, текст) и обновляет превью; без commit."""
+        rows = [(task_id, text or '') for task_id, text in rows]
+        self.conn.executemany('''
+            INSERT INTO task_details (task_id, body, compressed) VALUES (?, ?, ?)
+            ON CONFLICT (task_id) DO UPDATE SET body = excluded.body, compressed = excluded.compressed
+        ''', [(task_id, *encode_details(text)) for task_id, text in rows])
+        self.conn.executemany("UPDATE tasks SET details_preview = ? WHERE id = ?",
+                              [(make_preview(text), task_id) for task_id, text in rows])
+
+    def migrate_inline(self, schema="main"):
+        """Переносит детали из колонки tasks.details (БД прежних версий) в task_details.
+
+        Колонка затем удаляется; SQLite старше 3.35 удалять колонки не умеет —
+        тогда она просто очищается. Возвращает число перенесенных задач.
+        """
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA {schema}.table_info(tasks)")}
+        if 'details' not in columns:
+            return 0
+        count, last_id = 0, 0
+        with self.conn:
+            while rows := self.conn.execute(
+                    f"SELECT id, details FROM {schema}.tasks WHERE id > ? AND details IS NOT NULL ORDER BY id LIMIT ?",
+                    (last_id, MIGRATION_BATCH_SIZE)).fetchall():
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO {schema}.task_details (task_id, body, compressed) VALUES (?, ?, ?)",
+                    [(row[0], *encode_details(row[1])) for row in rows])
+                self.conn.executemany(f"UPDATE {schema}.tasks SET details_preview = ? WHERE id = ?",
+                                      [(make_preview(row[1]), row[0]) for row in rows])
+                count += len(rows)
+                last_id = rows[-1][0]
+            self.conn.execute(f"INSERT OR IGNORE INTO {schema}.task_details (task_id) SELECT id FROM {schema}.tasks")
+            try:
+                self.conn.execute(f"ALTER TABLE {schema}.tasks DROP COLUMN details")
+            except sqlite3.OperationalError:
+                self.conn.execute(f"UPDATE {schema}.tasks SET details = NULL WHERE details IS NOT NULL")
+        return count
@@ -0,0 +1,372 @@
+# importer.py
+
+import csv
+import datetime
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+from archive import ARCHIVE_SCHEMA
+from details_store import make_preview
+
+IMPORT_BATCH_SIZE = 5000
+JSON_CHUNK_SIZE = 1024 * 1024  # Сколько символов массива JSON читается за раз
+
+# Допустимые имена колонок/ключей во входных данных для каждого поля задачи
+FIELD_ALIASES = {
+    'title': ('title', 'name', 'summary', 'subject', 'название'),
+    'details': ('details', 'description', 'body', 'notes', 'content', 'детали'),
+    'tags': ('tags', 'labels', 'keywords', 'теги'),
+    'due_date': ('due_date', 'due', 'deadline', 'date', 'срок'),
+    'is_important': ('is_important', 'important', 'starred', 'priority', 'важное'),
+    'is_completed': ('is_completed', 'completed', 'done', 'status', 'завершено'),
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', 'high', 'done', 'completed', 'closed'}
+
+
+@lru_cache(maxsize=65536)
+def normalize_tags(raw_tags: str) -> str:
+    """Нормализует строку тегов; кэш делает повторяющиеся наборы тегов бесплатными."""
+    return ','.join(tag.strip() for tag in raw_tags.split(',') if tag.strip())
+
+
+def content_hash(title, details, tags, due_date):
+    """Хэш содержимого задачи для пропуска дубликатов при повторном импорте."""
+    payload = "\x1f".join(str(part or '') for part in (title, details, tags, due_date))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _pick(record, field):
+    """Возвращает значение поля по первому найденному синониму (без учета регистра)."""
+    lowered = {str(key).strip().lower(): value for key, value in record.items()}
+    for alias in FIELD_ALIASES[field]:
+        if alias in lowered and lowered[alias] not in (None, ''):
+            return lowered[alias]
+    return None
+
+
+def _as_bool(value):
+    if isinstance(value, bool):
+        return value
+    return value is not None and str(value).strip().lower() in TRUE_VALUES
+
+
+def _as_date(value):
+    """Приводит дату к ISO-формату YYYY-MM-DD; нераспознанные значения отбрасываются."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()[:10]
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%Y"):
+        try:
+            return datetime.datetime.strptime(text[:10], fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_record(record):
+    """Превращает запись произвольного формата в строку для таблицы tasks или None."""
+    title = _pick(record, 'title')
+    if not title or not str(title).strip():
+        return None
+    tags = _pick(record, 'tags') or ''
+    if isinstance(tags, (list, tuple)):
+        tags = ','.join(str(tag) for tag in tags)
+    return {
+        'title': str(title).strip(),
+        'details': str(_pick(record, 'details') or '').strip(),
+        'tags': normalize_tags(str(tags)),
+        'due_date': _as_date(_pick(record, 'due_date')),
+        'is_important': _as_bool(_pick(record, 'is_important')),
+        'is_completed': _as_bool(_pick(record, 'is_completed')),
+    }
+
+
+# --- Парсеры источников ---
+
+def iter_csv(path):
+    """Потоково читает CSV с заголовком (разделитель определяется автоматически)."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(65536)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.DictReader(f, dialect=dialect)
+
+
+def iter_json_lines(path):
+    """Потоково читает JSON Lines: по одному объекту в строке."""
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json(path):
+    """Потоково читает .json: массив объектов разбирается по одному элементу, иначе файл читается как JSON Lines."""
+    with open(path, encoding='utf-8-sig') as f:
+        head = f.read(JSON_CHUNK_SIZE)
+        start = _WHITESPACE.match(head).end()
+        if head[start:start + 1] == '[':
+            yield from _iter_json_array(f, head, start + 1)
+            return
+    yield from iter_json_lines(path)
+
+
+def _iter_json_array(f, buffer, pos):
+    """Отдает элементы массива JSON из buffer начиная с pos, дочитывая файл f порциями."""
+    decoder = json.JSONDecoder()
+    after_item = False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            if buffer[pos] == ']':
+                return
+            if after_item:
+                if buffer[pos] != ',':
+                    raise ValueError(f"Ожидалась запятая между элементами массива JSON (символ {pos} порции)")
+                pos, after_item = pos + 1, False
+                continue
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                pass  # Элемент обрезан концом порции — дочитываем файл
+            else:
+                yield item
+                after_item = True
+                continue
+        chunk = f.read(JSON_CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Массив JSON поврежден или не закрыт")
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def parse_front_matter(text):
+    """Разбирает простой YAML-заголовок заметки (ключ: значение, списки) и возвращает (поля, тело)."""
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != '---':
+        return {}, text
+    meta, current_list = {}, None
+    for index, line in enumerate(lines[1:], start=1):
+        if line.strip() == '---':
+            return meta, "\n".join(lines[index + 1:])
+        if line.lstrip().startswith('- ') and current_list is not None:
+            meta[current_list].append(line.lstrip()[2:].strip().strip('"\''))
+            continue
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if not value:
+            meta[key], current_list = [], key
+        elif value.startswith('[') and value.endswith(']'):
+            meta[key] = [item.strip().strip('"\'') for item in value[1:-1].split(',') if item.strip()]
+            current_list = None
+        else:
+            meta[key], current_list = value.strip('"\''), None
+    return {}, text  # Незакрытый заголовок — считаем всю заметку текстом
+
+
+def iter_markdown_dir(path):
+    """Обходит папку заметок Markdown в стабильном порядке (важно для возобновления)."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(('.md', '.markdown')):
+                continue
+            with open(os.path.join(root, name), encoding='utf-8-sig') as f:
+                meta, body = parse_front_matter(f.read())
+            body = body.strip()
+            if 'title' not in meta:
+                first_line = body.splitlines()[0] if body else ''
+                if first_line.startswith('# '):
+                    meta['title'] = first_line[2:].strip()
+                    body = body[len(first_line):].strip()
+                else:
+                    meta['title'] = os.path.splitext(name)[0]
+            meta.setdefault('details', body)
+            yield meta
+
+
+def iter_source(path):
+    """Выбирает парсер по типу источника."""
+    if os.path.isdir(path):
+        return iter_markdown_dir(path)
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        return iter_json_lines(path)
+    if path.lower().endswith('.json'):
+        return iter_json(path)
+    return iter_csv(path)
+
+
+def source_fingerprint(path):
+    """Отпечаток источника: если файл изменился, импорт начинается заново."""
+    if os.path.isdir(path):
+        entries = [(os.path.join(root, name), os.path.getmtime(os.path.join(root, name)))
+                   for root, _, files in os.walk(path) for name in files]
+        return f"dir:{len(entries)}:{max((m for _, m in entries), default=0):.0f}"
+    stat = os.stat(path)
+    return f"file:{stat.st_size}:{stat.st_mtime:.0f}"
+
+
+class BulkImporter:
+    """Потоковый импорт больших коллекций задач пакетными транзакциями с возобновлением."""
+    def __init__(self, db, batch_size=IMPORT_BATCH_SIZE):
+        self.db = db
+        self.conn = db.conn
+        self.batch_size = batch_size
+        self._create_tables()
+
+    def _create_tables(self):
+        """Создает таблицу прогресса импорта и индекс по хэшу содержимого."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS import_progress (
+                source TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                imported INTEGER NOT NULL DEFAULT 0,
+                duplicates INTEGER NOT NULL DEFAULT 0,
+                finished BOOLEAN DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def _load_progress(self, source, fingerprint):
+        row = self.conn.execute("SELECT * FROM import_progress WHERE source = ?", (source,)).fetchone()
+        if row is None or row['fingerprint'] != fingerprint:
+            return {'position': 0, 'imported': 0, 'duplicates': 0, 'finished': False}
+        return {key: row[key] for key in ('position', 'imported', 'duplicates', 'finished')}
+
+    def _save_progress(self, source, fingerprint, progress, finished=False):
+        self.conn.execute('''
+            INSERT INTO import_progress (source, fingerprint, position, imported, duplicates, finished, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                fingerprint = excluded.fingerprint, position = excluded.position,
+                imported = excluded.imported, duplicates = excluded.duplicates,
+                finished = excluded.finished, updated_at = excluded.updated_at
+        ''', (source, fingerprint, progress['position'], progress['imported'],
+              progress['duplicates'], finished, datetime.datetime.now().isoformat()))
+
+    def _backfill_hashes(self):
+        """Вычисляет хэш содержимого задач, у которых его нет, порциями в отдельных транзакциях.
+
+        Хэша нет у задач из БД, созданных до его появления, и у вхождений повторяющихся
+        задач; без него импорт не узнал бы такие задачи и создал бы их дубликаты.
+        """
+        schemas = ['main'] + ([ARCHIVE_SCHEMA] if self.db.archive.attached else [])
+        for schema in schemas:
+            while rows := self.conn.execute(f'''
+                SELECT t.id, t.title, details_text(d.body, d.compressed), t.tags, t.due_date
+                FROM {schema}.tasks AS t LEFT JOIN {schema}.task_details AS d ON d.task_id = t.id
+                WHERE t.content_hash IS NULL LIMIT ?
+            ''', (self.batch_size,)).fetchall():
+                with self.conn:
+                    self.conn.executemany(f"UPDATE {schema}.tasks SET content_hash = ? WHERE id = ?", [
+                        (content_hash(title, details, tags, due_date), task_id)
+                        for task_id, title, details, tags, due_date in rows])
+
+    def _write_batch(self, rows):
+        """Вставляет пакет одним executemany, пропуская задачи с уже известным хэшем.
+
+        В tasks пишется превью деталей; полные детали вставленных задач
+        затем добавляются в task_details по хэшу содержимого.
+        """
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM main.tasks").fetchone()[0]
+        cursor = self.conn.executemany('''
+            INSERT INTO tasks (title, details_preview, tags, due_date, is_completed, is_important, created_at, content_hash)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM main.tasks WHERE content_hash = ?)
+              AND NOT EXISTS (SELECT 1 FROM archive.tasks WHERE content_hash = ?)
+        ''', [(row[0], make_preview(row[1]), *row[2:]) for row in rows])
+        inserted = cursor.rowcount
+        details = {row[7]: row[1] for row in rows}
+        new_tasks = self.conn.execute("SELECT id, content_hash FROM main.tasks WHERE id > ?", (last_id,))
+        self.db.details.insert_many((task_id, details[digest]) for task_id, digest in new_tasks.fetchall())
+        return inserted
+
+    def import_path(self, path, progress=None, should_stop=None):
+        """Импортирует файл CSV, JSON (массив объектов или JSON Lines) или папку Markdown.
+
+        progress(dict) вызывается после каждого пакета; should_stop() позволяет
+        прервать импорт между пакетами. Прерванный импорт продолжается с места
+        остановки при следующем вызове для того же неизмененного источника.
+        Записи, совпадающие по содержимому с уже существующими задачами (в том числе
+        добавленными вручную), пропускаются.
+        """
+        self._backfill_hashes()
+        source = os.path.abspath(path)
+        fingerprint = source_fingerprint(source)
+        state = self._load_progress(source, fingerprint)
+        state['skipped'] = 0
+        if state['finished']:
+            state['position'] = 0  # Повторный импорт того же источника: дубликаты отсеются по хэшу
+            state['imported'] = state['duplicates'] = 0
+
+        now = datetime.datetime.now().isoformat()
+        first_new_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM main.tasks").fetchone()[0]
+        batch, seen_hashes, consumed = [], set(), 0
+        for consumed, record in enumerate(iter_source(source), start=1):
+            if consumed <= state['position']:
+                continue
+            task = normalize_record(record)
+            if task is None:
+                state['skipped'] += 1
+            else:
+                digest = content_hash(task['title'], task['details'], task['tags'], task['due_date'])
+                if digest in seen_hashes:
+                    state['duplicates'] += 1
+                else:
+                    seen_hashes.add(digest)
+                    batch.append((task['title'], task['details'], task['tags'], task['due_date'],
+                                  task['is_completed'], task['is_important'], now, digest, digest, digest))
+            if consumed - state['position'] >= self.batch_size:
+                self._commit_batch(source, fingerprint, state, batch, consumed)
+                batch, seen_hashes = [], set()
+                if progress:
+                    progress(dict(state))
+                if should_stop and should_stop():
+                    self._index_links(first_new_id)
+                    return dict(state, interrupted=True)
+
+        self._commit_batch(source, fingerprint, state, batch, max(consumed, state['position']), finished=True)
+        self._index_links(first_new_id)
+        if progress:
+            progress(dict(state))
+        return dict(state, interrupted=False)
+
+    def _index_links(self, first_new_id):
+        """Индексирует ссылки [[...]] в импортированных задачах одним проходом после вставки.
+
+        Проход после всех пакетов позволяет разрешить ссылки на заметки, импортированные позже,
+        а также ссылки из уже существовавших заметок на импортированные.
+        """
+        with self.conn:
+            rows = self.conn.execute('''
+                SELECT task_id, details_text(body, compressed) AS details FROM main.task_details
+                WHERE task_id >= ? AND details_text(body, compressed) LIKE '%[[%'
+            ''', (first_new_id,))
+            self.db.links.update_links_bulk(rows.fetchall())
+            # Ссылки из ранее сохраненных заметок на импортированные задачи
+            new_tasks = self.conn.execute("SELECT id, title FROM main.tasks WHERE id >= ?", (first_new_id,)).fetchall()
+            self.db.links.refresh_targets([row[0] for row in new_tasks], [row[1] for row in new_tasks])
+
+    def _commit_batch(self, source, fingerprint, state, batch, position, finished=False):
+        """Записывает пакет и позицию в источнике в одной транзакции."""
+        with self.conn:
+            inserted = self._write_batch(batch) if batch else 0
+            state['imported'] += inserted
+            state['duplicates'] += len(batch) - inserted
+            state['position'] = position
+            state['finished'] = finished
+            self._save_progress(source, fingerprint, state, finished)
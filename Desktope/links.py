@@ -0,0 +1,217 @@
+# links.py
+
+import json
+import re
+
+# [[123]] — ссылка по ID, [[Название]] — ссылка по названию задачи
+LINK_PATTERN = re.compile(r"\[\[([^\[\]\n]{1,200})\]\]")
+MAX_TRAVERSAL_DEPTH = 5
+
+
+def extract_references(text):
+    """Возвращает множество ссылок текста: ID задач (строкой из цифр) и названия."""
+    refs = set()
+    for match in LINK_PATTERN.finditer(text or ""):
+        if ref := match.group(1).strip():
+            refs.add(ref)
+    return refs
+
+
+class LinkIndex:
+    """Индекс связей между заметками, извлеченных из ссылок [[...]] в деталях задач.
+
+    Сами ссылки хранятся в link_refs — и разрешенные, и пока «висячие», —
+    а links содержит то, во что они разрешаются сейчас. Когда появляется
+    задача или меняется название, пересчитываются только источники,
+    ссылающиеся на ее ID или название (refresh_targets). Связи хранятся по ID
+    и переживают перенос задач в архив: концы связей ищутся и в основной,
+    и в архивной таблице.
+    """
+    def __init__(self, conn, archive):
+        self.conn = conn
+        self.archive = archive
+
+    def _tasks_source(self, marked=False):
+        return self.archive.union_source(['id', 'title', 'is_completed'], marked=marked)
+
+    def create_schema(self):
+        """Создает таблицы ссылок и связей с индексами для прямых и обратных ссылок."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS links (
+                source_id INTEGER NOT NULL,
+                target_id INTEGER NOT NULL,
+                PRIMARY KEY (source_id, target_id)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_links_target ON links (target_id, source_id)")
+        # Поиск ссылок [[Название]] по точному названию задачи
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_title ON tasks (title)")
+        self.conn.commit()
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'link_refs'").fetchone():
+            return
+        # БД прежних версий: ссылки извлекаются из уже сохраненных деталей одной транзакцией
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE link_refs (
+                    source_id INTEGER NOT NULL,
+                    ref TEXT NOT NULL,
+                    PRIMARY KEY (source_id, ref)
+                ) WITHOUT ROWID
+            ''')
+            self.conn.execute("CREATE INDEX idx_link_refs_ref ON link_refs (ref, source_id)")
+            rows = self.conn.execute('''
+                SELECT task_id, details_text(body, compressed) FROM task_details
+                WHERE compressed OR body LIKE '%[[%'
+            ''').fetchall()
+            self.update_links_bulk(rows)
+
+    def _resolve(self, refs):
+        """Превращает ссылки в множество ID существующих задач (в том числе архивных)."""
+        ids = [int(ref) for ref in refs if ref.isdigit()]
+        titles = [ref for ref in refs if not ref.isdigit()]
+        targets = set()
+        if ids:
+            placeholders = ", ".join("?" for _ in ids)
+            targets.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM {self._tasks_source()} WHERE id IN ({placeholders})", ids))
+        if titles:
+            placeholders = ", ".join("?" for _ in titles)
+            targets.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM {self._tasks_source()} WHERE title IN ({placeholders})", titles))
+        return targets
+
+    def _sync_links(self, source_id, refs):
+        """Приводит исходящие связи source_id к тому, во что сейчас разрешаются refs."""
+        new_targets = self._resolve(refs) - {source_id}
+        old_targets = {row[0] for row in self.conn.execute(
+            "SELECT target_id FROM links WHERE source_id = ?", (source_id,))}
+        if removed := old_targets - new_targets:
+            self.conn.executemany("DELETE FROM links WHERE source_id = ? AND target_id = ?",
+                                  [(source_id, target) for target in removed])
+        if added := new_targets - old_targets:
+            self.conn.executemany("INSERT OR IGNORE INTO links (source_id, target_id) VALUES (?, ?)",
+                                  [(source_id, target) for target in added])
+
+    def update_links(self, task_id, details):
+        """Пересчитывает ссылки задачи, изменяя только разницу со старым набором.
+
+        Не выполняет commit — вызывается внутри транзакции записи задачи.
+        """
+        refs = extract_references(details)
+        old_refs = {row[0] for row in self.conn.execute("SELECT ref FROM link_refs WHERE source_id = ?", (task_id,))}
+        if removed := old_refs - refs:
+            self.conn.executemany("DELETE FROM link_refs WHERE source_id = ? AND ref = ?",
+                                  [(task_id, ref) for ref in removed])
+        if added := refs - old_refs:
+            self.conn.executemany("INSERT INTO link_refs (source_id, ref) VALUES (?, ?)",
+                                  [(task_id, ref) for ref in added])
+        self._sync_links(task_id, refs)
+
+    def update_links_bulk(self, rows):
+        """Индексирует ссылки для пар (task_id, details), например после импорта."""
+        for task_id, details in rows:
+            if details and "[[" in details:
+                self.update_links(task_id, details)
+
+    def refresh_targets(self, task_ids=(), titles=()):
+        """Заново разрешает ссылки на указанные ID и названия (новая задача, переименование).
+
+        Так «висячая» ссылка [[Название]] начинает работать, когда задача с этим
+        названием появляется, а ссылка по старому названию переименованной задачи
+        перестает на нее указывать. Не выполняет commit.
+        """
+        refs = [str(task_id) for task_id in task_ids] + [title for title in titles if title]
+        if not refs:
+            return 0
+        sources = [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT source_id FROM link_refs WHERE ref IN (SELECT value FROM json_each(?))",
+            (json.dumps(refs),))]
+        for source_id in sources:
+            self._sync_links(source_id, {row[0] for row in self.conn.execute(
+                "SELECT ref FROM link_refs WHERE source_id = ?", (source_id,))})
+        return len(sources)
+
+    def remove_task(self, task_id):
+        """Удаляет все связи задачи (при ее удалении)."""
+        self.conn.execute("DELETE FROM links WHERE source_id = ? OR target_id = ?", (task_id, task_id))
+        self.conn.execute("DELETE FROM link_refs WHERE source_id = ?", (task_id,))
+
+    def get_outgoing(self, task_id):
+        """Задачи, на которые ссылается данная; archived=1 у задач из архива."""
+        rows = self.conn.execute(f'''
+            SELECT tasks.id, tasks.title, tasks.is_completed, tasks.archived
+            FROM links l JOIN {self._tasks_source(marked=True)} ON tasks.id = l.target_id
+            WHERE l.source_id = ? ORDER BY tasks.title
+        ''', (task_id,))
+        return [dict(row) for row in rows.fetchall()]
+
+    def get_backlinks(self, task_id):
+        """Задачи, которые ссылаются на данную; archived=1 у задач из архива."""
+        rows = self.conn.execute(f'''
+            SELECT tasks.id, tasks.title, tasks.is_completed, tasks.archived
+            FROM links l JOIN {self._tasks_source(marked=True)} ON tasks.id = l.source_id
+            WHERE l.target_id = ? ORDER BY tasks.title
+        ''', (task_id,))
+        return [dict(row) for row in rows.fetchall()]
+
+    def get_neighbors(self, task_id):
+        """ID соседей задачи в обоих направлениях."""
+        rows = self.conn.execute('''
+            SELECT target_id FROM links WHERE source_id = ?
+            UNION
+            SELECT source_id FROM links WHERE target_id = ?
+        ''', (task_id, task_id))
+        return {row[0] for row in rows}
+
+    def traverse(self, task_id, max_depth=2, limit=1000):
+        """Обход графа на max_depth шагов без учета направления ссылок: {ID задачи: расстояние}.
+
+        Рекурсивный CTE с одним рекурсивным SELECT (его понимает и SQLite старше 3.34):
+        шаг соединяет узел со связями, где он источник или цель, по обоим индексам.
+        UNION отбрасывает повторные пары (узел, глубина), поэтому циклы обход не
+        зацикливают; глубина ограничена и MAX_TRAVERSAL_DEPTH, а limit ограничивает
+        размер ответа на плотных графах.
+        """
+        max_depth = max(0, min(max_depth, MAX_TRAVERSAL_DEPTH))
+        rows = self.conn.execute('''
+            WITH RECURSIVE reach(node, depth) AS (
+                SELECT ?, 0
+                UNION
+                SELECT CASE WHEN l.source_id = reach.node THEN l.target_id ELSE l.source_id END, reach.depth + 1
+                FROM reach JOIN links AS l ON l.source_id = reach.node OR l.target_id = reach.node
+                WHERE reach.depth < ?
+            )
+            SELECT node, MIN(depth) AS distance FROM reach
+            GROUP BY node ORDER BY distance, node LIMIT ?
+        ''', (task_id, max_depth, limit))
+        return {row['node']: row['distance'] for row in rows}
+
+    def get_task_graph(self, task_id, max_depth=2, limit=300):
+        """Узлы и ребра окрестности задачи на max_depth шагов (для визуализации).
+
+        У узлов есть distance — число шагов от задачи; задачи из архива тоже входят в граф.
+        """
+        distances = self.traverse(task_id, max_depth, limit)
+        nodes = [dict(row, distance=distances[row['id']]) for row in self.conn.execute(
+            f"SELECT id, title, is_completed FROM {self._tasks_source()} WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(distances)),))]
+        nodes.sort(key=lambda node: (node['distance'], node['title']))
+        return nodes, self._edges_between([node['id'] for node in nodes])
+
+    def _edges_between(self, node_ids):
+        """Связи, у которых оба конца входят в node_ids."""
+        if not node_ids:
+            return []
+        ids = json.dumps(node_ids)
+        return [tuple(row) for row in self.conn.execute('''
+            SELECT source_id, target_id FROM links
+            WHERE source_id IN (SELECT value FROM json_each(?)) AND target_id IN (SELECT value FROM json_each(?))
+        ''', (ids, ids))]
+
+    def get_tag_graph(self, tag, limit=300):
+        """Узлы и ребра подграфа задач с указанным тегом (для визуализации кластера)."""
+        tag_condition = "(tags = ? OR tags LIKE ? OR tags LIKE ? OR tags LIKE ?)"
+        tag_params = [tag, f'{tag},%', f'%,{tag},%', f'%,{tag}']
+        nodes = [dict(row) for row in self.conn.execute(
+            f"SELECT id, title, is_completed FROM tasks WHERE {tag_condition} LIMIT ?", tag_params + [limit])]
+        return nodes, self._edges_between([node['id'] for node in nodes])
@@ -2,23 +2,39 @@
 
 import sys
 import os
+import math
+import multiprocessing
 import datetime
+import sqlite3
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel,
     QLineEdit, QPushButton, QListWidget, QListWidgetItem, QCalendarWidget,
     QScrollArea, QCheckBox, QToolTip, QDialog, QFormLayout, QTextEdit,
     QDateEdit, QDialogButtonBox, QMenu, QFrame, QMessageBox, QDateTimeEdit,
-    QFileDialog
+    QFileDialog, QProgressBar, QProgressDialog, QGraphicsView, QGraphicsScene,
+    QComboBox, QInputDialog
 )
 from PyQt6.QtGui import (
-    QIcon, QFont, QPalette, QColor, QPainter, QCursor
+    QIcon, QFont, QPalette, QColor, QPainter, QCursor, QPen, QBrush, QShortcut, QKeySequence
 )
 from PyQt6.QtCore import (
     Qt, QSize, pyqtSignal, QDate, QPropertyAnimation, QEasingCurve, QDateTime,
-    QParallelAnimationGroup, QAbstractAnimation, QPoint, QTimer
+    QParallelAnimationGroup, QAbstractAnimation, QPoint, QTimer, QObject, QEvent,
+    QThread, QElapsedTimer
 )
 
 from database import DatabaseManager
+from archive import ARCHIVE_BATCH_SIZE
+from backup import DatabaseBackups
+from importer import BulkImporter
+from recurrence import RULE_PRESETS, normalize_rule
+from links import MAX_TRAVERSAL_DEPTH
+from analytics import ALL_TAGS, NO_TAG
+from smart_views import SMART_VIEWS
+from workspaces import WorkspaceRegistry, WorkspaceManager, workspace_name
+from commands import (
+    CommandJournal, AddTaskCommand, EditTaskCommand, CompleteOccurrenceCommand, BulkEditCommand, BulkDeleteCommand
+)
 
 # --- Зависимость для экспорта в Excel ---
 try:
@@ -29,6 +45,13 @@ try:
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
+FLUSH_DELAY_MS = 300  # Задержка записи накопленных кликов (статус, важность) одной транзакцией
+IDLE_THRESHOLD_MS = 120000  # Через сколько мс без ввода пользователя приложение считается простаивающим
+TOOLTIP_MAX_CHARS = 1000  # Сколько символов деталей показывает всплывающая подсказка задачи
+TASK_GRAPH_DEPTH = 2  # Шагов по ссылкам в графе связей задачи при открытии
+MIDNIGHT_MARGIN_MS = 1000  # Запас после полуночи, чтобы таймер не сработал раньше смены даты
+SEARCH_EVERYWHERE_DELAY_MS = 300  # Поиск по всем пространствам запускается после паузы в наборе
+
 # --- Вспомогательные функции ---
 
 def clear_layout(layout):
@@ -60,6 +83,165 @@ def colorize_icon(icon: QIcon, color: QColor) -> QIcon:
     painter.end()
     return QIcon(pixmap)
 
+def format_size(num_bytes):
+    """Форматирует размер в байтах для отображения пользователю."""
+    for unit in ("Б", "КБ", "МБ"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} ГБ"
+
+def format_backup_stats(stats):
+    """Краткая сводка о снимке: объем, скорость и время блокировки БД."""
+    return (f"{format_size(stats['db_bytes'])} → {format_size(stats['compressed_bytes'])} "
+            f"за {stats['duration']:.2f} с ({stats['throughput_mb_s']:.1f} МБ/с), "
+            f"блокировка БД: {stats['locked_total'] * 1000:.0f} мс "
+            f"(макс. шаг {stats['locked_max'] * 1000:.1f} мс)")
+
+def format_maintenance_report(report):
+    """Краткая сводка обслуживания БД: освобожденное место, фрагментация и время блокировки."""
+    reclaimed = sum(stats['reclaimed_bytes'] for stats in report['schemas'].values())
+    main_stats = report['schemas'].get('main', {})
+    integrity = report['integrity']
+    status = ("целостность: ok" if integrity == [] else
+              f"ошибок целостности: {len(integrity)}" if integrity else "проверка не завершена")
+    compacted = f", журнал изменений: −{report['changes_compacted']} записей" if report.get('changes_compacted') else ""
+    return (f"освобождено {format_size(reclaimed)}{compacted}, фрагментация "
+            f"{main_stats.get('fragmentation_before', 0):.0%} → {main_stats.get('fragmentation_after', 0):.0%}, "
+            f"{status}, за {report['duration']:.2f} с (макс. блокировка {report['locked_max'] * 1000:.0f} мс)")
+
+def create_recurrence_combo(rule=None):
+    """Выпадающий список правил повторения; нестандартное правило добавляется отдельным пунктом."""
+    combo = QComboBox()
+    for label, preset in RULE_PRESETS:
+        combo.addItem(label, preset)
+    rule = normalize_rule(rule) if rule else None
+    index = combo.findData(rule)
+    if index < 0:
+        combo.addItem(f"Особое правило: {rule}", rule)
+        index = combo.count() - 1
+    combo.setCurrentIndex(index)
+    return combo
+
+# --- Фоновые задачи ---
+
+class IdleWatcher(QObject):
+    """Фильтр событий приложения, отслеживающий время с последнего действия пользователя."""
+    ACTIVITY_EVENTS = (QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress,
+                       QEvent.Type.MouseMove, QEvent.Type.Wheel)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.last_activity = QElapsedTimer()
+        self.last_activity.start()
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.ACTIVITY_EVENTS:
+            self.last_activity.restart()
+        return False
+
+    def is_idle(self, threshold_ms=IDLE_THRESHOLD_MS):
+        """Проверяет, прошло ли threshold_ms без ввода пользователя."""
+        return self.last_activity.elapsed() >= threshold_ms
+
+class BackupWorker(QThread):
+    """Делает снимок БД в фоновом потоке, чтобы копирование не блокировало интерфейс."""
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, backups, parent=None):
+        super().__init__(parent)
+        self.backups = backups
+
+    def run(self):
+        try:
+            self.completed.emit(self.backups.create_snapshot(progress=self.progress.emit))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class MaintenanceWorker(QThread):
+    """Обслуживает файлы БД в фоновом потоке через собственное соединение."""
+    completed = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, maintenance, should_continue=None, allow_full_vacuum=False, compact_up_to=0, parent=None):
+        super().__init__(parent)
+        self.maintenance = maintenance
+        self.should_continue = should_continue
+        self.allow_full_vacuum = allow_full_vacuum
+        self.compact_up_to = compact_up_to
+
+    def run(self):
+        try:
+            self.completed.emit(self.maintenance.run(self.should_continue, self.allow_full_vacuum, self.compact_up_to))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class SearchIndexWorker(QThread):
+    """Догоняет индексы поиска в фоновом потоке через собственные соединения."""
+    failed = pyqtSignal(str)
+
+    def __init__(self, indexes, should_continue, parent=None):
+        super().__init__(parent)
+        self.indexes = indexes
+        self.should_continue = should_continue
+
+    def run(self):
+        try:
+            for index in self.indexes:
+                index.refresh_detached(lambda: self.should_continue() and not self.isInterruptionRequested())
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class SearchEverywhereWorker(QThread):
+    """Собирает результаты поиска по всем рабочим пространствам по мере их готовности."""
+    partial = pyqtSignal(list, int, int)  # Слитые результаты, готово пространств, всего
+    completed = pyqtSignal(list)           # Пространства, поиск в которых завершился ошибкой
+    failed = pyqtSignal(str)
+
+    def __init__(self, workspaces, query, fuzzy, parent=None):
+        super().__init__(parent)
+        self.workspaces = workspaces
+        self.query = query
+        self.fuzzy = fuzzy
+
+    def run(self):
+        total = len(self.workspaces.registry.entries)
+        errors = []
+        try:
+            for done, (merged, entry, error) in enumerate(self.workspaces.search_everywhere(self.query, self.fuzzy), 1):
+                if self.isInterruptionRequested():
+                    return  # Запрос устарел: пользователь уже ищет другое
+                if error is not None:
+                    errors.append(f"{entry['name']}: {error}")
+                self.partial.emit(merged, done, total)
+            self.completed.emit(errors)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class ImportWorker(QThread):
+    """Импортирует коллекцию задач в фоновом потоке через собственное соединение с БД."""
+    progress = pyqtSignal(dict)
+    completed = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_name, source_path, parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.source_path = source_path
+
+    def run(self):
+        db = DatabaseManager(self.db_name)
+        try:
+            importer = BulkImporter(db)
+            self.completed.emit(importer.import_path(self.source_path, progress=self.progress.emit,
+                                                     should_stop=self.isInterruptionRequested))
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            db.close()
+
 # --- Классы виджетов ---
 
 class ClickableLabel(QLabel):
@@ -143,11 +325,13 @@ class AddTaskDialog(QDialog):
         self.due_date_edit = QDateEdit(self)
         self.due_date_edit.setCalendarPopup(True)
         self.due_date_edit.setDate(QDate.currentDate())
+        self.recurrence_combo = create_recurrence_combo()
         self.important_check = QCheckBox("Отметить как важное")
         form_layout.addRow("Название:", self.title_edit)
         form_layout.addRow("Детали:", self.details_edit)
         form_layout.addRow("Теги (через запятую):", self.tags_edit)
         form_layout.addRow("Срок выполнения:", self.due_date_edit)
+        form_layout.addRow("Повторять:", self.recurrence_combo)
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
@@ -161,11 +345,12 @@ class AddTaskDialog(QDialog):
                 "details": self.details_edit.toPlainText().strip(),
                 "tags": self.tags_edit.text().strip(),
                 "due_date": self.due_date_edit.date().toPyDate().isoformat(),
-                "is_important": self.important_check.isChecked()}
+                "is_important": self.important_check.isChecked(),
+                "recurrence_rule": self.recurrence_combo.currentData()}
 
 class EditTaskDialog(QDialog):
     """Диалог для редактирования существующей задачи и ее напоминаний."""
-    def __init__(self, task_data, reminders, parent=None):
+    def __init__(self, task_data, reminders, parent=None, backlinks=None, show_graph=None):
         super().__init__(parent)
         self.setWindowTitle("Редактировать задачу")
         self.setMinimumWidth(450)
@@ -174,14 +359,17 @@ class EditTaskDialog(QDialog):
         self.title_edit = QLineEdit()
         self.details_edit = QTextEdit()
         self.details_edit.setAcceptRichText(False)
+        self.details_edit.setPlaceholderText("Ссылки на другие задачи: [[ID]] или [[Название]]")
         self.tags_edit = QLineEdit()
         self.due_date_edit = QDateEdit(self)
         self.due_date_edit.setCalendarPopup(True)
+        self.recurrence_combo = create_recurrence_combo(task_data.get('recurrence_rule'))
         self.important_check = QCheckBox("Отметить как важное")
         form_layout.addRow("Название:", self.title_edit)
         form_layout.addRow("Детали:", self.details_edit)
         form_layout.addRow("Теги (через запятую):", self.tags_edit)
         form_layout.addRow("Срок выполнения:", self.due_date_edit)
+        form_layout.addRow("Повторять:", self.recurrence_combo)
         self.layout.addLayout(form_layout)
         self.layout.addWidget(self.important_check)
 
@@ -210,10 +398,26 @@ class EditTaskDialog(QDialog):
         reminder_controls_layout.addWidget(add_reminder_btn)
         self.layout.addLayout(reminder_controls_layout)
 
+        # Обратные ссылки: задачи, которые ссылаются на эту через [[...]]
+        if backlinks:
+            self.layout.addWidget(QLabel(f"<b>Обратные ссылки ({len(backlinks)})</b>"))
+            backlinks_list = QListWidget()
+            backlinks_list.setMaximumHeight(100)
+            for link in backlinks:
+                archived = "  (в архиве)" if link.get('archived') else ""
+                item = QListWidgetItem(f"{'✔ ' if link['is_completed'] else ''}{link['title']}  [[{link['id']}]]{archived}")
+                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsSelectable)
+                backlinks_list.addItem(item)
+            self.layout.addWidget(backlinks_list)
+
         # Кнопки OK/Cancel
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
+        # Граф окрестности задачи по ссылкам — если у нее есть связи
+        if show_graph is not None:
+            graph_button = button_box.addButton("Граф связей...", QDialogButtonBox.ButtonRole.ActionRole)
+            graph_button.clicked.connect(lambda: show_graph(self))
         self.layout.addWidget(button_box)
         self.populate_data(task_data, reminders)
 
@@ -256,7 +460,8 @@ class EditTaskDialog(QDialog):
                 "details": self.details_edit.toPlainText().strip(),
                 "tags": self.tags_edit.text().strip(),
                 "due_date": self.due_date_edit.date().toPyDate().isoformat(),
-                "is_important": self.important_check.isChecked()}
+                "is_important": self.important_check.isChecked(),
+                "recurrence_rule": self.recurrence_combo.currentData()}
 
     def get_reminders_data(self):
         """Собирает список всех напоминаний из виджета."""
@@ -274,26 +479,316 @@ class ReportDialog(QDialog):
         self.end_date_edit = QDateEdit(self, calendarPopup=True, date=QDate.currentDate())
         form_layout.addRow("Начальная дата:", self.start_date_edit)
         form_layout.addRow("Конечная дата:", self.end_date_edit)
+        self.completed_only_check = QCheckBox("Только завершенные за период")
+        self.completed_only_check.setToolTip("Задачи, отмеченные выполненными в выбранные даты, независимо от срока.")
+        self.everywhere_check = QCheckBox("По всем рабочим пространствам")
+        self.everywhere_check.setVisible(bool(parent) and len(parent.workspaces.registry.entries) > 1)
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
         self.layout.addLayout(form_layout)
+        self.layout.addWidget(self.completed_only_check)
+        self.layout.addWidget(self.everywhere_check)
         self.layout.addWidget(button_box)
 
     def get_date_range(self):
         """Возвращает выбранный диапазон дат."""
         return {"start_date": self.start_date_edit.date().toPyDate().isoformat(), 
-                "end_date": self.end_date_edit.date().toPyDate().isoformat()}
+                "end_date": self.end_date_edit.date().toPyDate().isoformat(),
+                "completed_only": self.completed_only_check.isChecked(),
+                "everywhere": self.everywhere_check.isChecked()}
+
+class BackupDialog(QDialog):
+    """Диалог управления резервными копиями: создание снимка и восстановление."""
+    def __init__(self, main_window):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.setWindowTitle("Резервные копии")
+        self.setMinimumWidth(450)
+        self.layout = QVBoxLayout(self)
+        self.snapshots_list = QListWidget()
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+
+        buttons_layout = QHBoxLayout()
+        self.create_button = QPushButton("Создать снимок")
+        self.create_button.clicked.connect(self.start_backup)
+        restore_button = QPushButton("Восстановить")
+        restore_button.clicked.connect(self.restore_selected)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(self.create_button)
+        buttons_layout.addWidget(restore_button)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(close_button)
+
+        self.layout.addWidget(QLabel("<b>Снимки базы данных</b>"))
+        self.layout.addWidget(self.snapshots_list)
+        self.layout.addWidget(self.progress_bar)
+        self.layout.addWidget(self.status_label)
+        self.layout.addLayout(buttons_layout)
+        self.populate()
+        self.track_worker()
+
+    def populate(self):
+        """Заполняет список доступных снимков."""
+        self.snapshots_list.clear()
+        for stamp, path in self.main_window.backups.list_snapshots():
+            dt = QDateTime.fromString(stamp, "yyyyMMdd-HHmmss")
+            item = QListWidgetItem(f"{dt.toString('dd.MM.yyyy HH:mm:ss')}  •  {format_size(os.path.getsize(path))}")
+            item.setData(Qt.ItemDataRole.UserRole, stamp)
+            self.snapshots_list.addItem(item)
+
+    def start_backup(self):
+        """Запускает создание снимка и отслеживает его прогресс."""
+        self.main_window.start_backup()
+        self.track_worker()
+
+    def track_worker(self):
+        """Подписывается на прогресс фонового снимка, если он выполняется."""
+        if worker := self.main_window.backup_worker:
+            self.create_button.setEnabled(False)
+            self.status_label.setText("Создание снимка...")
+            worker.progress.connect(self.on_progress)
+            worker.finished.connect(self.on_backup_finished)
+
+    def on_progress(self, done, total):
+        """Отображает прогресс копирования страниц БД."""
+        self.progress_bar.show()
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def on_backup_finished(self):
+        """Обновляет список после завершения фонового снимка."""
+        self.progress_bar.hide()
+        self.create_button.setEnabled(True)
+        self.status_label.setText(self.main_window.last_backup_message)
+        self.populate()
+
+    def restore_selected(self):
+        """Восстанавливает выбранный снимок после подтверждения пользователя."""
+        item = self.snapshots_list.currentItem()
+        if item is None:
+            return
+        answer = QMessageBox.question(self, "Восстановление",
+                                      f"Заменить текущие данные снимком от {item.text().split('  •  ')[0]}?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        self.main_window.stop_search_index_refresh()
+        if self.main_window.backups.restore(item.data(Qt.ItemDataRole.UserRole)):
+            # Команды отмены относятся к данным до восстановления и к ним больше не применимы
+            self.main_window.journal.clear()
+            self.main_window.selected_ids.clear()
+            self.main_window.refresh_all_views(animated=True)
+            self.status_label.setText("Данные восстановлены из снимка.")
+        else:
+            QMessageBox.critical(self, "Ошибка", "Снимок не восстановлен: он поврежден или файл архива "
+                                                 "не удалось заменить. Текущие данные не изменены.")
+
+class LinkGraphDialog(QDialog):
+    """Граф связей между задачами (узлы по кругу, ребра — ссылки [[...]]).
+
+    Показывает кластер тега или окрестность задачи. Для окрестности передается
+    load_graph(depth) — тогда в диалоге можно выбрать число шагов обхода.
+    """
+    NODE_RADIUS = 9
+    DEPTH_CHOICES = [("1 шаг", 1), ("2 шага", 2), ("3 шага", 3), ("5 шагов", MAX_TRAVERSAL_DEPTH)]
+
+    def __init__(self, title, nodes, edges, parent=None, load_graph=None, depth=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Граф связей: {title}")
+        self.resize(700, 600)
+        layout = QVBoxLayout(self)
+        self.scene = QGraphicsScene(self)
+        view = QGraphicsView(self.scene)
+        view.setRenderHint(QPainter.RenderHint.Antialiasing)
+        view.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+        controls_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        controls_layout.addWidget(self.summary_label)
+        controls_layout.addStretch()
+        if load_graph is not None:
+            depth_combo = QComboBox()
+            for label, value in self.DEPTH_CHOICES:
+                depth_combo.addItem(label, value)
+            depth_combo.setCurrentIndex(max(0, depth_combo.findData(depth)))
+            depth_combo.currentIndexChanged.connect(
+                lambda: self.set_graph(*load_graph(depth_combo.currentData())))
+            controls_layout.addWidget(QLabel("Глубина:"))
+            controls_layout.addWidget(depth_combo)
+        layout.addLayout(controls_layout)
+        layout.addWidget(view)
+        self.set_graph(nodes, edges)
+
+    def set_graph(self, nodes, edges):
+        """Перерисовывает граф; узел с distance 0 (задача окрестности) ставится в центр."""
+        self.scene.clear()
+        self.summary_label.setText(f"Задач: {len(nodes)}, связей: {len(edges)}")
+        ring = [node for node in nodes if node.get('distance') != 0]
+        radius = max(150, len(ring) * 6)
+        positions = {node['id']: (0.0, 0.0) for node in nodes if node.get('distance') == 0}
+        for index, node in enumerate(ring):
+            angle = 2 * math.pi * index / max(len(ring), 1)
+            positions[node['id']] = (radius * math.cos(angle), radius * math.sin(angle))
+
+        edge_pen = QPen(QColor("#B0B0B0"))
+        for source_id, target_id in edges:
+            (x1, y1), (x2, y2) = positions[source_id], positions[target_id]
+            self.scene.addLine(x1, y1, x2, y2, edge_pen)
+
+        r = self.NODE_RADIUS
+        for node in nodes:
+            x, y = positions[node['id']]
+            if node.get('distance') == 0:
+                color = QColor("#F0AD4E")
+            else:
+                color = QColor("#C0C0C0") if node['is_completed'] else QColor("#0078D7")
+            ellipse = self.scene.addEllipse(x - r, y - r, 2 * r, 2 * r, QPen(Qt.PenStyle.NoPen), QBrush(color))
+            steps = f"\nШагов от задачи: {node['distance']}" if node.get('distance') else ""
+            ellipse.setToolTip(f"{node['title']}  [[{node['id']}]]{steps}")
+            label = self.scene.addText(node['title'][:30])
+            label.setDefaultTextColor(QColor("#333333"))
+            label.setPos(x + r, y - r)
+
+class StatisticsChart(QWidget):
+    """Столбчатая диаграмма по неделям (создано/завершено) с линией просроченных задач."""
+    CREATED_COLOR = QColor("#B8D4F0")
+    COMPLETED_COLOR = QColor("#0078D7")
+    OVERDUE_COLOR = QColor("#D9534F")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(600, 260)
+        self.weeks = []
+        self.overdue = []
+
+    def set_data(self, weeks, overdue):
+        """weeks — строки weekly_completion, overdue — значения просрочки на конец каждой недели."""
+        self.weeks = weeks
+        self.overdue = overdue
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        left, top, bottom = 40, 10, 30
+        width, height = self.width() - left - 10, self.height() - top - bottom
+        painter.setPen(QPen(QColor("#999999")))
+        painter.drawLine(left, top + height, left + width, top + height)
+        if not self.weeks:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "Нет данных за период")
+            return
+
+        peak = max([max(week['created'], week['completed']) for week in self.weeks] + self.overdue + [1])
+        painter.drawText(0, top + 10, left - 5, 12, Qt.AlignmentFlag.AlignRight, str(peak))
+        slot = width / len(self.weeks)
+        bar = max(1.0, slot * 0.35)
+        for index, week in enumerate(self.weeks):
+            x = left + index * slot + slot * 0.15
+            for offset, value, color in ((0, week['created'], self.CREATED_COLOR),
+                                         (bar, week['completed'], self.COMPLETED_COLOR)):
+                bar_height = height * value / peak
+                painter.fillRect(int(x + offset), int(top + height - bar_height), int(bar), int(bar_height), color)
+            if index % max(1, len(self.weeks) // 8) == 0:
+                label = datetime.date.fromisoformat(week['week']).strftime("%d.%m")
+                painter.drawText(int(x), top + height + 5, int(slot * 2), 20, Qt.AlignmentFlag.AlignLeft, label)
+
+        painter.setPen(QPen(self.OVERDUE_COLOR, 2))
+        points = [QPoint(int(left + (index + 0.5) * slot), int(top + height - height * value / peak))
+                  for index, value in enumerate(self.overdue)]
+        for start, end in zip(points, points[1:]):
+            painter.drawLine(start, end)
+
+class StatisticsDialog(QDialog):
+    """Статистика по сводным таблицам: динамика по неделям, просрочка и итоги по тегам."""
+    PERIODS = [("12 недель", 12), ("Полгода", 26), ("Год", 52)]
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("Статистика")
+        self.resize(720, 560)
+        self.layout = QVBoxLayout(self)
+
+        controls_layout = QHBoxLayout()
+        self.period_combo = QComboBox()
+        for label, weeks in self.PERIODS:
+            self.period_combo.addItem(label, weeks)
+        self.tag_combo = QComboBox()
+        self.tag_combo.addItem("Все задачи", ALL_TAGS)
+        self.tag_combo.addItem("Без тега", NO_TAG)
+        for tag in self.db.analytics.tags():
+            self.tag_combo.addItem(tag, tag)
+        controls_layout.addWidget(QLabel("Период:"))
+        controls_layout.addWidget(self.period_combo)
+        controls_layout.addWidget(QLabel("Тег:"))
+        controls_layout.addWidget(self.tag_combo)
+        controls_layout.addStretch()
+
+        self.chart = StatisticsChart()
+        legend = QLabel("<span style='color:#B8D4F0'>■</span> Создано  "
+                        "<span style='color:#0078D7'>■</span> Завершено  "
+                        "<span style='color:#D9534F'>━</span> Просрочено")
+        self.summary_label = QLabel()
+        self.tags_list = QListWidget()
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        button_box.rejected.connect(self.reject)
+
+        self.layout.addLayout(controls_layout)
+        self.layout.addWidget(self.chart, 1)
+        self.layout.addWidget(legend)
+        self.layout.addWidget(self.summary_label)
+        self.layout.addWidget(QLabel("<b>Итоги по тегам</b>"))
+        self.layout.addWidget(self.tags_list)
+        self.layout.addWidget(button_box)
+
+        self.period_combo.currentIndexChanged.connect(self.refresh)
+        self.tag_combo.currentIndexChanged.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        """Перечитывает сводки за выбранный период и тег."""
+        today = datetime.date.today()
+        start = today - datetime.timedelta(weeks=self.period_combo.currentData())
+        start -= datetime.timedelta(days=start.weekday())  # С понедельника
+        tag = self.tag_combo.currentData()
+        weeks = self.db.analytics.weekly_completion(start.isoformat(), today.isoformat(), tag)
+        trend = dict(self.db.analytics.overdue_trend(start.isoformat(), today.isoformat(), tag))
+        # Просрочка на конец каждой недели (или на сегодня для текущей)
+        overdue = [trend.get(min(datetime.date.fromisoformat(week['week']) + datetime.timedelta(days=6), today).isoformat(), 0)
+                   for week in weeks]
+        self.chart.set_data(weeks, overdue)
+
+        created = sum(week['created'] for week in weeks)
+        completed = sum(week['completed'] for week in weeks)
+        rate = f"{completed / created:.0%}" if created else "—"
+        self.summary_label.setText(f"Создано: {created}, завершено: {completed}, доля завершения: {rate}, "
+                                   f"просрочено сейчас: {trend.get(today.isoformat(), 0)}")
+
+        self.tags_list.clear()
+        for row in self.db.analytics.tag_summary(start.isoformat(), today.isoformat()):
+            name = row['tag'] or "Без тега"
+            share = f"{row['completed'] / row['created']:.0%}" if row['created'] else "—"
+            self.tags_list.addItem(f"{row['place']}. {name}: создано {row['created']}, завершено {row['completed']} ({share})")
 
 class TaskWidget(QWidget):
     """Виджет для отображения одной задачи в списке."""
     status_changed = pyqtSignal(int, bool)
+    occurrence_completed = pyqtSignal(int, str)
     importance_changed = pyqtSignal(int, bool)
     edit_requested = pyqtSignal(int)
+    selection_requested = pyqtSignal(int, object)  # ID задачи и модификаторы клавиатуры
     
-    def __init__(self, task_data):
+    def __init__(self, task_data, details_loader=None):
         super().__init__()
         self.task_id = task_data['id']
+        # Полные детали загружаются только при первом показе подсказки
+        self.details_loader = details_loader if task_data.get('details_preview') else None
+        self.read_only = False
+        # Дата вхождения, если виджет показывает одно вхождение повторяющейся задачи
+        self.occurrence_date = task_data.get('occurrence_date')
         self.setObjectName("TaskWidget")
         # Начальные значения для анимации появления
         self.setWindowOpacity(0.0)
@@ -316,10 +811,12 @@ class TaskWidget(QWidget):
         title_label.setWordWrap(True)
         
         meta_text = []
+        if task_data.get('workspace_name'): meta_text.append(f"📁 {task_data['workspace_name']}")
         if task_data['tags']: meta_text.append(task_data['tags'])
         if task_data['due_date']:
             try: meta_text.append(datetime.date.fromisoformat(task_data['due_date']).strftime("%b %d"))
             except (ValueError, TypeError): pass
+        if task_data.get('recurrence_rule'): meta_text.append("🔁")
             
         meta_label = QLabel(" • ".join(meta_text))
         meta_label.setObjectName("TaskMeta")
@@ -340,7 +837,6 @@ class TaskWidget(QWidget):
         layout.addLayout(text_layout)
         layout.addStretch()
         layout.addWidget(self.star_button)
-        if task_data['details']: self.setToolTip(f"<b>Детали:</b><br>{task_data['details']}")
         
         self.update_visual_state(bool(task_data['is_completed']))
 
@@ -354,7 +850,10 @@ class TaskWidget(QWidget):
         """Сигнал при изменении состояния чекбокса."""
         is_completed = (state == Qt.CheckState.Checked.value)
         self.update_visual_state(is_completed)
-        self.status_changed.emit(self.task_id, is_completed)
+        if self.occurrence_date and is_completed:
+            self.occurrence_completed.emit(self.task_id, self.occurrence_date)
+        else:
+            self.status_changed.emit(self.task_id, is_completed)
 
     def on_importance_change(self):
         """Сигнал при нажатии на кнопку 'важное'."""
@@ -362,6 +861,39 @@ class TaskWidget(QWidget):
         self.star_button.setText("★" if is_important else "☆")
         self.importance_changed.emit(self.task_id, is_important)
 
+    def set_read_only(self):
+        """Задача другого рабочего пространства: только просмотр, без отметок и выделения."""
+        self.read_only = True
+        self.checkbox.setEnabled(False)
+        self.star_button.setEnabled(False)
+
+    def is_selectable(self):
+        """Участвует ли задача в массовых действиях (вхождения серий и чужие задачи — нет)."""
+        return not self.occurrence_date and not self.read_only
+
+    def set_selected(self, selected):
+        """Подсвечивает задачу, выбранную для массовых действий."""
+        self.setProperty("selected", selected)
+        self.style().unpolish(self)
+        self.style().polish(self)
+
+    def mousePressEvent(self, event):
+        """Сигнал выделения по клику (Ctrl — добавить/убрать, Shift — диапазон)."""
+        # Вхождения повторяющихся задач и задачи других пространств в массовых действиях не участвуют
+        if event.button() == Qt.MouseButton.LeftButton and self.is_selectable():
+            self.selection_requested.emit(self.task_id, event.modifiers())
+        super().mousePressEvent(event)
+
+    def event(self, event):
+        """Подгружает детали задачи для подсказки при первом наведении."""
+        if event.type() == QEvent.Type.ToolTip and self.details_loader:
+            details = self.details_loader(self.task_id)
+            self.details_loader = None
+            if len(details) > TOOLTIP_MAX_CHARS:
+                details = details[:TOOLTIP_MAX_CHARS].rstrip() + "…"
+            if details: self.setToolTip(f"<b>Детали:</b><br>{details}")
+        return super().event(event)
+
     def mouseDoubleClickEvent(self, event):
         """Сигнал для редактирования по двойному клику."""
         self.edit_requested.emit(self.task_id)
@@ -372,13 +904,29 @@ class TaskWidget(QWidget):
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.db = DatabaseManager()
+        # Рабочие пространства: открытые БД остаются «теплыми» для быстрого переключения
+        self.workspaces = WorkspaceManager(WorkspaceRegistry())
+        self.db = self.workspaces.open(self.workspaces.registry.active)
         self.current_filter = 'important'
         self.current_filter_value = None
         self.current_title = "Важное"
         self.active_animations = []
+        self.backups = DatabaseBackups(self.db)
+        self.backup_worker = None
+        self.last_backup_message = ""
+        self.maintenance_worker = None
+        self.search_index_worker = None
+        self.fuzzy_results_stale = False  # Результаты нечеткого поиска получены из отставшего индекса
+        # Журнал команд: отмена/повтор и отложенная запись частых изменений (свой у каждого пространства)
+        self.journal = CommandJournal(self.db)
+        self.journals = {self.db.db_name: self.journal}
+        self.search_worker = None
+        self.task_list_stale = False
+        # Задачи, выбранные для массовых действий, и задача, от которой отсчитывается диапазон (Shift)
+        self.selected_ids = set()
+        self.selection_anchor = None
         
-        self.setWindowTitle("Zettelkasten")
+        self.update_window_title()
         self.setGeometry(100, 100, 1280, 800)
         
         # Загрузка и раскрашивание иконок
@@ -388,6 +936,9 @@ class MainWindow(QMainWindow):
             "personal": load_icon("icons/personal.svg"),
             "completed": load_icon("icons/completed.svg"),
             "tag": load_icon("icons/tag.svg"),
+            "overdue": load_icon("icons/overdue.svg"),
+            "today": load_icon("icons/today.svg"),
+            "week": load_icon("icons/week.svg"),
         }
         self.icons = {name: colorize_icon(icon, text_color) for name, icon in raw_icons.items()}
         
@@ -407,6 +958,42 @@ class MainWindow(QMainWindow):
         self.reminder_timer.timeout.connect(self.check_for_reminders)
         self.reminder_timer.start(30000)
 
+        # Архивирование давно завершенных задач порциями, чтобы не блокировать интерфейс
+        QTimer.singleShot(5000, self.run_archiving_step)
+
+        # Фоновые работы (резервное копирование) запускаются, только когда пользователь бездействует
+        self.idle_watcher = IdleWatcher(self)
+        QApplication.instance().installEventFilter(self.idle_watcher)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self.on_idle_tick)
+        self.idle_timer.start(60000)
+
+        # Накопленные изменения пишутся одной транзакцией, когда клики прекращаются
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(FLUSH_DELAY_MS)
+        self.flush_timer.timeout.connect(self.flush_pending_changes)
+
+        # В полночь задачи переходят между умными списками (сегодня -> просроченные и т. д.)
+        self.current_day = datetime.date.today()
+        self.midnight_timer = QTimer(self)
+        self.midnight_timer.setSingleShot(True)
+        self.midnight_timer.timeout.connect(self.check_day_rollover)
+        self.schedule_midnight_rollover()
+
+        QShortcut(QKeySequence("Ctrl+Z"), self, self.undo_last_action)
+        QShortcut(QKeySequence("Ctrl+Shift+Z"), self, self.redo_last_action)
+        QShortcut(QKeySequence("Ctrl+A"), self, self.select_all_tasks)
+        QShortcut(QKeySequence("Esc"), self, self.clear_selection)
+        for number in range(1, 10):
+            QShortcut(QKeySequence(f"Ctrl+{number}"), self, lambda index=number - 1: self.switch_workspace_by_index(index))
+
+        # Поиск по всем пространствам запускается после паузы в наборе, а не на каждую букву
+        self.search_everywhere_timer = QTimer(self)
+        self.search_everywhere_timer.setSingleShot(True)
+        self.search_everywhere_timer.setInterval(SEARCH_EVERYWHERE_DELAY_MS)
+        self.search_everywhere_timer.timeout.connect(self.start_search_everywhere)
+
     # --- Инициализация и настройка UI ---
     
     def init_ui(self, main_layout):
@@ -429,10 +1016,35 @@ class MainWindow(QMainWindow):
         
         title_label = QLabel("Zettelkasten")
         title_label.setObjectName("AppTitle")
+
+        self.workspace_combo = QComboBox()
+        self.workspace_combo.setObjectName("WorkspaceCombo")
+        self.workspace_combo.setToolTip("Рабочее пространство (Ctrl+1…9)")
+        self.workspace_combo.activated.connect(self.switch_workspace_by_index)
         
         self.search_bar = QLineEdit(placeholderText="🔍 Поиск")
         self.search_bar.setObjectName("SearchBar")
         self.search_bar.textChanged.connect(self.on_search_text_changed)
+        # Переключатель точного и нечеткого (с опечатками и транслитерацией) поиска
+        self.fuzzy_button = QPushButton("≈")
+        self.fuzzy_button.setObjectName("FuzzyButton")
+        self.fuzzy_button.setCheckable(True)
+        self.fuzzy_button.setFixedSize(34, 34)
+        self.fuzzy_button.setToolTip("Нечеткий поиск: находит задачи с опечатками и в транслитерации")
+        self.fuzzy_button.toggled.connect(lambda: self.on_search_text_changed(self.search_bar.text()))
+        # Переключатель поиска по всем рабочим пространствам
+        self.everywhere_button = QPushButton("⊕")
+        self.everywhere_button.setObjectName("EverywhereButton")
+        self.everywhere_button.setCheckable(True)
+        self.everywhere_button.setFixedSize(34, 34)
+        self.everywhere_button.setToolTip("Искать во всех рабочих пространствах")
+        self.everywhere_button.toggled.connect(lambda: self.on_search_text_changed(self.search_bar.text()))
+        search_layout = QHBoxLayout()
+        search_layout.setSpacing(5)
+        search_layout.addWidget(self.search_bar)
+        search_layout.addWidget(self.fuzzy_button)
+        search_layout.addWidget(self.everywhere_button)
+        self.refresh_workspace_combo()
         
         self.favorites_list = QListWidget()
         self.favorites_list.setObjectName("NavList")
@@ -441,13 +1053,20 @@ class MainWindow(QMainWindow):
         self.tags_list = QListWidget()
         self.tags_list.setObjectName("NavList")
         self.tags_list.itemClicked.connect(self.on_tag_item_clicked)
+        self.tags_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.tags_list.customContextMenuRequested.connect(self.show_tag_context_menu)
         
         self.report_button = QPushButton("Выгрузить отчет")
         self.report_button.setObjectName("ReportButton")
         self.report_button.clicked.connect(self.show_report_dialog)
 
+        self.tools_button = QPushButton("Сервис")
+        self.tools_button.setObjectName("ToolsButton")
+        self.tools_button.clicked.connect(self.show_tools_menu)
+
         left_layout.addWidget(title_label)
-        left_layout.addWidget(self.search_bar)
+        left_layout.addWidget(self.workspace_combo)
+        left_layout.addLayout(search_layout)
         left_layout.addSpacing(10)
         left_layout.addWidget(QLabel("Избранное"))
         left_layout.addWidget(self.favorites_list)
@@ -455,6 +1074,7 @@ class MainWindow(QMainWindow):
         left_layout.addWidget(QLabel("Ваши теги"))
         left_layout.addWidget(self.tags_list, 1)
         left_layout.addWidget(self.report_button)
+        left_layout.addWidget(self.tools_button)
         return left_panel
 
     def create_center_panel(self):
@@ -474,6 +1094,8 @@ class MainWindow(QMainWindow):
         header_layout.addStretch()
         header_layout.addWidget(new_task_button)
         
+        bulk_bar = self.create_bulk_bar()
+        
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
         scroll_area.setObjectName("ScrollArea")
@@ -484,9 +1106,47 @@ class MainWindow(QMainWindow):
         scroll_area.setWidget(tasks_container)
         
         center_layout.addLayout(header_layout)
+        center_layout.addWidget(bulk_bar)
         center_layout.addWidget(scroll_area)
         return center_panel
 
+    def create_bulk_bar(self):
+        """Создает панель действий над выделенными задачами (скрыта, пока ничего не выделено)."""
+        self.bulk_bar = QFrame()
+        self.bulk_bar.setObjectName("BulkBar")
+        bulk_layout = QHBoxLayout(self.bulk_bar)
+        bulk_layout.setContentsMargins(10, 5, 10, 5)
+        self.bulk_count_label = QLabel()
+        self.bulk_count_label.setObjectName("BulkCount")
+
+        complete_button = QPushButton("✔ Завершить")
+        complete_button.clicked.connect(self.bulk_complete)
+        star_button = QPushButton("★ Важное")
+        star_button.clicked.connect(self.bulk_toggle_important)
+        tags_button = QPushButton("Теги ▾")
+        tags_menu = QMenu(tags_button)
+        tags_menu.addAction("Добавить тег...", lambda: self.bulk_retag(add=True))
+        tags_menu.addAction("Убрать тег...", lambda: self.bulk_retag(add=False))
+        tags_button.setMenu(tags_menu)
+        due_button = QPushButton("Срок ▾")
+        due_menu = QMenu(due_button)
+        for days, label in ((1, "+1 день"), (7, "+1 неделя"), (-1, "−1 день")):
+            due_menu.addAction(label, lambda days=days: self.bulk_shift_due(days))
+        due_menu.addAction("Сдвинуть на...", self.bulk_shift_due_custom)
+        due_button.setMenu(due_menu)
+        delete_button = QPushButton("Удалить")
+        delete_button.clicked.connect(self.bulk_delete)
+        clear_button = QPushButton("✕")
+        clear_button.setToolTip("Снять выделение (Esc)")
+        clear_button.clicked.connect(self.clear_selection)
+
+        bulk_layout.addWidget(self.bulk_count_label)
+        bulk_layout.addStretch()
+        for button in (complete_button, star_button, tags_button, due_button, delete_button, clear_button):
+            bulk_layout.addWidget(button)
+        self.bulk_bar.hide()
+        return self.bulk_bar
+
     def create_right_panel(self):
         """Создает правую панель с календарем и списком завершенных задач."""
         right_panel = QWidget()
@@ -520,6 +1180,7 @@ class MainWindow(QMainWindow):
 
     def check_for_reminders(self):
         """Проверяет и отображает напоминания, срок которых наступил."""
+        self.journal.flush()
         now_iso = datetime.datetime.now().isoformat()
         due_reminders = self.db.get_due_reminders(now_iso)
 
@@ -532,6 +1193,164 @@ class MainWindow(QMainWindow):
             msg_box.exec()
             self.db.delete_reminder(reminder['reminder_id'])
 
+    def run_archiving_step(self):
+        """Переносит в архив одну порцию старых завершенных задач и планирует следующую."""
+        self.journal.flush()
+        if self.db.archive.archive_batch() == ARCHIVE_BATCH_SIZE:
+            QTimer.singleShot(200, self.run_archiving_step)
+
+    def schedule_midnight_rollover(self):
+        """Заводит таймер на ближайшую полночь по местному времени."""
+        now = datetime.datetime.now()
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+        self.midnight_timer.start(int((midnight - now).total_seconds() * 1000) + MIDNIGHT_MARGIN_MS)
+
+    def check_day_rollover(self):
+        """После смены даты пересчитывает умные списки и обновляет открытый список на месте."""
+        today = datetime.date.today()
+        if today != self.current_day:
+            self.current_day = today
+            self.journal.flush()
+            self.refresh_left_panel()
+            if self.current_filter in SMART_VIEWS and not self.search_bar.text().strip():
+                self.sync_task_list(self.db.get_tasks(filter_by=self.current_filter))
+        self.schedule_midnight_rollover()
+
+    def on_idle_tick(self):
+        """Периодически запускает фоновые работы, если пользователь бездействует."""
+        # Таймер полуночи мог опоздать, например после сна компьютера
+        if datetime.date.today() != self.current_day:
+            self.check_day_rollover()
+        if not self.idle_watcher.is_idle():
+            return
+        self.journal.flush()
+        # Фоновые работы не выполняются одновременно: изменения страниц заставили бы копирование снимка начаться заново
+        if self.backup_worker is None and self.maintenance_worker is None and self.search_index_worker is None:
+            if self.backups.is_due():
+                self.start_backup()
+            elif self.db.maintenance.is_due():
+                self.start_maintenance(interactive=False)
+            elif self.db.search_index.is_stale() or self.db.text_index.is_stale():
+                # Индексы поиска догоняют изменения заранее, а не при первом запросе
+                self.start_search_index_refresh()
+
+    def start_search_index_refresh(self, indexes=None, should_continue=None):
+        """Обновляет индексы поиска в фоновом потоке, по умолчанию — пока пользователь бездействует.
+
+        Первое построение индексов большой БД идет десятки секунд; порции
+        коммитятся по отдельности, так что прерванный проход продолжится позже.
+        """
+        self.db.conn.commit()
+        self.search_index_worker = SearchIndexWorker(indexes or [self.db.search_index, self.db.text_index],
+                                                     should_continue or self.idle_watcher.is_idle, self)
+        self.search_index_worker.failed.connect(self.on_search_index_failed)
+        self.search_index_worker.finished.connect(self.on_search_index_worker_finished)
+        self.search_index_worker.start()
+
+    def stop_search_index_refresh(self):
+        """Прерывает фоновое обновление индексов после текущей порции и дожидается потока."""
+        if self.search_index_worker is not None:
+            self.search_index_worker.requestInterruption()
+            self.search_index_worker.wait()
+
+    def on_search_index_failed(self, error):
+        """Сообщает об ошибке обновления индексов поиска."""
+        self.statusBar().showMessage(f"Не удалось обновить индекс поиска: {error}", 15000)
+
+    def on_search_index_worker_finished(self):
+        """Освобождает поток обновления индексов и повторяет нечеткий поиск, ждавший индекса."""
+        worker, self.search_index_worker = self.search_index_worker, None
+        worker.deleteLater()
+        # Прерванный проход (восстановление снимка, закрытие окна) поиск не повторяет
+        if not self.fuzzy_results_stale or worker.isInterruptionRequested():
+            return
+        self.fuzzy_results_stale = False
+        query = self.search_bar.text().strip()
+        if query and self.fuzzy_button.isChecked() and not self.everywhere_button.isChecked():
+            self.refresh_task_list(tasks_list=self.db.search_tasks(query, fuzzy=True))
+            self.catch_up_fuzzy_index()
+
+    def catch_up_fuzzy_index(self):
+        """Догоняет в фоне индекс нечеткого поиска, если результаты получены из отставшего индекса.
+
+        Сам поиск индекс не обновляет, чтобы набор запроса не ждал записи порций;
+        когда проход завершится, поиск повторяется с тем же запросом.
+        """
+        if not self.db.search_index.is_stale():
+            return
+        self.fuzzy_results_stale = True
+        # Во время снимка или обслуживания индекс догонит следующий проход
+        if self.backup_worker is None and self.maintenance_worker is None and self.search_index_worker is None:
+            self.start_search_index_refresh([self.db.search_index], lambda: True)
+
+    def start_maintenance(self, interactive=True):
+        """Запускает обслуживание БД в фоновом потоке.
+
+        В простое проход прерывается, как только пользователь возвращается к работе;
+        запущенный из меню проход идет до конца и может перевести большой файл
+        в режим пошагового освобождения места полным VACUUM.
+        """
+        if self.maintenance_worker is not None or self.backup_worker is not None:
+            return
+        self.journal.flush()
+        self.db.conn.commit()
+        should_continue = None if interactive else self.idle_watcher.is_idle
+        # Граница сжатия журнала считается здесь: соединение self.db в фоновом потоке недоступно
+        self.maintenance_worker = MaintenanceWorker(self.db.maintenance, should_continue,
+                                                    allow_full_vacuum=interactive,
+                                                    compact_up_to=self.db.changelog_horizon(), parent=self)
+        self.maintenance_worker.completed.connect(self.on_maintenance_completed)
+        self.maintenance_worker.failed.connect(self.on_maintenance_failed)
+        self.maintenance_worker.finished.connect(self.on_maintenance_worker_finished)
+        self.maintenance_worker.start()
+        if interactive:
+            self.statusBar().showMessage("Обслуживание базы данных...")
+
+    def on_maintenance_completed(self, report):
+        """Сообщает о результатах обслуживания."""
+        self.statusBar().showMessage("Обслуживание БД: " + format_maintenance_report(report), 15000)
+        if report['integrity']:
+            QMessageBox.warning(self, "Обслуживание базы данных",
+                                "Проверка целостности нашла ошибки:\n" + "\n".join(report['integrity'][:10]) +
+                                "\n\nРекомендуется восстановить базу из резервной копии.")
+
+    def on_maintenance_failed(self, error):
+        """Сообщает об ошибке обслуживания."""
+        self.statusBar().showMessage(f"Не удалось выполнить обслуживание БД: {error}", 15000)
+
+    def on_maintenance_worker_finished(self):
+        """Освобождает поток обслуживания."""
+        self.maintenance_worker.deleteLater()
+        self.maintenance_worker = None
+
+    def start_backup(self):
+        """Запускает снимок БД в фоновом потоке."""
+        self.journal.flush()
+        if self.backup_worker is not None:
+            return
+        self.db.conn.commit()
+        self.backup_worker = BackupWorker(self.backups, self)
+        self.backup_worker.completed.connect(self.on_backup_completed)
+        self.backup_worker.failed.connect(self.on_backup_failed)
+        self.backup_worker.finished.connect(self.on_backup_worker_finished)
+        self.backup_worker.start()
+
+    def on_backup_completed(self, stats_list):
+        """Сообщает о результатах снимка: объем, скорость и время блокировки."""
+        if stats_list:
+            self.last_backup_message = "Снимок создан: " + format_backup_stats(stats_list[0])
+            self.statusBar().showMessage(self.last_backup_message, 15000)
+
+    def on_backup_failed(self, error):
+        """Сообщает об ошибке резервного копирования."""
+        self.last_backup_message = f"Не удалось создать снимок: {error}"
+        self.statusBar().showMessage(self.last_backup_message, 15000)
+
+    def on_backup_worker_finished(self):
+        """Освобождает поток резервного копирования."""
+        self.backup_worker.deleteLater()
+        self.backup_worker = None
+
     def animate_show_item(self, widget, duration):
         """Анимация плавного появления виджета (изменение высоты и прозрачности)."""
         group = QParallelAnimationGroup(self)
@@ -560,49 +1379,105 @@ class MainWindow(QMainWindow):
 
     def refresh_task_list(self, animated=False, tasks_list=None):
         """Обновляет центральный список задач в соответствии с текущим фильтром."""
+        self.journal.flush()
+        self.task_list_stale = False
         clear_layout(self.tasks_layout)
         tasks = tasks_list if tasks_list is not None else self.db.get_tasks(filter_by=self.current_filter, value=self.current_filter_value)
         for i, task_data in enumerate(tasks):
-            task_widget = TaskWidget(task_data)
-            task_widget.status_changed.connect(self.handle_task_status_change)
-            task_widget.importance_changed.connect(self.handle_task_importance_change)
-            task_widget.edit_requested.connect(self.show_edit_task_dialog)
+            task_widget = self.create_task_widget(task_data)
             self.tasks_layout.addWidget(task_widget)
             if animated:
                 self.animate_show_item(task_widget, 250 + i * 25)
+        # Выделение сохраняется только для задач, оставшихся в списке
+        self.selected_ids &= {widget.task_id for widget in self.task_widgets() if widget.is_selectable()}
+        self.update_selection_view()
+
+    def create_task_widget(self, task_data):
+        """Создает виджет задачи и подключает его сигналы."""
+        workspace = task_data.get('workspace')
+        if workspace and workspace != self.db.db_name:
+            # Задача другого пространства из поиска по всем: двойной клик открывает ее в своем пространстве
+            task_widget = TaskWidget(task_data)
+            task_widget.set_read_only()
+            task_widget.edit_requested.connect(lambda task_id: self.open_in_workspace(workspace, task_id))
+            return task_widget
+        task_widget = TaskWidget(task_data, lambda task_id: self.db.details.get(task_id, TOOLTIP_MAX_CHARS + 1))
+        task_widget.status_changed.connect(self.handle_task_status_change)
+        task_widget.occurrence_completed.connect(self.handle_occurrence_completed)
+        task_widget.importance_changed.connect(self.handle_task_importance_change)
+        task_widget.edit_requested.connect(self.show_edit_task_dialog)
+        task_widget.selection_requested.connect(self.on_task_selection_requested)
+        task_widget.set_selected(task_data['id'] in self.selected_ids and task_widget.is_selectable())
+        return task_widget
+
+    def sync_task_list(self, tasks):
+        """Приводит центральный список к tasks без полной перерисовки.
+
+        Виджеты задач, оставшихся в списке, сохраняются и только переставляются;
+        ушедшие удаляются, новые появляются с анимацией.
+        """
+        widgets = {(widget.task_id, widget.occurrence_date): widget for widget in self.task_widgets()}
+        keys = {(task['id'], task.get('occurrence_date')) for task in tasks}
+        for key in set(widgets) - keys:
+            self.tasks_layout.removeWidget(widgets[key])
+            widgets.pop(key).deleteLater()
+        for index, task_data in enumerate(tasks):
+            widget = widgets.get((task_data['id'], task_data.get('occurrence_date')))
+            if widget is None:
+                widget = self.create_task_widget(task_data)
+                self.tasks_layout.insertWidget(index, widget)
+                self.animate_show_item(widget, 250)
+            elif self.tasks_layout.indexOf(widget) != index:
+                self.tasks_layout.insertWidget(index, widget)  # Виджет переносится на новое место
+        self.selected_ids &= {widget.task_id for widget in self.task_widgets() if widget.is_selectable()}
+        self.update_selection_view()
+
+    def task_widgets(self):
+        """Виджеты задач центрального списка в порядке отображения."""
+        widgets = (self.tasks_layout.itemAt(i).widget() for i in range(self.tasks_layout.count()))
+        return [widget for widget in widgets if isinstance(widget, TaskWidget)]
 
     def refresh_left_panel(self):
         """Обновляет списки 'Избранное' и 'Теги' в левой панели."""
+        self.journal.flush()
         # Обновление "Избранного"
         self.favorites_list.clear()
         self.favorites_list.addItem(QListWidgetItem(self.icons.get("important"), "Важное"))
         self.favorites_list.addItem(QListWidgetItem(self.icons.get("personal"), "Личное"))
         self.favorites_list.addItem(QListWidgetItem(self.icons.get("completed"), "Завершенные"))
+        # Умные списки по сроку со счетчиками; пока задачи не меняются, счетчики берутся из кэша
+        for view, count in self.db.smart_views.counts().items():
+            self.add_nav_row(self.favorites_list, self.icons.get(view), SMART_VIEWS[view], count, view)
 
         # Обновление списка тегов со счетчиками
         self.tags_list.clear()
         for tag, count in sorted(self.db.get_tags_with_counts().items()):
-            item = QListWidgetItem(self.tags_list)
-            # Создаем кастомный виджет для строки тега
-            row_widget = QWidget()
-            row_layout = QHBoxLayout(row_widget)
-            row_layout.setContentsMargins(5, 3, 8, 3) 
-            row_layout.setSpacing(6)
-            icon_label = QLabel()
-            icon_label.setPixmap(self.icons.get("tag").pixmap(QSize(16, 16)))
-            count_label = QLabel(str(count))
-            count_label.setObjectName("TagCount")
-            count_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            row_layout.addWidget(icon_label)
-            row_layout.addWidget(QLabel(tag), 1)
-            row_layout.addWidget(count_label)
-            item.setData(Qt.ItemDataRole.UserRole, tag) # Сохраняем имя тега для обработчика
-            self.tags_list.setItemWidget(item, row_widget)
+            self.add_nav_row(self.tags_list, self.icons.get("tag"), tag, count, tag)
+
+    def add_nav_row(self, list_widget, icon, text, count, data):
+        """Добавляет в список навигации строку с иконкой, названием и счетчиком."""
+        item = QListWidgetItem(list_widget)
+        # Создаем кастомный виджет для строки
+        row_widget = QWidget()
+        row_layout = QHBoxLayout(row_widget)
+        row_layout.setContentsMargins(5, 3, 8, 3) 
+        row_layout.setSpacing(6)
+        icon_label = QLabel()
+        icon_label.setPixmap(icon.pixmap(QSize(16, 16)))
+        count_label = QLabel(str(count))
+        count_label.setObjectName("TagCount")
+        count_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        row_layout.addWidget(icon_label)
+        row_layout.addWidget(QLabel(text), 1)
+        row_layout.addWidget(count_label)
+        item.setData(Qt.ItemDataRole.UserRole, data) # Сохраняем фильтр для обработчика
+        list_widget.setItemWidget(item, row_widget)
             
     def refresh_completed_list(self):
         """Обновляет список последних завершенных задач в правой панели."""
+        self.journal.flush()
         self.completed_list_widget.clear()
-        for task in self.db.get_tasks(filter_by='completed')[:5]:
+        for task in self.db.get_tasks(filter_by='completed', limit=5):
             item = QListWidgetItem(f"✔ {task['title']}")
             item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsSelectable) # Делаем невыделяемым
             self.completed_list_widget.addItem(item)
@@ -613,6 +1488,75 @@ class MainWindow(QMainWindow):
         """Показывает диалог 'О приложении'."""
         AboutDialog(self).exec()
 
+    def show_tools_menu(self):
+        """Показывает меню служебных функций."""
+        button = self.sender()
+        menu = QMenu(self)
+        menu.addAction("Импорт из файла (CSV, JSON Lines)...", self.show_import_file_dialog)
+        menu.addAction("Импорт папки заметок Markdown...", self.show_import_folder_dialog)
+        menu.addSeparator()
+        menu.addAction("Статистика", self.show_statistics_dialog)
+        menu.addAction("Резервные копии", self.show_backup_dialog)
+        menu.addAction("Обслуживание базы данных", lambda: self.start_maintenance(interactive=True))
+        menu.addSeparator()
+        menu.addAction("Добавить рабочее пространство...", self.show_add_workspace_dialog)
+        if len(self.workspaces.registry.entries) > 1:
+            menu.addAction("Переименовать рабочее пространство...", self.rename_current_workspace)
+            menu.addAction("Убрать рабочее пространство из списка", self.remove_current_workspace)
+        menu.exec(button.mapToGlobal(QPoint(0, button.height())))
+
+    def show_import_file_dialog(self):
+        """Выбирает файл CSV или JSON Lines и запускает импорт."""
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт задач", "", "Таблицы и JSON (*.csv *.tsv *.jsonl *.ndjson *.json)")
+        if path:
+            self.start_import(path)
+
+    def show_import_folder_dialog(self):
+        """Выбирает папку с заметками Markdown и запускает импорт."""
+        path = QFileDialog.getExistingDirectory(self, "Импорт заметок Markdown")
+        if path:
+            self.start_import(path)
+
+    def start_import(self, source_path):
+        """Запускает фоновый импорт с окном прогресса; отмена сохраняет позицию для продолжения."""
+        self.journal.flush()
+        self.db.conn.commit()
+        progress_dialog = QProgressDialog("Импорт задач...", "Прервать", 0, 0, self)
+        progress_dialog.setWindowTitle("Импорт")
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+        worker = ImportWorker(self.db.db_name, source_path, self)
+        progress_dialog.canceled.connect(worker.requestInterruption)
+        worker.progress.connect(lambda state: progress_dialog.setLabelText(
+            f"Обработано записей: {state['position']}\nДобавлено: {state['imported']}, дубликатов: {state['duplicates']}"))
+
+        def on_completed(state):
+            progress_dialog.close()
+            self.refresh_all_views(animated=True)
+            summary = (f"Добавлено задач: {state['imported']}\nПропущено дубликатов: {state['duplicates']}\n"
+                       f"Пропущено записей без названия: {state['skipped']}")
+            if state['interrupted']:
+                summary += "\n\nИмпорт прерван. При повторном запуске он продолжится с места остановки."
+            QMessageBox.information(self, "Импорт завершен", summary)
+
+        def on_failed(error):
+            progress_dialog.close()
+            QMessageBox.critical(self, "Ошибка", f"Не удалось импортировать данные.\nОшибка: {error}")
+
+        worker.completed.connect(on_completed)
+        worker.failed.connect(on_failed)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def show_statistics_dialog(self):
+        """Открывает окно статистики по задачам."""
+        self.journal.flush()
+        StatisticsDialog(self.db, self).exec()
+
+    def show_backup_dialog(self):
+        """Показывает диалог управления резервными копиями."""
+        BackupDialog(self).exec()
+
     def show_new_task_menu(self):
         """Показывает контекстное меню для кнопки 'Новая задача'."""
         button = self.sender()
@@ -629,43 +1573,182 @@ class MainWindow(QMainWindow):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             task_data = dialog.get_task_data()
             if task_data['title']: # Добавляем задачу только если есть заголовок
-                self.db.add_task(**task_data)
+                self.journal.execute(AddTaskCommand(task_data))
                 self.refresh_all_views(animated=True)
 
     def show_edit_task_dialog(self, task_id):
         """Открывает диалог редактирования задачи и обрабатывает результат."""
+        self.journal.flush()
         task_data = self.db.get_task_by_id(task_id)
         if not task_data: return
         reminders = self.db.get_reminders_for_task(task_id)
-        dialog = EditTaskDialog(task_data, reminders, self)
+        show_graph = None
+        if self.db.links.get_neighbors(task_id):
+            show_graph = lambda parent: self.show_task_graph(task_id, parent)
+        dialog = EditTaskDialog(task_data, reminders, self, backlinks=self.db.links.get_backlinks(task_id),
+                                show_graph=show_graph)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_data = dialog.get_task_data()
             if new_data['title']:
-                self.db.update_task(task_id, new_data)
-                self.db.replace_all_reminders_for_task(task_id, dialog.get_reminders_data())
+                old_data = {field: task_data[field] for field in new_data}
+                old_reminders = [reminder['reminder_datetime'] for reminder in reminders]
+                self.journal.execute(EditTaskCommand(task_id, old_data, new_data,
+                                                     old_reminders, dialog.get_reminders_data()))
                 self.refresh_all_views(animated=True)
 
     # --- Обработчики событий от виджетов ---
 
     def handle_task_status_change(self, task_id, is_completed):
         """Обрабатывает изменение статуса задачи (выполнена/не выполнена)."""
-        self.db.update_task_status(task_id, is_completed)
+        self.journal.set_field(task_id, 'is_completed', is_completed,
+                               "Завершение задачи" if is_completed else "Возврат задачи в работу")
         # Удаляем виджет из списка активных задач
         for i in range(self.tasks_layout.count()):
             widget = self.tasks_layout.itemAt(i).widget()
             if isinstance(widget, TaskWidget) and widget.task_id == task_id:
                 widget.deleteLater()
                 break
-        # Обновляем списки, где это изменение должно отразиться
-        self.refresh_completed_list()
-        self.refresh_left_panel()
+        # Списки, где отражается изменение, обновятся после записи накопленных кликов
+        self.flush_timer.start()
+
+    def handle_occurrence_completed(self, series_id, occurrence_date):
+        """Отмечает выполненным одно вхождение повторяющейся задачи; серия продолжается."""
+        self.journal.execute(CompleteOccurrenceCommand(series_id, occurrence_date))
+        # Перерисовываем список: на месте вхождения может появиться следующее
+        self.refresh_all_views(animated=True)
 
     def handle_task_importance_change(self, task_id, is_important):
         """Обрабатывает изменение флага 'важное' у задачи."""
-        self.db.update_task_importance(task_id, is_important)
+        self.journal.set_field(task_id, 'is_important', is_important, "Отметка важности")
         # Если мы находимся в фильтре "Важное", список нужно перерисовать
         if self.current_filter == 'important':
-             self.refresh_task_list(animated=True)
+            self.task_list_stale = True
+        self.flush_timer.start()
+
+    def flush_pending_changes(self):
+        """Записывает накопленные изменения и обновляет зависящие от них списки."""
+        self.journal.flush()
+        self.refresh_completed_list()
+        self.refresh_left_panel()
+        if self.task_list_stale:
+            self.refresh_task_list(animated=True)
+
+    def undo_last_action(self):
+        """Отменяет последнее действие (Ctrl+Z)."""
+        if self.journal.undo() is not None:
+            self.refresh_all_views(animated=True)
+
+    def redo_last_action(self):
+        """Повторяет отмененное действие (Ctrl+Shift+Z)."""
+        if self.journal.redo() is not None:
+            self.refresh_all_views(animated=True)
+
+    # --- Выделение и массовые действия ---
+
+    def on_task_selection_requested(self, task_id, modifiers):
+        """Ctrl+клик добавляет/убирает задачу, Shift+клик выделяет диапазон, простой клик снимает выделение."""
+        selectable = [widget.task_id for widget in self.task_widgets() if widget.is_selectable()]
+        if modifiers & Qt.KeyboardModifier.ShiftModifier and self.selection_anchor in selectable:
+            start, end = sorted((selectable.index(self.selection_anchor), selectable.index(task_id)))
+            if not modifiers & Qt.KeyboardModifier.ControlModifier:
+                self.selected_ids.clear()
+            self.selected_ids.update(selectable[start:end + 1])
+        elif modifiers & Qt.KeyboardModifier.ControlModifier:
+            self.selected_ids ^= {task_id}
+            self.selection_anchor = task_id
+        else:
+            self.selected_ids.clear()
+            self.selection_anchor = task_id
+        self.update_selection_view()
+
+    def select_all_tasks(self):
+        """Выделяет все задачи центрального списка (Ctrl+A)."""
+        self.selected_ids = {widget.task_id for widget in self.task_widgets() if widget.is_selectable()}
+        self.update_selection_view()
+
+    def clear_selection(self):
+        """Снимает выделение (Esc)."""
+        self.selected_ids.clear()
+        self.update_selection_view()
+
+    def update_selection_view(self):
+        """Подсвечивает выделенные задачи и показывает панель массовых действий."""
+        for widget in self.task_widgets():
+            widget.set_selected(widget.task_id in self.selected_ids and not widget.read_only)
+        self.bulk_count_label.setText(f"Выбрано: {len(self.selected_ids)}")
+        self.bulk_bar.setVisible(bool(self.selected_ids))
+
+    def run_bulk_command(self, command, keep_in_view):
+        """Выполняет массовую команду и обновляет только затронутые задачи.
+
+        keep_in_view — остаются ли измененные задачи в текущем списке: если да,
+        их виджеты перестраиваются на месте, иначе удаляются из списка.
+        """
+        task_ids = set(command.task_ids)
+        self.journal.execute(command)
+        fresh = self.db.get_tasks_by_ids(task_ids) if keep_in_view else {}
+        for widget in self.task_widgets():
+            if widget.task_id not in task_ids or widget.read_only:
+                continue  # У задач других пространств в результатах поиска свои ID
+            index = self.tasks_layout.indexOf(widget)
+            self.tasks_layout.removeWidget(widget)
+            widget.deleteLater()
+            if widget.task_id in fresh:
+                task_widget = self.create_task_widget(fresh[widget.task_id])
+                self.tasks_layout.insertWidget(index, task_widget)
+                self.animate_show_item(task_widget, 150)
+        self.selected_ids &= set(fresh)
+        self.update_selection_view()
+        self.refresh_left_panel()
+        self.refresh_completed_list()
+
+    def bulk_complete(self):
+        """Завершает все выделенные задачи."""
+        command = BulkEditCommand(self.selected_ids, 'is_completed', 'bulk_set_field', 'is_completed', 1,
+                                  description="Завершение задач")
+        self.run_bulk_command(command, keep_in_view=self.current_filter == 'completed')
+
+    def bulk_toggle_important(self):
+        """Отмечает выделенные задачи важными, а если все уже важные — снимает отметку."""
+        values = self.db.get_field_values(self.selected_ids, 'is_important')
+        is_important = 0 if values and all(values.values()) else 1
+        command = BulkEditCommand(self.selected_ids, 'is_important', 'bulk_set_field', 'is_important', is_important,
+                                  description="Отметка важности")
+        self.run_bulk_command(command, keep_in_view=is_important or self.current_filter != 'important')
+
+    def bulk_retag(self, add):
+        """Добавляет тег выделенным задачам или убирает его."""
+        tag, ok = QInputDialog.getText(self, "Теги", "Добавить тег:" if add else "Убрать тег:")
+        tag = tag.strip()
+        if not ok or not tag:
+            return
+        if ',' in tag:
+            QMessageBox.warning(self, "Теги", "Укажите один тег без запятых.")
+            return
+        args = (tag, None) if add else (None, tag)
+        command = BulkEditCommand(self.selected_ids, 'tags', 'bulk_retag', *args, description="Изменение тегов")
+        leaves_view = not add and self.current_filter == 'tag' and self.current_filter_value == tag
+        self.run_bulk_command(command, keep_in_view=not leaves_view)
+
+    def bulk_shift_due(self, days):
+        """Сдвигает срок выделенных задач на days дней."""
+        command = BulkEditCommand(self.selected_ids, 'due_date', 'bulk_shift_due', days, description="Перенос срока")
+        # В списках по дате и умных списках задачи со сдвинутым сроком уходят из выборки
+        self.run_bulk_command(command, keep_in_view=self.current_filter not in ('date', 'date_range', *SMART_VIEWS))
+
+    def bulk_shift_due_custom(self):
+        """Спрашивает число дней и сдвигает срок выделенных задач."""
+        days, ok = QInputDialog.getInt(self, "Перенос срока", "Сдвинуть срок на дней (можно отрицательное):",
+                                       1, -3650, 3650)
+        if ok and days:
+            self.bulk_shift_due(days)
+
+    def bulk_delete(self):
+        """Удаляет выделенные задачи после подтверждения."""
+        reply = QMessageBox.question(self, "Удаление задач",
+                                     f"Удалить выбранные задачи ({len(self.selected_ids)})? Отменить можно по Ctrl+Z.")
+        if reply == QMessageBox.StandardButton.Yes:
+            self.run_bulk_command(BulkDeleteCommand(self.selected_ids), keep_in_view=False)
 
     # --- Обработчики навигации и поиска ---
 
@@ -675,7 +1758,9 @@ class MainWindow(QMainWindow):
         filter_text = item.text()
         self.current_title = filter_text
         self.current_filter_value = None
-        if filter_text == "Важное": self.current_filter = 'important'
+        if view := item.data(Qt.ItemDataRole.UserRole):
+            self.current_filter, self.current_title = view, SMART_VIEWS[view]
+        elif filter_text == "Важное": self.current_filter = 'important'
         elif filter_text == "Завершенные": self.current_filter = 'completed'
         elif filter_text == "Личное": self.current_filter, self.current_filter_value = 'tag', 'Личное'
         self.center_title_label.setText(self.current_title)
@@ -691,6 +1776,30 @@ class MainWindow(QMainWindow):
             self.center_title_label.setText(self.current_title)
             self.refresh_task_list(animated=True)
 
+    def show_tag_context_menu(self, pos):
+        """Контекстное меню тега: просмотр графа связей его задач."""
+        item = self.tags_list.itemAt(pos)
+        if item is None or not (tag_name := item.data(Qt.ItemDataRole.UserRole)):
+            return
+        menu = QMenu(self)
+        menu.addAction("Граф связей", lambda: self.show_tag_graph(tag_name))
+        menu.exec(self.tags_list.mapToGlobal(pos))
+
+    def show_tag_graph(self, tag_name):
+        """Показывает граф связей между задачами тега."""
+        nodes, edges = self.db.links.get_tag_graph(tag_name)
+        LinkGraphDialog(tag_name, nodes, edges, self).exec()
+
+    def show_task_graph(self, task_id, parent=None):
+        """Показывает окрестность задачи в графе связей; глубину обхода можно менять в диалоге."""
+        title = self.db.get_field_values([task_id], 'title').get(task_id, f"[[{task_id}]]")
+
+        def load_graph(depth):
+            return self.db.links.get_task_graph(task_id, depth)
+
+        nodes, edges = load_graph(TASK_GRAPH_DEPTH)
+        LinkGraphDialog(title, nodes, edges, parent or self, load_graph=load_graph, depth=TASK_GRAPH_DEPTH).exec()
+
     def on_date_selected(self):
         """Обрабатывает выбор даты в календаре."""
         self.search_bar.clear()
@@ -704,23 +1813,184 @@ class MainWindow(QMainWindow):
     def on_search_text_changed(self, text):
         """Обрабатывает изменение текста в строке поиска."""
         query = text.strip()
-        if query:
+        self.search_everywhere_timer.stop()
+        self.stop_search_everywhere()
+        if query and self.everywhere_button.isChecked():
+            self.center_title_label.setText(f'Поиск во всех пространствах: "{query}"')
+            self.search_everywhere_timer.start()
+        elif query:
             self.center_title_label.setText(f'Результаты поиска: "{query}"')
-            self.refresh_task_list(animated=True, tasks_list=self.db.search_tasks(query))
+            self.refresh_task_list(animated=True, tasks_list=self.db.search_tasks(query, fuzzy=self.fuzzy_button.isChecked()))
+            if self.fuzzy_button.isChecked():
+                self.catch_up_fuzzy_index()
         else: # Если поиск пуст, возвращаемся к последнему активному фильтру
             self.center_title_label.setText(self.current_title)
             self.refresh_task_list(animated=True)
 
+    def start_search_everywhere(self):
+        """Запускает поиск по всем рабочим пространствам в пуле процессов."""
+        query = self.search_bar.text().strip()
+        if not query:
+            return
+        self.journal.flush()
+        self.db.conn.commit()
+        self.stop_search_everywhere()
+        worker = SearchEverywhereWorker(self.workspaces, query, self.fuzzy_button.isChecked(), self)
+        worker.partial.connect(self.on_search_everywhere_partial)
+        worker.completed.connect(self.on_search_everywhere_completed)
+        worker.failed.connect(lambda error: self.statusBar().showMessage(f"Ошибка поиска: {error}", 15000))
+        worker.finished.connect(worker.deleteLater)
+        self.search_worker = worker
+        worker.start()
+
+    def stop_search_everywhere(self):
+        """Отбрасывает результаты незавершенного поиска по всем пространствам."""
+        if self.search_worker is not None:
+            self.search_worker.requestInterruption()
+            for signal in (self.search_worker.partial, self.search_worker.completed):
+                signal.disconnect()
+            self.search_worker = None
+
+    def on_search_everywhere_partial(self, tasks, done, total):
+        """Показывает слитые результаты пространств, ответивших к этому моменту."""
+        self.refresh_task_list(tasks_list=tasks)
+        self.statusBar().showMessage(f"Поиск: готово пространств {done} из {total}, найдено задач: {len(tasks)}")
+
+    def on_search_everywhere_completed(self, errors):
+        """Сообщает об итогах поиска по всем пространствам."""
+        self.search_worker = None
+        if errors:
+            self.statusBar().showMessage("Поиск не выполнен в пространствах: " + "; ".join(errors), 15000)
+        else:
+            self.statusBar().showMessage(f"Поиск завершен: найдено задач: {len(self.task_widgets())}", 5000)
+
+    # --- Рабочие пространства ---
+
+    def update_window_title(self):
+        entry = self.workspaces.registry.find(self.db.db_name)
+        self.setWindowTitle(f"Zettelkasten — {entry['name']}" if entry else "Zettelkasten")
+
+    def refresh_workspace_combo(self):
+        """Заполняет переключатель рабочих пространств."""
+        self.workspace_combo.blockSignals(True)
+        self.workspace_combo.clear()
+        for index, entry in enumerate(self.workspaces.registry.entries):
+            self.workspace_combo.addItem(entry['name'], entry['path'])
+            self.workspace_combo.setItemData(index, entry['path'], Qt.ItemDataRole.ToolTipRole)
+            if entry['path'] == self.db.db_name:
+                self.workspace_combo.setCurrentIndex(index)
+        self.workspace_combo.blockSignals(False)
+        # Переключатель и поиск по всем нужны, только когда пространств несколько
+        multiple = len(self.workspaces.registry.entries) > 1
+        self.workspace_combo.setVisible(multiple)
+        self.everywhere_button.setVisible(multiple)
+        if not multiple:
+            self.everywhere_button.setChecked(False)
+
+    def switch_workspace_by_index(self, index):
+        entries = self.workspaces.registry.entries
+        if 0 <= index < len(entries):
+            self.switch_workspace(entries[index]['path'])
+
+    def switch_workspace(self, path):
+        """Делает активным другое рабочее пространство; уже открытая БД не переоткрывается."""
+        if path == self.db.db_name:
+            return True
+        self.journal.flush()
+        self.flush_timer.stop()
+        try:
+            db = self.workspaces.open(path)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Рабочее пространство", f"Не удалось открыть базу данных:\n{path}\nОшибка: {e}")
+            self.refresh_workspace_combo()
+            return False
+        self.db = db
+        # Журналы закрытых (вытесненных) БД больше не нужны
+        self.journals = {name: journal for name, journal in self.journals.items() if self.workspaces.is_open(name)}
+        self.journal = self.journals.setdefault(db.db_name, CommandJournal(db))
+        self.backups = DatabaseBackups(db)
+        self.workspaces.registry.set_active(db.db_name)
+        self.selected_ids.clear()
+        self.refresh_workspace_combo()
+        self.update_window_title()
+        if self.search_bar.text().strip() and self.everywhere_button.isChecked():
+            self.refresh_left_panel()
+            self.refresh_completed_list()
+            self.start_search_everywhere()  # Задачи нового активного пространства становятся редактируемыми
+        else:
+            self.search_bar.blockSignals(True)
+            self.search_bar.clear()
+            self.search_bar.blockSignals(False)
+            self.center_title_label.setText(self.current_title)
+            self.refresh_all_views(animated=True)
+        return True
+
+    def open_in_workspace(self, path, task_id):
+        """Переключается в пространство задачи и открывает ее для редактирования."""
+        if self.switch_workspace(path):
+            self.show_edit_task_dialog(task_id)
+
+    def show_add_workspace_dialog(self):
+        """Добавляет в список существующую или новую БД и переключается на нее."""
+        path, _ = QFileDialog.getSaveFileName(self, "Открыть или создать рабочее пространство", "",
+                                              "База данных (*.db)",
+                                              options=QFileDialog.Option.DontConfirmOverwrite)
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += ".db"
+        name, ok = QInputDialog.getText(self, "Рабочее пространство", "Название:", text=workspace_name(path))
+        if not ok:
+            return
+        entry = self.workspaces.registry.add(path, name.strip() or None)
+        if not self.switch_workspace(entry['path']):
+            self.workspaces.registry.remove(entry['path'])
+        self.refresh_workspace_combo()
+
+    def rename_current_workspace(self):
+        """Переименовывает текущее рабочее пространство."""
+        entry = self.workspaces.registry.find(self.db.db_name)
+        name, ok = QInputDialog.getText(self, "Рабочее пространство", "Название:", text=entry['name'])
+        if ok and name.strip():
+            entry['name'] = name.strip()
+            self.workspaces.registry.save()
+            self.refresh_workspace_combo()
+            self.update_window_title()
+
+    def remove_current_workspace(self):
+        """Убирает текущее пространство из списка (файл БД остается на диске)."""
+        registry = self.workspaces.registry
+        if len(registry.entries) < 2:
+            return
+        entry = registry.find(self.db.db_name)
+        reply = QMessageBox.question(self, "Рабочее пространство",
+                                     f"Убрать \"{entry['name']}\" из списка? Файл базы данных не удаляется.")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        registry.remove(entry['path'])
+        self.switch_workspace(registry.active)
+        self.workspaces.close(entry['path'])
+        self.journals.pop(entry['path'], None)
+        self.refresh_workspace_combo()
+
     # --- Создание и сохранение отчетов ---
     
     def show_report_dialog(self):
         """Показывает диалог выбора дат и инициирует сохранение отчета."""
+        self.journal.flush()
         dialog = ReportDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             date_range = dialog.get_date_range()
             start_iso, end_iso = date_range["start_date"], date_range["end_date"]
             
-            report_tasks = self.db.get_tasks(filter_by='date_range', start_date=start_iso, end_date=end_iso)
+            report_filter = 'completed_between' if date_range["completed_only"] else 'date_range'
+            if date_range["everywhere"]:
+                report_tasks = self.collect_report_everywhere(start_iso, end_iso, date_range["completed_only"])
+                if report_tasks is None:
+                    return
+            else:
+                report_tasks = self.db.load_details(
+                    self.db.get_tasks(filter_by=report_filter, start_date=start_iso, end_date=end_iso))
             if not report_tasks:
                 QMessageBox.information(self, "Нет данных", "Задачи не найдены за выбранный период.")
                 return
@@ -735,6 +2005,24 @@ class MainWindow(QMainWindow):
                 else:
                     self.save_report_as_txt(report_tasks, filePath, start_iso, end_iso)
 
+    def collect_report_everywhere(self, start_date, end_date, completed_only):
+        """Собирает задачи отчета из всех пространств (в пуле процессов); None при ошибке."""
+        self.db.conn.commit()
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        errors, tasks = [], []
+        try:
+            for tasks, entry, error in self.workspaces.report_everywhere(start_date, end_date, completed_only):
+                if error is not None:
+                    errors.append(f"{entry['name']}: {error}")
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            QApplication.restoreOverrideCursor()
+        if errors:
+            QMessageBox.critical(self, "Ошибка", "Не удалось собрать отчет по пространствам:\n" + "\n".join(errors))
+            return None
+        return tasks
+
     def save_report_as_txt(self, tasks, file_path, start_date, end_date):
         """Формирует и сохраняет отчет в формате .txt."""
         start_pretty = QDate.fromString(start_date, 'yyyy-MM-dd').toString('dd.MM.yyyy')
@@ -745,6 +2033,7 @@ class MainWindow(QMainWindow):
             status = "✔️ Выполнено" if task['is_completed'] else "❌ Не выполнено"
             due_date = f"Срок: {QDate.fromString(task['due_date'], 'yyyy-MM-dd').toString('dd.MM.yyyy')}" if task['due_date'] else "Срок не указан"
             report_text += f"Задача: {task['title']}\n"
+            if task.get('workspace_name'): report_text += f"Пространство: {task['workspace_name']}\n"
             report_text += f"Статус: {status} | {due_date}\n"
             if task['details']: report_text += f"  Детали: {task['details']}\n"
             if task['tags']: report_text += f"  Теги: {task['tags']}\n"
@@ -769,6 +2058,9 @@ class MainWindow(QMainWindow):
         sheet.title = f"Отчет {start_pretty}-{end_pretty}"
         
         headers = ["Задача", "Статус", "Срок выполнения", "Детали", "Теги"]
+        with_workspace = any(task.get('workspace_name') for task in tasks)
+        if with_workspace:
+            headers.append("Пространство")
         sheet.append(headers)
         header_font = Font(bold=True)
         for col_num, header_title in enumerate(headers, 1):
@@ -779,7 +2071,8 @@ class MainWindow(QMainWindow):
         for task in tasks:
             status = "Выполнено" if task['is_completed'] else "Не выполнено"
             due_date = QDate.fromString(task['due_date'], 'yyyy-MM-dd').toString('dd.MM.yyyy') if task.get('due_date') else ""
-            sheet.append([task.get('title', ''), status, due_date, task.get('details', ''), task.get('tags', '')])
+            row = [task.get('title', ''), status, due_date, task.get('details', ''), task.get('tags', '')]
+            sheet.append(row + [task.get('workspace_name', '')] if with_workspace else row)
 
         for col_num in range(1, len(headers) + 1):
             column_letter = get_column_letter(col_num)
@@ -796,11 +2089,22 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         """Обрабатывает закрытие окна, корректно завершая работу с БД."""
-        self.db.close()
+        self.journal.flush()
+        if self.backup_worker is not None:
+            self.backup_worker.wait()
+        if self.maintenance_worker is not None:
+            self.maintenance_worker.wait()
+        self.stop_search_index_refresh()
+        self.stop_search_everywhere()
+        # Прерванные поиски дожидаются ответа пула, прежде чем он будет остановлен
+        for worker in self.findChildren(SearchEverywhereWorker):
+            worker.wait()
+        self.workspaces.close_all()
         super().closeEvent(event)
 
 # --- Точка входа в приложение ---
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Пул поиска по пространствам в собранном exe
     app = QApplication(sys.argv)
     QToolTip.setFont(QFont("Inter", 10))
     if os.path.exists("icons/icons.png"):
@@ -0,0 +1,222 @@
+# maintenance.py
+
+import datetime
+import json
+import os
+import sqlite3
+import time
+
+from changelog import ChangeLog
+
+LOCK_BUDGET_MS = 50          # Дольше этого один шаг не держит блокировку записи
+STEP_PAUSE = 0.01            # Пауза между шагами, сек — дает приложению писать в БД
+ANALYSIS_LIMIT = 400         # Строк на индекс при сборе статистики (приближенный ANALYZE)
+VACUUM_START_PAGES = 64      # Первый шаг incremental_vacuum; дальше размер подбирается по времени
+VACUUM_MAX_PAGES = 16384
+CONVERT_MAX_BYTES = 1024 * 1024  # Полный VACUUM для перехода на incremental — в простое только для малых файлов
+MAINTENANCE_INTERVAL_HOURS = 24
+FRAGMENTATION_THRESHOLD = 0.2    # Доля свободных страниц, при которой обслуживание нужно раньше срока
+MIN_FREE_PAGES = 256
+MAX_LOGGED_RUNS = 30
+COMPACT_START_WINDOW = 5000  # Номеров журнала изменений за первый шаг сжатия; дальше — по времени
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def fragmentation(conn, schema="main"):
+    """Размер файла в страницах, число свободных страниц и их доля."""
+    page_count = conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+    free_pages = conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]
+    return page_count, free_pages, free_pages / page_count if page_count else 0.0
+
+
+class DatabaseMaintenance:
+    """Обслуживание файлов БД в простое: статистика планировщика, возврат места, проверка целостности.
+
+    Работа выполняется через отдельное соединение короткими шагами: каждый шаг
+    записи (ANALYZE одной таблицы, порция incremental_vacuum) укладывается в
+    lock_budget_ms, размер порции подстраивается по времени предыдущей.
+    Проверка целостности только читает и в режиме WAL запись не блокирует.
+    """
+    def __init__(self, conn, db_name, archive_path, lock_budget_ms=LOCK_BUDGET_MS):
+        self.conn = conn
+        self.db_name = db_name
+        self.archive_path = archive_path
+        self.lock_budget = lock_budget_ms / 1000
+
+    def create_schema(self):
+        """Создает журнал запусков обслуживания."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                id INTEGER PRIMARY KEY,
+                started_at TEXT NOT NULL,
+                finished_at TEXT NOT NULL,
+                completed INTEGER NOT NULL,
+                report TEXT NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def last_report(self):
+        """Отчет последнего запуска или None."""
+        row = self.conn.execute("SELECT report FROM maintenance_runs ORDER BY id DESC LIMIT 1").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def is_due(self, interval_hours=MAINTENANCE_INTERVAL_HOURS):
+        """Пора ли обслуживать: прошли сутки с последнего полного прохода или файл сильно фрагментирован."""
+        if self.db_name == ":memory:":
+            return False
+        row = self.conn.execute("SELECT MAX(finished_at) FROM maintenance_runs WHERE completed = 1").fetchone()
+        if row[0] is None:
+            return True
+        last = datetime.datetime.fromisoformat(row[0])
+        if datetime.datetime.now() - last >= datetime.timedelta(hours=interval_hours):
+            return True
+        _, free_pages, ratio = fragmentation(self.conn)
+        return free_pages >= MIN_FREE_PAGES and ratio >= FRAGMENTATION_THRESHOLD
+
+    def run(self, should_continue=None, allow_full_vacuum=False, compact_up_to=0):
+        """Выполняет проход обслуживания через собственное соединение; безопасно вызывать из фонового потока.
+
+        should_continue — функция без аргументов; когда она вернет False (пользователь
+        вернулся к работе), проход прерывается между шагами и продолжится в следующий раз.
+        allow_full_vacuum разрешает полный VACUUM для перевода большого файла
+        в режим incremental (запускается пользователем явно, блокировка будет дольше бюджета).
+        compact_up_to — номер журнала изменений, до которого его прочитали все
+        потребители (DatabaseManager.changelog_horizon); до него журнал сжимается.
+        """
+        started_at = datetime.datetime.now()
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_name)
+        self._step_times = []
+        report = {'schemas': {}, 'integrity': [], 'completed': False, 'changes_compacted': 0}
+        try:
+            conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            # Сжатие журнала — до сбора статистики и возврата места, чтобы они учли его результат
+            report['changes_compacted'] = self._compact_changes(conn, compact_up_to, should_continue)
+            if self.archive_path != ":memory:" and os.path.exists(self.archive_path):
+                conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            schemas = [row[1] for row in conn.execute("PRAGMA database_list") if row[1] != 'temp']
+            for schema in schemas:
+                report['schemas'][schema] = self._maintain_schema(conn, schema, should_continue, allow_full_vacuum)
+            report['integrity'] = self._quick_check(conn, schemas, should_continue)
+            report['completed'] = report['integrity'] is not None and all(
+                stats['completed'] for stats in report['schemas'].values())
+        finally:
+            report['duration'] = time.perf_counter() - started
+            report['steps'] = len(self._step_times)
+            report['locked_total'] = sum(self._step_times)
+            report['locked_max'] = max(self._step_times, default=0.0)
+            self._log(conn, started_at, report)
+            conn.close()
+        return report
+
+    def _write_step(self, conn, sql):
+        """Выполняет один шаг записи до конца и возвращает его длительность."""
+        # executescript проходит оператор до конца: PRAGMA incremental_vacuum освобождает по странице за шаг
+        return self._timed_step(lambda: conn.executescript(sql))[1]
+
+    def _timed_step(self, action):
+        """Выполняет шаг записи action(); возвращает его результат и длительность."""
+        started = time.perf_counter()
+        result = action()
+        elapsed = time.perf_counter() - started
+        self._step_times.append(elapsed)
+        time.sleep(STEP_PAUSE)
+        return result, elapsed
+
+    def _compact_changes(self, conn, up_to_seq, should_continue):
+        """Сжимает журнал изменений до up_to_seq окнами номеров; возвращает число удаленных записей."""
+        if not up_to_seq:
+            return 0
+        changelog = ChangeLog(conn)
+        after_seq = conn.execute("SELECT COALESCE(MIN(seq), 0) - 1 FROM task_changes").fetchone()[0]
+        window, removed = COMPACT_START_WINDOW, 0
+        while after_seq < up_to_seq:
+            if should_continue and not should_continue():
+                break
+            count, elapsed = self._timed_step(lambda: changelog.compact(up_to_seq, after_seq, window))
+            removed += count
+            after_seq += window
+            # Как и у incremental_vacuum: окно подбирается по времени предыдущего шага
+            per_seq = elapsed / window
+            window = min(window * 2, int(self.lock_budget / 2 / per_seq) if per_seq else window * 2)
+            window = max(1, window)
+        return removed
+
+    def _maintain_schema(self, conn, schema, should_continue, allow_full_vacuum):
+        """Статистика и возврат свободного места для одного файла (main или archive)."""
+        page_size = conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+        page_count, free_before, ratio_before = fragmentation(conn, schema)
+        file_path = conn.execute("SELECT file FROM pragma_database_list WHERE name = ?", (schema,)).fetchone()[0]
+        file_before = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+        stats = {'page_size': page_size, 'pages': page_count, 'free_pages_before': free_before,
+                 'fragmentation_before': ratio_before, 'analyzed': 0, 'converted': False,
+                 'file_bytes_before': file_before, 'completed': False}
+
+        tables = [row[0] for row in conn.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        for table in tables:
+            if should_continue and not should_continue():
+                break
+            self._write_step(conn, f'ANALYZE {schema}."{table}";')
+            stats['analyzed'] += 1
+
+        mode = conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0]
+        # Переход на incremental требует полного VACUUM: в простое — только если файл мал
+        if mode != 2 and (allow_full_vacuum or page_count * page_size <= CONVERT_MAX_BYTES):
+            self._write_step(conn, f"PRAGMA {schema}.auto_vacuum = INCREMENTAL; VACUUM {schema};")
+            mode = conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0]
+            stats['converted'] = mode == 2
+        stats['auto_vacuum'] = AUTO_VACUUM_MODES.get(mode, str(mode))
+
+        if mode == 2:
+            pages = VACUUM_START_PAGES
+            while (free := conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]) > 0:
+                if should_continue and not should_continue():
+                    break
+                step = min(pages, free)
+                elapsed = self._write_step(conn, f"PRAGMA {schema}.incremental_vacuum({step});")
+                # Перенесенные страницы сразу уходят из WAL в файл, иначе автоматическую
+                # контрольную точку после очередной записи пришлось бы делать приложению
+                conn.execute(f"PRAGMA {schema}.wal_checkpoint(PASSIVE)").fetchall()
+                # Размер следующей порции — по скорости этой, с двукратным запасом до бюджета
+                # (время на страницу заметно колеблется) и не больше чем вдвое крупнее
+                per_page = elapsed / step
+                pages = min(pages * 2, int(self.lock_budget / 2 / per_page) if per_page else pages * 2)
+                pages = max(1, min(VACUUM_MAX_PAGES, pages))
+        # Пассивная контрольная точка переносит изменения из WAL в файл, не дожидаясь читателей
+        conn.execute(f"PRAGMA {schema}.wal_checkpoint(PASSIVE)").fetchall()
+
+        page_count, free_after, ratio_after = fragmentation(conn, schema)
+        stats.update({
+            'free_pages_after': free_after,
+            'fragmentation_after': ratio_after,
+            'reclaimed_bytes': max(0, free_before - free_after) * page_size,
+            'file_bytes_after': os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0,
+            'completed': stats['analyzed'] == len(tables) and (mode != 2 or free_after == 0),
+        })
+        return stats
+
+    def _quick_check(self, conn, schemas, should_continue):
+        """PRAGMA quick_check по одной таблице за шаг; список ошибок или None, если проверка прервана."""
+        errors = []
+        for schema in schemas:
+            tables = [row[0] for row in conn.execute(
+                f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                if should_continue and not should_continue():
+                    return None
+                for (result,) in conn.execute(f'PRAGMA {schema}.quick_check("{table}")'):
+                    if result != 'ok':
+                        errors.append(f"{schema}.{table}: {result}")
+        return errors
+
+    def _log(self, conn, started_at, report):
+        """Сохраняет отчет в журнал запусков, оставляя последние MAX_LOGGED_RUNS записей."""
+        with conn:
+            conn.execute(
+                "INSERT INTO maintenance_runs (started_at, finished_at, completed, report) VALUES (?, ?, ?, ?)",
+                (started_at.isoformat(), datetime.datetime.now().isoformat(), int(report['completed']),
+                 json.dumps(report, ensure_ascii=False)))
+            conn.execute("DELETE FROM maintenance_runs WHERE id <= (SELECT MAX(id) FROM maintenance_runs) - ?",
+                         (MAX_LOGGED_RUNS,))
@@ -0,0 +1,264 @@
+# recurrence.py
+
+import calendar
+import datetime
+from collections import OrderedDict
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+MAX_CACHED_WINDOWS = 32
+MAX_OCCURRENCES_PER_WINDOW = 1000  # Защита от слишком широких окон
+
+# Готовые правила для выпадающего списка в диалогах
+RULE_PRESETS = [
+    ("Не повторять", None),
+    ("Ежедневно", "FREQ=DAILY"),
+    ("По будням", "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"),
+    ("Еженедельно", "FREQ=WEEKLY"),
+    ("Каждые две недели", "FREQ=WEEKLY;INTERVAL=2"),
+    ("Ежемесячно", "FREQ=MONTHLY"),
+    ("Ежегодно", "FREQ=YEARLY"),
+]
+
+
+def parse_rule(rule):
+    """Разбирает правило в стиле RRULE (FREQ, INTERVAL, BYDAY, COUNT, UNTIL). ValueError при ошибке."""
+    parts = {}
+    for item in (rule or '').upper().split(';'):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Некорректная часть правила: {item}")
+        parts[key.strip()] = value.strip()
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Неизвестная частота повторения: {freq}")
+    parsed = {
+        'freq': freq,
+        'interval': int(parts.get('INTERVAL', 1)),
+        'byday': None,
+        'count': int(parts['COUNT']) if 'COUNT' in parts else None,
+        'until': datetime.date.fromisoformat(parts['UNTIL'][:10]) if 'UNTIL' in parts else None,
+    }
+    if parsed['interval'] < 1:
+        raise ValueError("INTERVAL должен быть положительным")
+    if 'BYDAY' in parts:
+        days = [day.strip() for day in parts['BYDAY'].split(',') if day.strip()]
+        if not days or any(day not in WEEKDAYS for day in days):
+            raise ValueError(f"Некорректный BYDAY: {parts['BYDAY']}")
+        parsed['byday'] = sorted(WEEKDAYS.index(day) for day in days)
+    return parsed
+
+
+def normalize_rule(rule):
+    """Проверяет правило и возвращает его в каноническом виде (или None для пустого)."""
+    if not rule or not rule.strip():
+        return None
+    parse_rule(rule)
+    return rule.strip().upper()
+
+
+def _add_months(date, months, day):
+    """Дата через months месяцев с днем day или None, если такого дня в месяце нет."""
+    month_index = date.month - 1 + months
+    year, month = date.year + month_index // 12, month_index % 12 + 1
+    if day > calendar.monthrange(year, month)[1]:
+        return None
+    return datetime.date(year, month, day)
+
+
+def _iter_all(parsed, anchor, skip=0):
+    """Бесконечная последовательность дат повторения, пропуская skip первых периодов."""
+    freq, interval = parsed['freq'], parsed['interval']
+    if freq == 'DAILY':
+        current = anchor + datetime.timedelta(days=skip)
+        while True:
+            yield current
+            current += datetime.timedelta(days=interval)
+    elif freq == 'WEEKLY':
+        byday = parsed['byday'] or [anchor.weekday()]
+        week_start = anchor - datetime.timedelta(days=anchor.weekday()) + datetime.timedelta(weeks=skip)
+        while True:
+            for weekday in byday:
+                day = week_start + datetime.timedelta(days=weekday)
+                if day >= anchor:
+                    yield day
+            week_start += datetime.timedelta(weeks=interval)
+    else:
+        months = 1 if freq == 'MONTHLY' else 12
+        step = skip
+        while True:
+            if (day := _add_months(anchor, step * months, anchor.day)) is not None:
+                yield day
+            step += interval
+
+
+def _periods_to_skip(parsed, anchor, start):
+    """Число периодов (кратное INTERVAL), которые можно пропустить до начала окна.
+
+    С COUNT пропускать нельзя: номер вхождения нужен для проверки ограничения.
+    """
+    if parsed['count'] is not None or start <= anchor:
+        return 0
+    freq, interval = parsed['freq'], parsed['interval']
+    if freq == 'DAILY':
+        periods = (start - anchor).days
+    elif freq == 'WEEKLY':
+        periods = (start - anchor + datetime.timedelta(days=anchor.weekday())).days // 7
+    elif freq == 'MONTHLY':
+        periods = (start.year - anchor.year) * 12 + start.month - anchor.month
+    else:
+        periods = start.year - anchor.year
+    return max(0, periods - 1) // interval * interval
+
+
+def _as_date(value):
+    return datetime.date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def iter_occurrences(rule, anchor, start, end):
+    """Даты повторения правила rule с первой датой anchor, попадающие в [start, end]."""
+    parsed = parse_rule(rule)
+    anchor, start, end = _as_date(anchor), _as_date(start), _as_date(end)
+    if parsed['until'] is not None:
+        end = min(end, parsed['until'])
+    sequence = _iter_all(parsed, anchor, _periods_to_skip(parsed, anchor, start))
+    for index, day in enumerate(sequence):
+        if day > end or (parsed['count'] is not None and index >= parsed['count']):
+            return
+        if day >= start:
+            yield day
+
+
+def series_anchor(task):
+    """Первая дата серии: срок задачи, а без него — день создания."""
+    return task.get('due_date') or (task.get('created_at') or '')[:10] or None
+
+
+class RecurrenceManager:
+    """Повторяющиеся задачи: правило хранится один раз, вхождения раскрываются лениво по окну дат."""
+    def __init__(self, conn, changelog):
+        self.conn = conn
+        self.changelog = changelog
+        self._cache = OrderedDict()
+
+    def create_schema(self):
+        """Создает таблицу материализованных вхождений и индекс серий."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS task_occurrences (
+                series_id INTEGER NOT NULL,
+                occurrence_date TEXT NOT NULL,
+                task_id INTEGER,
+                PRIMARY KEY (series_id, occurrence_date)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_recurring ON tasks (id) WHERE recurrence_rule IS NOT NULL")
+        self.conn.commit()
+
+    def _series(self):
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE recurrence_rule IS NOT NULL AND is_completed = 0")
+        return [dict(row) for row in rows.fetchall()]
+
+    def _materialized(self, series_ids):
+        """Множество (серия, дата) уже материализованных вхождений."""
+        if not series_ids:
+            return set()
+        placeholders = ", ".join("?" for _ in series_ids)
+        rows = self.conn.execute(
+            f"SELECT series_id, occurrence_date FROM task_occurrences WHERE series_id IN ({placeholders})",
+            list(series_ids))
+        return {(row[0], row[1]) for row in rows}
+
+    def clear_cache(self):
+        """Очищает кэш вхождений (после восстановления из снимка номера журнала повторяются)."""
+        self._cache.clear()
+
+    def expand(self, start, end):
+        """Возвращает виртуальные строки задач-вхождений в окне [start, end] (с кэшем по окну).
+
+        Кэш сбрасывается при любом изменении задач: ключом служит номер последней
+        записи журнала изменений.
+        """
+        key = (str(start), str(end), self.changelog.last_seq())
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return [dict(row) for row in self._cache[key]]
+
+        occurrences = []
+        series = [task for task in self._series() if series_anchor(task)]
+        done = self._materialized([task['id'] for task in series])
+        for task in series:
+            try:
+                dates = iter_occurrences(task['recurrence_rule'], series_anchor(task), start, end)
+                for index, day in enumerate(dates):
+                    if index >= MAX_OCCURRENCES_PER_WINDOW:
+                        break
+                    if (task['id'], day.isoformat()) not in done:
+                        occurrences.append(dict(task, due_date=day.isoformat(),
+                                                occurrence_date=day.isoformat(), series_id=task['id']))
+            except ValueError:
+                continue  # Поврежденное правило не должно ломать списки задач
+
+        self._cache[key] = occurrences
+        while len(self._cache) > MAX_CACHED_WINDOWS:
+            self._cache.popitem(last=False)
+        return [dict(row) for row in occurrences]
+
+    def next_occurrence(self, task, today=None):
+        """Ближайшее незавершенное вхождение серии, начиная с сегодняшнего дня."""
+        today = today or datetime.date.today()
+        if not series_anchor(task):
+            return None
+        done = self._materialized([task['id']])
+        horizon = today + datetime.timedelta(days=366 * 5)
+        try:
+            for day in iter_occurrences(task['recurrence_rule'], series_anchor(task), today, horizon):
+                if (task['id'], day.isoformat()) not in done:
+                    return day.isoformat()
+        except ValueError:
+            pass
+        return None
+
+    def apply_next_occurrences(self, tasks):
+        """Подставляет в строки серий дату ближайшего вхождения (для обычных списков)."""
+        for task in tasks:
+            if task.get('recurrence_rule') and not task.get('is_completed'):
+                if next_date := self.next_occurrence(task):
+                    task['due_date'] = task['occurrence_date'] = next_date
+                    task['series_id'] = task['id']
+        return tasks
+
+    def complete_occurrence(self, series_id, occurrence_date):
+        """Материализует одно вхождение как завершенную задачу; остальные остаются виртуальными."""
+        series = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (series_id,)).fetchone()
+        if series is None:
+            return None
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO tasks (title, details_preview, tags, due_date, is_completed, is_important, created_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?)
+            ''', (series['title'], series['details_preview'], series['tags'], occurrence_date,
+                  series['is_important'], datetime.datetime.now().isoformat()))
+            task_id = cursor.lastrowid
+            # Завершение — отдельным UPDATE: только так триггер запишет его в журнал изменений,
+            # по которому строятся отчет «завершено за период» и статистика
+            self.conn.execute("UPDATE tasks SET is_completed = 1 WHERE id = ?", (task_id,))
+            # Детали копируются как есть, без распаковки
+            self.conn.execute(
+                "INSERT INTO task_details (task_id, compressed, body) SELECT ?, compressed, body FROM task_details WHERE task_id = ?",
+                (task_id, series_id))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO task_occurrences (series_id, occurrence_date, task_id) VALUES (?, ?, ?)",
+                (series_id, occurrence_date, task_id))
+        return task_id
+
+    def discard_occurrence(self, series_id, occurrence_date):
+        """Снимает отметку о материализованном вхождении; возвращает ID его задачи (без commit)."""
+        row = self.conn.execute(
+            "SELECT task_id FROM task_occurrences WHERE series_id = ? AND occurrence_date = ?",
+            (series_id, occurrence_date)).fetchone()
+        self.conn.execute("DELETE FROM task_occurrences WHERE series_id = ? AND occurrence_date = ?",
+                          (series_id, occurrence_date))
+        return row[0] if row else None
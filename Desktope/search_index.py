@@ -0,0 +1,305 @@
+# search_index.py
+
+import re
+import sqlite3
+
+from changelog import ChangeLog
+from details_store import decode_details
+
+# Поля задач, изменение которых требует переиндексации (плюс создание, удаление и перенос в архив)
+INDEXED_CHANGES = ('created', 'title', 'tags', 'details', 'deleted', 'archived', 'restored')
+MAX_INDEXED_CHARS = 2000    # Из длинных деталей индексируется только начало
+REFRESH_BATCH_SIZE = 1000
+POSTINGS_BUDGET = 20000     # Сколько записей индекса можно прочитать на генерацию кандидатов
+CANDIDATE_LIMIT = 200
+MIN_SIMILARITY = 0.4
+TYPO_TRIGRAMS = 4           # Сколько триграмм слова портит одна опечатка (перестановка соседних букв)
+MIN_MATCHED_TRIGRAMS = 2
+
+# Транслитерация кириллицы в латиницу: «zadacha» находит «задача» и наоборот
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+})
+WORD_PATTERN = re.compile(r"\w+")
+
+# Индексируемый текст задач; детали читаются из task_details (см. details_store.py)
+TASK_TEXT_SQL = f'''
+    SELECT t.id, t.title, t.tags, details_text(d.body, d.compressed, {MAX_INDEXED_CHARS}) AS details
+    FROM tasks AS t LEFT JOIN task_details AS d ON d.task_id = t.id
+'''
+
+
+def normalize_text(text):
+    """Приводит текст к нижнему регистру латиницей для сравнения по триграммам."""
+    return (text or '').lower().translate(TRANSLIT)
+
+
+def trigrams(text):
+    """Множество триграмм слов текста; слова дополняются пробелами, как в pg_trgm."""
+    grams = set()
+    for word in WORD_PATTERN.findall(normalize_text(text)):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def min_containment(gram_count):
+    """Доля триграмм запроса, которая должна совпасть с задачей.
+
+    Одна опечатка в коротком слове портит большую часть его триграмм
+    («dayli» и «daily» делят 2 из 6), поэтому короткому запросу прощается
+    одна опечатка, но совпасть должны хотя бы MIN_MATCHED_TRIGRAMS триграмм.
+    """
+    return max(MIN_MATCHED_TRIGRAMS / gram_count,
+               min(MIN_SIMILARITY, (gram_count - TYPO_TRIGRAMS) / gram_count))
+
+
+def task_trigrams(task):
+    """Триграммы названия, тегов и начала деталей задачи."""
+    details = (task['details'] or '')[:MAX_INDEXED_CHARS]
+    return trigrams(f"{task['title']} {task['tags'] or ''} {details}")
+
+
+class TrigramIndex:
+    """Триграммный индекс по названию, тегам и деталям для поиска с опечатками.
+
+    Обновляется инкрементально по журналу изменений короткими транзакциями.
+    Кандидаты отбираются по
+    самым редким триграммам запроса, чтобы ограничить объем чтения индекса,
+    и ранжируются по доле совпавших триграмм и сходству с названием.
+    """
+    def __init__(self, conn, changelog, readonly=False, db_name=None):
+        self.conn = conn
+        self.changelog = changelog
+        self.readonly = readonly
+        self.db_name = db_name  # Для обновления из фонового потока (refresh_detached)
+
+    def create_schema(self):
+        """Создает таблицу вхождений триграмм, частоты триграмм и состояние индекса."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trigrams (
+                gram TEXT NOT NULL,
+                task_id INTEGER NOT NULL,
+                PRIMARY KEY (gram, task_id)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trigrams_task ON trigrams (task_id)")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trigram_stats (
+                gram TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trigram_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def watermark(self):
+        """Последнее проиндексированное изменение журнала; None — индекс еще не строился."""
+        row = self.conn.execute("SELECT value FROM trigram_state WHERE key = 'last_seq'").fetchone()
+        return row[0] if row else None
+
+    def _set_watermark(self, seq):
+        self.conn.execute("INSERT OR REPLACE INTO trigram_state (key, value) VALUES ('last_seq', ?)", (seq,))
+
+    def reset(self):
+        """Забывает водяной знак и незаконченное построение: следующий refresh() построит индекс заново."""
+        with self.conn:
+            self.conn.execute("DELETE FROM trigram_state WHERE key IN ('last_seq', 'rebuild_seq', 'rebuild_id')")
+
+    def is_stale(self):
+        """Есть ли изменения журнала, которые индекс еще не учел."""
+        watermark = self.watermark()
+        return watermark is None or watermark < self.changelog.last_seq()
+
+    def refresh(self, should_continue=None):
+        """Догоняет журнал изменений порциями; возвращает число переиндексированных задач.
+
+        Каждая порция — отдельная короткая транзакция, поэтому даже первое построение
+        индекса большой БД не блокирует запись другим соединениям. should_continue
+        проверяется перед каждой порцией; прерванный проход продолжается с того же места.
+        """
+        if self.readonly:
+            return 0
+        count = 0
+        while should_continue is None or should_continue():
+            done = self._step()
+            if done is None:
+                break
+            count += done
+        return count
+
+    def refresh_detached(self, should_continue=None):
+        """Выполняет refresh() через собственное соединение; безопасно вызывать из фонового потока."""
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.create_function('details_text', 3, decode_details, deterministic=True)
+            return TrigramIndex(conn, ChangeLog(conn)).refresh(should_continue)
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """Строит индекс заново по всем задачам основной таблицы; возвращает число обработанных задач."""
+        self.reset()
+        return self.refresh()
+
+    def _step(self):
+        """Выполняет одну порцию построения или обновления индекса; None — индекс актуален."""
+        self.conn.commit()
+        # Состояние индекса читается под блокировкой записи: его могут догонять и другие соединения
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = self._rebuild_step() if self.watermark() is None else self._refresh_step()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return done
+
+    def _rebuild_step(self):
+        """Индексирует очередные REFRESH_BATCH_SIZE задач по возрастанию ID.
+
+        Номер журнала на момент начала построения запоминается: изменения, сделанные
+        во время построения, затем догоняются обычным обновлением.
+        """
+        state = dict(self.conn.execute(
+            "SELECT key, value FROM trigram_state WHERE key IN ('rebuild_seq', 'rebuild_id')").fetchall())
+        if not state:
+            self.conn.execute("DELETE FROM trigrams")
+            self.conn.execute("DELETE FROM trigram_stats")
+            state = {'rebuild_seq': self.changelog.last_seq(), 'rebuild_id': 0}
+        tasks = self.conn.execute(f"{TASK_TEXT_SQL} WHERE t.id > ? ORDER BY t.id LIMIT ?",
+                                  (state['rebuild_id'], REFRESH_BATCH_SIZE)).fetchall()
+        if not tasks:
+            self.conn.execute("DELETE FROM trigram_state WHERE key IN ('rebuild_seq', 'rebuild_id')")
+            self._set_watermark(state['rebuild_seq'])
+            return 0
+        postings, df = [], {}
+        for task in tasks:
+            for gram in task_trigrams(task):
+                postings.append((gram, task['id']))
+                df[gram] = df.get(gram, 0) + 1
+        postings.sort()
+        self.conn.executemany("INSERT INTO trigrams (gram, task_id) VALUES (?, ?)", postings)
+        self._add_df(df)
+        self.conn.executemany("INSERT OR REPLACE INTO trigram_state (key, value) VALUES (?, ?)",
+                              [('rebuild_seq', state['rebuild_seq']), ('rebuild_id', tasks[-1]['id'])])
+        return len(tasks)
+
+    def _refresh_step(self):
+        """Переиндексирует задачи из очередных REFRESH_BATCH_SIZE записей журнала после водяного знака."""
+        watermark = self.watermark()
+        placeholders = ", ".join("?" for _ in INDEXED_CHANGES)
+        rows = self.conn.execute(
+            f"SELECT seq, task_id FROM task_changes WHERE seq > ? AND field IN ({placeholders}) ORDER BY seq LIMIT ?",
+            (watermark, *INDEXED_CHANGES, REFRESH_BATCH_SIZE)).fetchall()
+        if not rows:
+            # Остались только изменения полей, которые не индексируются
+            if (last_seq := self.changelog.last_seq()) > watermark:
+                self._set_watermark(last_seq)
+            return None
+        changed = list({row[1] for row in rows})
+        self._reindex(changed)
+        self._set_watermark(rows[-1][0])
+        return len(changed)
+
+    def _reindex(self, task_ids):
+        """Заменяет вхождения триграмм задач task_ids и обновляет частоты триграмм."""
+        placeholders = ", ".join("?" for _ in task_ids)
+        df_delta = {}
+        for gram, count in self.conn.execute(
+                f"SELECT gram, COUNT(*) FROM trigrams WHERE task_id IN ({placeholders}) GROUP BY gram", task_ids):
+            df_delta[gram] = -count
+        self.conn.execute(f"DELETE FROM trigrams WHERE task_id IN ({placeholders})", task_ids)
+
+        postings = []
+        for task in self.conn.execute(f"{TASK_TEXT_SQL} WHERE t.id IN ({placeholders})", task_ids):
+            for gram in task_trigrams(task):
+                postings.append((gram, task['id']))
+                df_delta[gram] = df_delta.get(gram, 0) + 1
+        self.conn.executemany("INSERT INTO trigrams (gram, task_id) VALUES (?, ?)", postings)
+        self._add_df(df_delta)
+        self.conn.execute("DELETE FROM trigram_stats WHERE df <= 0")
+
+    def _add_df(self, df_delta):
+        """Прибавляет к частотам триграмм изменения {триграмма: приращение}."""
+        self.conn.executemany('''
+            INSERT INTO trigram_stats (gram, df) VALUES (?, ?)
+            ON CONFLICT (gram) DO UPDATE SET df = df + excluded.df
+        ''', [(gram, delta) for gram, delta in df_delta.items() if delta])
+
+    def _candidates(self, query_grams):
+        """Отбирает кандидатов по триграммам запроса, читая не больше POSTINGS_BUDGET записей индекса.
+
+        Триграммы просматриваются от редких к частым: редкие читаются целиком,
+        частые — лишь в пределах оставшегося бюджета, поэтому время запроса
+        ограничено даже для запросов только из частых сочетаний букв.
+        """
+        placeholders = ", ".join("?" for _ in query_grams)
+        known = self.conn.execute(
+            f"SELECT gram, df FROM trigram_stats WHERE gram IN ({placeholders}) ORDER BY df", list(query_grams)).fetchall()
+        # Остаток бюджета делится поровну; недобранное редкими триграммами достается частым
+        quotas, budget = [], POSTINGS_BUDGET
+        for index, (gram, df) in enumerate(known):
+            take = min(df, budget // (len(known) - index))
+            if take > 0:
+                quotas.append((gram, take))
+                budget -= take
+        if not quotas:
+            return []
+        # Совпадения считаются одним запросом: каждая триграмма читает не больше своей квоты.
+        # Завершенные задачи отсеиваются до LIMIT, иначе они вытесняли бы открытые из кандидатов
+        postings = " UNION ALL ".join(
+            "SELECT * FROM (SELECT task_id FROM trigrams WHERE gram = ? LIMIT ?)" for _ in quotas)
+        rows = self.conn.execute(f'''
+            SELECT hits.task_id FROM (SELECT task_id, COUNT(*) AS matched FROM ({postings}) GROUP BY task_id) AS hits
+            JOIN tasks ON tasks.id = hits.task_id
+            WHERE tasks.is_completed = 0
+            ORDER BY hits.matched DESC LIMIT ?
+        ''', [value for quota in quotas for value in quota] + [CANDIDATE_LIMIT])
+        return [row[0] for row in rows]
+
+    def search(self, query, limit=50):
+        """Ищет незавершенные задачи, похожие на query; возвращает (сходство, задача) по убыванию сходства.
+
+        Поиск не обновляет индекс и не пишет в БД: изменения, еще не обработанные
+        refresh(), в результатах не видны. В приложении индекс догоняет фоновый
+        поток SearchIndexWorker (см. main.py), а не поток интерфейса.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        candidates = self._candidates(query_grams)
+        if not candidates:
+            return []
+
+        # Точное число совпавших триграмм запроса — точечными обращениями к первичному ключу
+        gram_placeholders = ", ".join("?" for _ in query_grams)
+        task_placeholders = ", ".join("?" for _ in candidates)
+        overlap = dict(self.conn.execute(f'''
+            SELECT task_id, COUNT(*) FROM trigrams
+            WHERE gram IN ({gram_placeholders}) AND task_id IN ({task_placeholders})
+            GROUP BY task_id
+        ''', (*query_grams, *candidates)).fetchall())
+
+        threshold = min_containment(len(query_grams))
+        results = []
+        for task in self.conn.execute(
+                f"SELECT * FROM tasks WHERE id IN ({task_placeholders}) AND is_completed = 0", candidates):
+            containment = overlap.get(task['id'], 0) / len(query_grams)
+            title_grams = trigrams(task['title'])
+            title_similarity = len(query_grams & title_grams) / len(query_grams | title_grams)
+            score = 0.6 * containment + 0.4 * title_similarity
+            if containment >= threshold:
+                results.append((score, dict(task)))
+        results.sort(key=lambda item: item[0], reverse=True)
+        return results[:limit]
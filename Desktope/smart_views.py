@@ -0,0 +1,115 @@
+# smart_views.py
+
+import datetime
+from collections import OrderedDict
+
+# Умные списки по сроку выполнения: фильтр -> название в «Избранном»
+SMART_VIEWS = {
+    'overdue': "Просроченные",
+    'today': "Сегодня",
+    'week': "На этой неделе",
+}
+MAX_CACHED_VIEWS = 16
+
+
+def view_window(view, today=None):
+    """Границы срока (start, end) умного списка; start=None — граница открыта.
+
+    Списки не пересекаются: «Просроченные» — срок раньше сегодняшнего дня,
+    «Сегодня» — текущий день, «На этой неделе» — с завтрашнего дня по воскресенье.
+    """
+    if isinstance(today, str):
+        today = datetime.date.fromisoformat(today[:10])
+    today = today or datetime.date.today()
+    if view == 'overdue':
+        return None, today - datetime.timedelta(days=1)
+    if view == 'today':
+        return today, today
+    if view == 'week':
+        return today + datetime.timedelta(days=1), today + datetime.timedelta(days=6 - today.weekday())
+    raise ValueError(f"Неизвестный умный список: {view}")
+
+
+class SmartViews:
+    """Умные списки незавершенных задач по сроку: просроченные, на сегодня, на эту неделю.
+
+    Состав списка выбирается диапазонным запросом по индексу (is_completed, due_date, ...),
+    серии повторяющихся задач раскрываются во вхождения внутри окна (просроченными
+    вхождения не считаются). Результаты кэшируются; ключ кэша — день и номер
+    последней записи журнала изменений, поэтому любое изменение задач и смена
+    даты в полночь сбрасывают его без явной очистки. Явно кэш очищается
+    только после восстановления БД из снимка (clear_cache).
+    """
+    def __init__(self, conn, changelog, recurrence):
+        self.conn = conn
+        self.changelog = changelog
+        self.recurrence = recurrence
+        self._cache = OrderedDict()
+
+    def create_schema(self):
+        """Создает индекс для диапазонных выборок незавершенных задач по сроку."""
+        # recurrence_rule в индексе позволяет считать задачи списков, не читая сами строки
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_open_due ON tasks (is_completed, due_date, recurrence_rule)")
+        self.conn.commit()
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _cached(self, key, build):
+        key = (*key, self.changelog.last_seq())
+        if key not in self._cache:
+            self._cache[key] = build()
+            while len(self._cache) > MAX_CACHED_VIEWS:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(key)
+        return self._cache[key]
+
+    def tasks(self, view, today=None):
+        """Задачи умного списка (копии строк): по сроку, затем важные, затем новые."""
+        start, end = view_window(view, today)
+        rows = self._cached((view, str(start), end.isoformat()), lambda: self._load(start, end))
+        return [dict(row) for row in rows]
+
+    def _load(self, start, end):
+        if start is not None and start > end:
+            return []  # В воскресенье «На этой неделе» уже не остается дней
+        condition, params = ("due_date <= ?", [end.isoformat()]) if start is None else \
+            ("due_date BETWEEN ? AND ?", [start.isoformat(), end.isoformat()])
+        tasks = [dict(row) for row in self.conn.execute(f'''
+            SELECT * FROM tasks
+            WHERE is_completed = 0 AND {condition} AND recurrence_rule IS NULL
+            ORDER BY due_date ASC, is_important DESC, created_at DESC
+        ''', params)]
+        if start is None:
+            return tasks
+        if occurrences := self.recurrence.expand(start, end):
+            tasks += occurrences
+            tasks.sort(key=lambda task: task['created_at'], reverse=True)
+            tasks.sort(key=lambda task: (task['due_date'], not task['is_important']))
+        return tasks
+
+    def counts(self, today=None):
+        """Число задач в каждом умном списке: {фильтр: число} — одним проходом по индексу."""
+        windows = {view: view_window(view, today) for view in SMART_VIEWS}
+        return dict(self._cached(('counts', windows['today'][1].isoformat()), lambda: self._count(windows)))
+
+    def _count(self, windows):
+        columns, params = [], []
+        for view, (start, end) in windows.items():
+            if start is None:
+                columns.append("COALESCE(SUM(due_date <= ?), 0)")
+                params.append(end.isoformat())
+            else:
+                columns.append("COALESCE(SUM(due_date BETWEEN ? AND ?), 0)")
+                params.extend([start.isoformat(), end.isoformat()])
+        latest = max(end for _, end in windows.values())
+        row = self.conn.execute(f'''
+            SELECT {", ".join(columns)} FROM tasks
+            WHERE is_completed = 0 AND due_date <= ? AND recurrence_rule IS NULL
+        ''', [*params, latest.isoformat()]).fetchone()
+        counts = dict(zip(windows, row))
+        for view, (start, end) in windows.items():
+            if start is not None and start <= end:
+                counts[view] += len(self.recurrence.expand(start, end))
+        return counts
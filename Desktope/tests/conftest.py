@@ -0,0 +1,23 @@
+# conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Модули приложения лежат плоско в Desktope/ и импортируются по имени
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "zettelkasten.db")
+
+
+@pytest.fixture
+def db(db_path):
+    db = DatabaseManager(db_path)
+    yield db
+    db.close()
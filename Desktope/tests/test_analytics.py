@@ -0,0 +1,93 @@
+# test_analytics.py
+
+import datetime
+
+from analytics import ALL_TAGS
+
+TODAY = datetime.date.today().isoformat()
+YESTERDAY = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+
+
+def summary(db):
+    """Сводка после обновления без задачи-приветствия: {(тег, день, показатель): число}."""
+    db.analytics.refresh()
+    return {(row[0], row[1], row[2]): row[3] for row in db.conn.execute(
+        "SELECT tag, day, metric, count FROM stats_daily WHERE tag NOT IN ('Начало', 'Zettelkasten')")
+        if row[0] != ALL_TAGS}
+
+
+def all_tags(db, metric, day=TODAY):
+    db.analytics.refresh()
+    row = db.conn.execute("SELECT count FROM stats_daily WHERE tag = ? AND day = ? AND metric = ?",
+                          (ALL_TAGS, day, metric)).fetchone()
+    return row[0] if row else 0
+
+
+def stats_rows(db):
+    return [tuple(row) for row in db.conn.execute(
+        "SELECT tag, day, metric, count FROM stats_daily ORDER BY tag, day, metric")]
+
+
+def test_update_replaces_previous_contribution(db):
+    db.analytics.refresh()
+    created = all_tags(db, 'created')
+    task_id = db.add_task("Задача", tags="a, b")
+    assert summary(db) == {('a', TODAY, 'created'): 1, ('b', TODAY, 'created'): 1}
+    assert all_tags(db, 'created') == created + 1  # Задача с двумя тегами учитывается один раз
+
+    db.update_task(task_id, {'tags': "b, c"})
+    assert summary(db) == {('b', TODAY, 'created'): 1, ('c', TODAY, 'created'): 1}
+
+    db.update_task_status(task_id, 1)
+    assert db.analytics.refresh() == 1  # Пересчитана только измененная задача
+    assert summary(db)[('c', TODAY, 'completed')] == 1
+    db.update_task_status(task_id, 0)
+    assert ('c', TODAY, 'completed') not in summary(db)
+    assert all_tags(db, 'created') == created + 1
+
+
+def test_overdue_delta_and_late_completion(db):
+    task_id = db.add_task("Просроченная", tags="x", due_date=YESTERDAY)
+    assert summary(db)[('x', TODAY, 'overdue_delta')] == 1
+    assert db.analytics.overdue_trend(TODAY, TODAY, tag='x') == [(TODAY, 1)]
+
+    db.update_task_status(task_id, 1)  # Завершена сегодня, на день позже срока: +1 и -1 в один день
+    assert ('x', TODAY, 'overdue_delta') not in summary(db)
+    assert db.analytics.overdue_trend(TODAY, TODAY, tag='x') == [(TODAY, 0)]
+
+
+def test_delete_removes_counted_task(db):
+    task_id = db.add_task("Удаляемая", tags="d")
+    assert summary(db) == {('d', TODAY, 'created'): 1}
+    db.delete_task(task_id)
+    assert summary(db) == {}
+
+
+def test_archive_moves_keep_counts(db):
+    task_id = db.add_task("В архив", tags="arch")
+    db.update_task_status(task_id, 1)
+    before = summary(db)
+    assert before[('arch', TODAY, 'completed')] == 1
+
+    db.archive.archive_completed(older_than_days=-1)
+    assert db.archive.contains(task_id)
+    assert summary(db) == before
+    db.update_task_status(task_id, 0)  # Изменение возвращает задачу из архива
+    assert not db.archive.contains(task_id)
+    assert summary(db) == {('arch', TODAY, 'created'): 1}
+
+
+def test_incremental_matches_rebuild(db):
+    ids = [db.add_task(f"Задача {i}", tags=f"t{i % 3}", due_date=YESTERDAY if i % 2 else None) for i in range(9)]
+    db.analytics.refresh()
+    db.update_task(ids[0], {'tags': "t9"})
+    db.update_task_status(ids[1], 1)
+    db.update_task_status(ids[2], 1)
+    db.delete_task(ids[3])
+    db.archive.archive_completed(older_than_days=-1)
+    db.analytics.refresh()
+    incremental = stats_rows(db)
+
+    db.analytics.reset()
+    db.analytics.refresh()
+    assert stats_rows(db) == incremental
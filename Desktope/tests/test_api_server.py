@@ -0,0 +1,41 @@
+# test_api_server.py
+
+import asyncio
+import json
+
+import pytest
+
+import api_server
+from api_server import ApiServer, TaskStore, INTERNAL_ERROR, INVALID_PARAMS
+
+
+@pytest.fixture
+def api(db_path):
+    store = TaskStore(str(db_path), readers=1)
+    yield ApiServer(store)
+    store.close()
+
+
+def rpc(api, method, params=None):
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}).encode('utf-8')
+    return asyncio.run(api.handle_rpc(body))
+
+
+def test_params_checked_against_signature(api):
+    assert rpc(api, "get_task", {"id": 1})['error']['code'] == INVALID_PARAMS
+    assert rpc(api, "get_task", [1, 2])['error']['code'] == INVALID_PARAMS
+    assert rpc(api, "add_task", {"title": "Задача", "color": "red"})['error']['code'] == INVALID_PARAMS
+    assert rpc(api, "get_tasks", "all")['error']['code'] == INVALID_PARAMS
+
+    task_id = rpc(api, "add_task", {"title": "Задача", "tags": "api"})['result']
+    assert rpc(api, "get_task", [task_id])['result']['title'] == "Задача"
+
+
+def test_type_error_inside_method_is_internal(api, monkeypatch):
+    def broken(db, task_id):
+        return len(task_id)  # TypeError в коде метода, а не в параметрах запроса
+
+    monkeypatch.setitem(api_server.METHODS, 'broken', (False, broken))
+    monkeypatch.setitem(api_server.SIGNATURES, 'broken', api_server.inspect.signature(broken))
+    error = rpc(api, "broken", {"task_id": 1})['error']
+    assert error['code'] == INTERNAL_ERROR
@@ -0,0 +1,44 @@
+# test_archive.py
+
+
+def archive_task(db, task_id):
+    db.update_task_status(task_id, 1)
+    db.archive.archive_completed(older_than_days=-1)
+    assert db.archive.contains(task_id)
+
+
+def test_reminders_survive_archive_and_restore(db):
+    task_id = db.add_task("С напоминаниями")
+    db.replace_all_reminders_for_task(task_id, ["2030-01-01T09:00:00", "2030-01-02T09:00:00"])
+
+    archive_task(db, task_id)
+    assert [r['reminder_datetime'] for r in db.get_reminders_for_task(task_id)] == \
+        ["2030-01-01T09:00:00", "2030-01-02T09:00:00"]
+
+    db.update_task_status(task_id, 0)  # Изменение возвращает задачу из архива
+    assert not db.archive.contains(task_id)
+    assert [r['reminder_datetime'] for r in db.get_reminders_for_task(task_id)] == \
+        ["2030-01-01T09:00:00", "2030-01-02T09:00:00"]
+
+
+def test_delete_reminder_of_archived_task(db):
+    task_id = db.add_task("Задача")
+    db.add_reminder(task_id, "2030-01-01T09:00:00")
+    archive_task(db, task_id)
+    reminder_id = db.get_reminders_for_task(task_id)[0]['id']
+    db.delete_reminder(reminder_id)
+    assert db.get_reminders_for_task(task_id) == []
+
+
+def test_links_to_and_from_archived_tasks(db):
+    target = db.add_task("Старая заметка")
+    source = db.add_task("Новая заметка", details="см. [[Старая заметка]]")
+    archive_task(db, target)
+
+    backlinks = db.links.get_backlinks(target)
+    assert [(link['id'], link['archived']) for link in backlinks] == [(source, 0)]
+    assert [(link['id'], link['archived']) for link in db.links.get_outgoing(source)] == [(target, 1)]
+
+    # Ссылка, записанная уже после архивации цели, тоже находит ее
+    later = db.add_task("Еще заметка", details=f"[[{target}]] и [[Старая заметка]]")
+    assert [link['id'] for link in db.links.get_outgoing(later)] == [target]
@@ -0,0 +1,97 @@
+# test_backup.py
+
+import datetime
+import gzip
+
+from backup import DatabaseBackups
+from commands import CommandJournal
+
+
+def snapshot(db, tmp_path):
+    backups = DatabaseBackups(db, str(tmp_path / "backups"))
+    backups.create_snapshot()
+    stamp, _ = backups.list_snapshots()[0]
+    return backups, stamp
+
+
+def test_restore_does_not_reuse_change_numbers(db, tmp_path):
+    today = datetime.date.today().isoformat()
+    backups, stamp = snapshot(db, tmp_path)
+    seq_at_snapshot = db.changelog.last_seq()
+
+    db.add_task("Сегодня", due_date=today)
+    assert db.smart_views.counts()['today'] == 1
+    seq_before_restore = db.changelog.last_seq()
+
+    assert backups.restore(stamp)
+    assert db.changelog.last_seq() == seq_at_snapshot
+    assert db.smart_views.counts()['today'] == 0
+
+    # Новая запись журнала получает номер после выданных до восстановления
+    db.add_task("Без срока")
+    assert db.changelog.last_seq() > seq_before_restore
+    assert db.smart_views.counts()['today'] == 0
+
+
+def test_restore_does_not_reuse_task_ids(db, tmp_path):
+    backups, stamp = snapshot(db, tmp_path)
+    discarded = db.add_task("После снимка")
+    db.delete_task(db.add_task("Удаленная после снимка"))
+
+    assert backups.restore(stamp)
+    assert db.get_task_by_id(discarded) is None
+
+    # ID задач, существовавших до восстановления, не выдаются заново
+    task_id = db.add_task("Новая")
+    assert task_id > discarded + 1
+    assert [change['field'] for change in db.changelog.get_task_history(task_id)] == ['created']
+
+
+def test_restore_rebuilds_derived_indexes(db, tmp_path):
+    db.analytics.refresh()
+    db.search_index.refresh()
+    backups, stamp = snapshot(db, tmp_path)
+    db.add_task("После снимка")
+
+    assert backups.restore(stamp)
+
+    assert db.analytics.watermark() is None
+    assert db.search_index.watermark() is None
+    db.search_index.refresh()
+    assert not [task for _, task in db.search_index.search("После снимка")]
+
+
+def test_corrupt_archive_snapshot_changes_nothing(db, tmp_path):
+    backups, stamp = snapshot(db, tmp_path)
+    with gzip.open(backups.archive.snapshot_path(stamp), "wb") as f:
+        f.write(b"not a database")
+    task_id = db.add_task("После снимка")
+
+    assert not backups.restore(stamp)
+    assert db.get_task_by_id(task_id)['title'] == "После снимка"
+
+
+def test_failed_archive_restore_rolls_main_back(db, tmp_path, monkeypatch):
+    archived = db.add_task("В архиве")
+    db.update_task_status(archived, 1)
+    backups, stamp = snapshot(db, tmp_path)
+    db.archive.archive_completed(older_than_days=-1)
+    task_id = db.add_task("После снимка")
+
+    def broken(snapshot_path, target, verify=True):
+        raise OSError("нет места на диске")
+
+    monkeypatch.setattr(backups.archive, 'restore_snapshot', broken)
+    assert not backups.restore(stamp)
+    assert db.get_task_by_id(task_id)['title'] == "После снимка"
+    assert db.archive.contains(archived)
+    assert db.conn.execute("SELECT COUNT(*) FROM main.tasks WHERE id = ?", (archived,)).fetchone()[0] == 0
+
+
+def test_journal_clear_forgets_history(db):
+    journal = CommandJournal(db)
+    task_id = db.add_task("Задача")
+    journal.set_field(task_id, 'is_important', 1)
+    journal.clear()
+    assert not journal.can_undo() and not journal.has_pending()
+    assert db.get_task_by_id(task_id)['is_important'] == 0
@@ -0,0 +1,73 @@
+# test_changelog.py
+
+import datetime
+import sqlite3
+
+from database import DatabaseManager
+
+
+def test_reopen_does_not_recreate_triggers(db, db_path):
+    reopened = DatabaseManager(db_path)
+    statements = []
+    reopened.conn.set_trace_callback(statements.append)
+    reopened.changelog.create_schema()
+    reopened.close()
+    assert not [sql for sql in statements if "CREATE TRIGGER" in sql or "DROP TRIGGER" in sql]
+
+
+def test_details_change_is_logged_without_text(db):
+    task_id = db.add_task("Заметка", details="короткий текст")
+    db.update_task(task_id, {'details': "длинный текст " * 500})
+    changes = [change for change in db.changelog.get_task_history(task_id) if change['field'] == 'details']
+    assert len(changes) == 1
+    assert changes[0]['old_value'] is None and changes[0]['new_value'] is None
+
+
+def test_details_update_from_plain_connection(db_path):
+    """Триггеры не зависят от функций приложения: БД можно править обычным sqlite3."""
+    db = DatabaseManager(db_path)
+    task_id = db.add_task("Заметка", details="текст")
+    db.close()
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE task_details SET body = 'другой текст' WHERE task_id = ?", (task_id,))
+    conn.close()
+    db = DatabaseManager(db_path)
+    assert db.details.get(task_id) == "другой текст"
+    assert db.changelog.get_task_history(task_id)[-1]['field'] == 'details'
+    db.close()
+
+
+def test_maintenance_compacts_changes_up_to_horizon(db):
+    task_id = db.add_task("Задача")
+    for value in (1, 0, 1, 0, 1):
+        db.update_task_status(task_id, value)
+    # Сводку статистики не открывали: ее отсутствие сжатию не мешает
+    assert db.analytics.watermark() is None
+    db.search_index.refresh()
+    db.text_index.refresh()
+    horizon = db.changelog_horizon()
+    assert horizon == db.changelog.last_seq()
+    db.update_task_status(task_id, 0)  # Еще не прочитано потребителями — не сжимается
+
+    report = db.maintenance.run(compact_up_to=horizon)
+
+    assert report['changes_compacted'] == 4
+    statuses = [(change['seq'], change['new_value']) for change in db.changelog.get_task_history(task_id)
+                if change['field'] == 'is_completed']
+    assert [value for _, value in statuses] == [1, 0]
+    assert statuses[0][0] <= horizon < statuses[1][0]
+    today = datetime.date.today().isoformat()
+    untagged = {row['tag']: row for row in db.analytics.tag_summary(today, today)}['']
+    assert (untagged['created'], untagged['completed']) == (1, 0)
+
+
+def test_horizon_waits_for_built_consumers_only(db):
+    db.add_task("Задача")
+    db.search_index.refresh()
+    db.text_index.refresh()
+    indexed = db.changelog.last_seq()
+    db.add_task("Еще одна")
+    assert db.changelog_horizon() == indexed
+    db.analytics.refresh()
+    assert db.changelog_horizon() == indexed
@@ -0,0 +1,108 @@
+# test_commands.py
+
+import sqlite3
+
+import pytest
+
+from commands import BulkDeleteCommand, BulkEditCommand, CommandJournal, EditTaskCommand, SetFieldCommand
+
+
+def test_staging_reads_only_the_field(db, monkeypatch):
+    task_id = db.add_task("Длинная задача", details="текст " * 5000)
+    journal = CommandJournal(db)
+
+    def fail(*args):
+        pytest.fail("детали не должны читаться при изменении статуса")
+
+    monkeypatch.setattr(db.details, 'get', fail)
+    monkeypatch.setattr(db.details, 'get_many', fail)
+    assert journal.current_value(task_id, 'is_completed') == 0
+    journal.execute(SetFieldCommand(task_id, 'is_completed', 0, 1))
+    assert journal.current_value(task_id, 'is_completed') == 1
+    journal.flush()
+    assert db.get_field_values([task_id], 'is_completed') == {task_id: 1}
+    assert journal.current_value(task_id + 1, 'is_completed') is None
+
+
+def test_edit_is_one_transaction(db):
+    task_id = db.add_task("Черновик", details="старый текст")
+    db.replace_all_reminders_for_task(task_id, ["2030-01-01T09:00"])
+    journal = CommandJournal(db)
+    old_data = {'title': "Черновик", 'details': "старый текст"}
+    command = EditTaskCommand(task_id, old_data, {'title': "Отчет", 'details': "новый текст"},
+                              ["2030-01-01T09:00"], ["2030-02-01T09:00", None])
+
+    with pytest.raises(sqlite3.IntegrityError):  # Напоминание без времени нарушает NOT NULL
+        journal.execute(command)
+    task = db.get_task_by_id(task_id)
+    assert (task['title'], task['details']) == ("Черновик", "старый текст")
+    assert [r['reminder_datetime'] for r in db.get_reminders_for_task(task_id)] == ["2030-01-01T09:00"]
+
+    command.new_reminders = ["2030-02-01T09:00"]
+    journal.execute(command)
+    assert db.get_task_by_id(task_id)['title'] == "Отчет"
+    journal.undo()
+    task = db.get_task_by_id(task_id)
+    assert (task['title'], task['details']) == ("Черновик", "старый текст")
+    assert [r['reminder_datetime'] for r in db.get_reminders_for_task(task_id)] == ["2030-01-01T09:00"]
+
+
+def tags_of(db, task_ids):
+    return [db.get_task_by_id(task_id)['tags'] for task_id in task_ids]
+
+
+def test_bulk_retag_adds_and_removes_whole_tags(db):
+    ids = [db.add_task("Первая", tags="работа, раб"), db.add_task("Вторая"), db.add_task("Третья", tags="дом")]
+    db.conn.execute("UPDATE tasks SET tags = 'раб, дом,раб' WHERE id = ?", (ids[2],))  # Повтор тега
+    db.conn.commit()
+    journal = CommandJournal(db)
+
+    journal.execute(BulkEditCommand(ids, 'tags', 'bulk_retag', "дом", None))
+    assert tags_of(db, ids) == ["работа,раб,дом", "дом", "раб,дом,раб"]
+    assert db.bulk_retag(ids, "дом", None) == 0  # Задачи с тегом не переписываются
+    assert db.bulk_retag(ids, None, "раб") == 2
+    assert tags_of(db, ids) == ["работа,дом", "дом", "дом"]
+    assert db.bulk_retag(ids, None, "раб") == 0
+    journal.undo()
+    assert tags_of(db, ids) == ["работа,раб", "", "раб, дом,раб"]
+
+    with pytest.raises(ValueError):
+        db.bulk_retag(ids, "a,b", None)
+
+
+def test_bulk_shift_due_skips_tasks_without_due_date(db):
+    ids = [db.add_task("Со сроком", due_date="2030-01-31"), db.add_task("Без срока")]
+    journal = CommandJournal(db)
+    journal.execute(BulkEditCommand(ids, 'due_date', 'bulk_shift_due', 1))
+    assert db.get_field_values(ids, 'due_date') == {ids[0]: "2030-02-01", ids[1]: None}
+    assert db.bulk_shift_due(ids, -7) == 1
+    journal.undo()
+    assert db.get_field_values(ids, 'due_date') == {ids[0]: "2030-01-31", ids[1]: None}
+
+
+def test_bulk_delete_undo_redo_restores_ids_reminders_and_links(db):
+    first = db.add_task("Альфа", details="см. [[Бета]]")
+    second = db.add_task("Бета")
+    citing = db.add_task("Гамма", details="[[Альфа]]")
+    db.replace_all_reminders_for_task(second, ["2030-01-01T09:00", "2030-01-02T09:00"])
+    journal = CommandJournal(db)
+
+    def state():
+        return ([task['id'] for task in db.links.get_backlinks(second)],
+                [task['id'] for task in db.links.get_backlinks(first)],
+                [r['reminder_datetime'] for r in db.get_reminders_for_task(second)])
+
+    before = state()
+    assert before == ([first], [citing], ["2030-01-01T09:00", "2030-01-02T09:00"])
+    journal.execute(BulkDeleteCommand([first, second]))
+    assert db.get_task_by_id(first) is None and db.get_task_by_id(second) is None
+    assert db.links.get_backlinks(first) == []
+
+    journal.undo()
+    assert db.get_task_by_id(first)['title'] == "Альфа" and db.get_task_by_id(second)['title'] == "Бета"
+    assert state() == before
+    journal.redo()
+    assert db.get_task_by_id(second) is None
+    journal.undo()
+    assert state() == before
+    assert db.add_task("Новая") > citing  # Удаленные ID не выдаются заново
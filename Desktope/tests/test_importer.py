@@ -0,0 +1,96 @@
+# test_importer.py
+
+import json
+
+import pytest
+
+import importer
+from importer import BulkImporter, iter_source
+
+
+def titles(db):
+    return sorted(row[0] for row in db.conn.execute("SELECT title FROM tasks"))
+
+
+def test_csv_with_aliases_and_semicolons(db, tmp_path):
+    path = tmp_path / "tasks.csv"
+    path.write_text("Name;Description;Labels;Deadline;Starred;Done\n"
+                    "Отчет;Квартальный;работа, срочно ;31.12.2030;yes;0\n"
+                    ";без названия;;;;\n", encoding='utf-8-sig')
+    state = BulkImporter(db).import_path(str(path))
+    assert (state['imported'], state['skipped']) == (1, 1)
+    task = db.get_tasks('tag', 'срочно')[0]
+    assert (task['title'], task['due_date'], task['is_important']) == ("Отчет", "2030-12-31", 1)
+    assert db.get_task_by_id(task['id'])['details'] == "Квартальный"
+
+
+def test_json_lines_and_json_array(db, tmp_path, monkeypatch):
+    lines = tmp_path / "tasks.jsonl"
+    lines.write_text('{"title": "Первая", "tags": ["a", "b"]}\n\n{"title": "Вторая"}\n', encoding='utf-8')
+    array = tmp_path / "export.json"
+    # Маленькие порции: элементы массива разрываются границей чтения
+    monkeypatch.setattr(importer, 'JSON_CHUNK_SIZE', 7)
+    records = [{"title": f"Из массива {i}", "details": "текст, с ] и [скобками]"} for i in range(3)]
+    array.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    assert [record['title'] for record in iter_source(str(lines))] == ["Первая", "Вторая"]
+    assert list(iter_source(str(array))) == records
+    BulkImporter(db).import_path(str(array))
+    assert "Из массива 2" in titles(db)
+
+
+def test_broken_json_array_is_an_error(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('[{"title": "Первая"} {"title": "Вторая"}]', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_source(str(path)))
+
+
+def test_markdown_front_matter_and_heading(db, tmp_path):
+    (tmp_path / "notes" / "sub").mkdir(parents=True)
+    (tmp_path / "notes" / "a.md").write_text(
+        "---\ntitle: Заметка А\ntags: [x, y]\ndue: 2030-01-05\n---\nТело [[Заметка Б]]", encoding='utf-8')
+    (tmp_path / "notes" / "sub" / "b.md").write_text("# Заметка Б\n\nВторая", encoding='utf-8')
+    (tmp_path / "notes" / "skip.txt").write_text("не заметка", encoding='utf-8')
+
+    BulkImporter(db).import_path(str(tmp_path / "notes"))
+    task = db.get_tasks('tag', 'y')[0]
+    assert (task['title'], task['due_date']) == ("Заметка А", "2030-01-05")
+    by_title = dict(db.conn.execute("SELECT title, id FROM tasks").fetchall())
+    assert db.get_task_by_id(by_title["Заметка Б"])['details'] == "Вторая"
+    assert [task['id'] for task in db.links.get_backlinks(by_title["Заметка Б"])] == [by_title["Заметка А"]]
+
+
+def test_interrupted_import_resumes(db, tmp_path):
+    path = tmp_path / "tasks.csv"
+    path.write_text("title\n" + "".join(f"Задача {i}\n" for i in range(10)), encoding='utf-8')
+    state = BulkImporter(db, batch_size=3).import_path(str(path), should_stop=lambda: True)
+    assert state['interrupted'] and state['imported'] == 3
+
+    state = BulkImporter(db, batch_size=3).import_path(str(path))
+    assert not state['interrupted']
+    assert (state['position'], state['imported']) == (10, 10)
+    assert len([title for title in titles(db) if title.startswith("Задача ")]) == 10
+
+
+def test_duplicates_of_imported_and_manual_tasks_are_skipped(db, tmp_path):
+    db.add_task("Вручную", details="текст", tags="a, b", due_date="2030-01-01")
+    # Задача из БД, созданной до появления хэша содержимого
+    seed_id = db.conn.execute("SELECT id FROM tasks WHERE title = 'Поприветствовать Zettelkasten!'").fetchone()[0]
+    db.conn.execute("UPDATE tasks SET content_hash = NULL WHERE id = ?", (seed_id,))
+    db.conn.commit()
+    path = tmp_path / "tasks.jsonl"
+    records = [
+        {"title": "Вручную", "details": "текст", "tags": "a,b", "due_date": "2030-01-01"},
+        {"title": "Поприветствовать Zettelkasten!", "tags": "Начало, Zettelkasten",
+         "details": db.get_task_by_id(seed_id)['details']},
+        {"title": "Новая"},
+        {"title": "Новая"},
+    ]
+    path.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records), encoding='utf-8')
+
+    state = BulkImporter(db).import_path(str(path))
+    assert (state['imported'], state['duplicates']) == (1, 3)
+    state = BulkImporter(db).import_path(str(path))  # Повторный импорт того же файла
+    assert (state['imported'], state['duplicates']) == (0, 4)
+    assert titles(db).count("Вручную") == titles(db).count("Новая") == 1
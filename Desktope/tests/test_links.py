@@ -0,0 +1,99 @@
+# test_links.py
+
+import sqlite3
+
+from database import DatabaseManager
+
+
+def outgoing_titles(db, task_id):
+    return [task['title'] for task in db.links.get_outgoing(task_id)]
+
+
+def test_dangling_title_link_resolves_when_task_is_added(db):
+    source_id = db.add_task("Источник", details="См. [[Будущая]]")
+    assert outgoing_titles(db, source_id) == []
+
+    target_id = db.add_task("Будущая")
+    assert outgoing_titles(db, source_id) == ["Будущая"]
+    assert [task['id'] for task in db.links.get_backlinks(target_id)] == [source_id]
+
+
+def test_rename_moves_title_links(db):
+    old_ref = db.add_task("Старая ссылка", details="[[Черновик]]")
+    new_ref = db.add_task("Новая ссылка", details="[[План]]")
+    target_id = db.add_task("Черновик")
+    assert outgoing_titles(db, old_ref) == ["Черновик"]
+
+    db.update_task(target_id, {'title': "План"})
+    assert outgoing_titles(db, old_ref) == []
+    assert outgoing_titles(db, new_ref) == ["План"]
+
+    db.apply_field_changes([(target_id, 'title', "Черновик")])
+    assert outgoing_titles(db, old_ref) == ["Черновик"]
+    assert outgoing_titles(db, new_ref) == []
+
+
+def test_undo_delete_restores_title_links(db):
+    source_id = db.add_task("Источник", details="[[Цель]]")
+    target_id = db.add_task("Цель")
+    snapshots = db.delete_tasks([target_id])
+    assert outgoing_titles(db, source_id) == []
+
+    db.restore_tasks(snapshots)
+    assert outgoing_titles(db, source_id) == ["Цель"]
+
+
+def test_refs_backfilled_for_existing_database(db_path):
+    db = DatabaseManager(db_path)
+    source_id = db.add_task("Источник", details="[[Позже]]")
+    db.close()
+    # БД предыдущей версии: ссылки уже есть в деталях, таблицы link_refs еще нет
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE link_refs")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_path)
+    try:
+        db.add_task("Позже")
+        assert outgoing_titles(db, source_id) == ["Позже"]
+    finally:
+        db.close()
+
+
+def chain(db, titles):
+    """Задачи, каждая из которых ссылается на следующую: [[ID]]."""
+    ids = [db.add_task(title) for title in titles]
+    for source_id, target_id in zip(ids, ids[1:]):
+        db.update_task(source_id, {'details': f"Дальше: [[{target_id}]]"})
+    return ids
+
+
+def test_traverse_respects_depth_in_both_directions(db):
+    a, b, c, d, e = chain(db, "ABCDE")
+    assert db.links.get_neighbors(c) == {b, d}
+    assert db.links.traverse(c, max_depth=0) == {c: 0}
+    assert db.links.traverse(c, max_depth=1) == {c: 0, b: 1, d: 1}
+    assert db.links.traverse(a, max_depth=3) == {a: 0, b: 1, c: 2, d: 3}
+    assert db.links.traverse(e, max_depth=100) == {e: 0, d: 1, c: 2, b: 3, a: 4}
+    assert len(db.links.traverse(a, max_depth=2, limit=2)) == 2
+
+
+def test_traverse_cycle_keeps_shortest_distance(db):
+    a, b, c, d = chain(db, "ABCD")
+    db.update_task(d, {'details': f"[[{c}]] и обратно к [[{a}]]"})  # Цикл A → B → C → D → A
+    assert db.links.traverse(a, max_depth=5) == {a: 0, b: 1, d: 1, c: 2}
+    assert db.links.traverse(b, max_depth=5) == {b: 0, a: 1, c: 1, d: 2}
+
+
+def test_task_graph_includes_archived_neighbors(db):
+    a, b, c = chain(db, ["Начало", "Середина", "Конец"])
+    db.update_task_status(c, 1)
+    db.archive.archive_completed(older_than_days=-1)
+    assert db.archive.contains(c)
+
+    nodes, edges = db.links.get_task_graph(a, max_depth=2)
+    assert [(node['title'], node['distance']) for node in nodes] == [("Начало", 0), ("Середина", 1), ("Конец", 2)]
+    assert sorted(edges) == sorted([(a, b), (b, c)])
+    nodes, edges = db.links.get_task_graph(a, max_depth=1)
+    assert [node['id'] for node in nodes] == [a, b] and edges == [(a, b)]
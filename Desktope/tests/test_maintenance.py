@@ -0,0 +1,67 @@
+# test_maintenance.py
+
+import sqlite3
+
+import maintenance
+
+
+def fill_and_delete(db, count=300):
+    """Создает и удаляет задачи с длинными деталями, оставляя свободные страницы в файле."""
+    ids = [db.add_task(f"Задача {i}", details=f"{i} " + "текст без повторов " * 40) for i in range(count)]
+    db.delete_tasks(ids)
+
+
+def test_run_analyzes_and_reclaims_free_pages(db):
+    fill_and_delete(db)
+    assert db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # Новая БД сразу incremental
+    assert db.conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    assert db.maintenance.is_due()
+
+    report = db.maintenance.run()
+
+    stats = report['schemas']['main']
+    tables = db.conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchone()[0]
+    assert stats['analyzed'] == tables
+    assert db.conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    assert stats['free_pages_before'] > 0 and stats['free_pages_after'] == 0
+    assert stats['reclaimed_bytes'] == stats['free_pages_before'] * stats['page_size']
+    assert report['integrity'] == [] and report['completed']
+    assert db.maintenance.last_report()['completed']
+    assert not db.maintenance.is_due()
+
+
+def test_interrupted_run_is_not_completed(db):
+    fill_and_delete(db, count=50)
+    report = db.maintenance.run(should_continue=lambda: False)
+    assert not report['completed']
+    assert report['integrity'] is None  # Проверка прервана, а не пройдена
+    assert report['schemas']['main']['analyzed'] == 0
+    assert db.maintenance.is_due()
+
+
+def test_vacuum_steps_stay_small(db, monkeypatch):
+    monkeypatch.setattr(maintenance, 'VACUUM_START_PAGES', 1)
+    fill_and_delete(db)
+    free = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+    report = db.maintenance.run()
+    # Порции растут от одной страницы, а не освобождают все место одним шагом
+    assert report['steps'] > report['schemas']['main']['analyzed'] + 1
+    assert report['schemas']['main']['free_pages_after'] == 0 and free > 1
+
+
+def test_quick_check_reports_errors(db, db_path):
+    db.conn.execute("CREATE TABLE probe (value)")
+    db.conn.execute("INSERT INTO probe VALUES (NULL)")
+    db.conn.commit()
+    # Схема, которой не соответствуют данные: NULL в колонке NOT NULL
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA writable_schema = ON")
+    conn.execute("UPDATE sqlite_master SET sql = 'CREATE TABLE probe (value NOT NULL)' WHERE name = 'probe'")
+    conn.commit()
+    conn.close()
+
+    report = db.maintenance.run()
+    assert report['integrity'] and all(error.startswith("main.probe:") for error in report['integrity'])
+    # Проход завершен, ошибки сохраняются в журнале запусков для показа пользователю
+    assert db.maintenance.last_report()['integrity'] == report['integrity']
@@ -0,0 +1,15 @@
+# test_recurrence.py
+
+import datetime
+
+
+def test_completed_occurrence_in_completed_between_report(db):
+    today = datetime.date.today().isoformat()
+    series_id = db.add_task("Зарядка", due_date=today, recurrence_rule="FREQ=DAILY")
+    task_id = db.complete_occurrence(series_id, today)
+
+    completed = db.get_tasks('completed_between', start_date=today, end_date=today)
+    assert [task['id'] for task in completed] == [task_id]
+    assert completed[0]['due_date'] == today
+    assert [change['new_value'] for change in db.changelog.get_task_history(task_id)
+            if change['field'] == 'is_completed'] == [1]
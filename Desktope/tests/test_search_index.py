@@ -0,0 +1,57 @@
+# test_search_index.py
+
+import search_index
+
+
+def found_titles(db, query):
+    db.search_index.refresh()
+    return [task['title'] for _, task in db.search_index.search(query)]
+
+
+def test_short_query_with_one_typo(db):
+    db.add_task("Daily")
+    db.add_task("Weekly review")
+    db.add_task("Задача")
+    for query, title in [("dayli", "Daily"), ("daly", "Daily"), ("zadcha", "Задача")]:
+        titles = found_titles(db, query)
+        assert titles[0] == title and "Weekly review" not in titles
+    assert found_titles(db, "xyz") == []
+
+
+def test_completed_tasks_do_not_crowd_out_candidates(db):
+    completed = [db.add_task("Daily report") for _ in range(search_index.CANDIDATE_LIMIT + 50)]
+    db.bulk_set_field(completed, 'is_completed', 1)
+    open_id = db.add_task("Daily")
+    db.search_index.refresh()
+    assert [task['id'] for _, task in db.search_index.search("daily report")] == [open_id]
+
+
+def test_interrupted_rebuild_resumes(db, monkeypatch):
+    monkeypatch.setattr(search_index, 'REFRESH_BATCH_SIZE', 2)
+    for i in range(5):
+        db.add_task(f"Заметка {i}")
+    db.search_index.reset()
+
+    steps = iter([True, True])
+    db.search_index.refresh(lambda: next(steps, False))
+    assert db.search_index.watermark() is None   # Построение прервано на середине
+    renamed = db.add_task("Черновик")
+    db.update_task(renamed, {'title': "Протокол"})
+
+    db.search_index.refresh()
+    assert not db.search_index.is_stale()
+    assert len(found_titles(db, "заметка")) == 5
+    assert found_titles(db, "протокол") == ["Протокол"]
+    assert found_titles(db, "черновик") == []
+
+
+def test_search_does_not_catch_up_the_index(db):
+    db.search_index.refresh()
+    db.add_task("Квартальный отчет")
+    watermark = db.search_index.watermark()
+    changes = db.conn.total_changes
+
+    assert db.search_tasks("квартальный", fuzzy=True) == []  # Индекс догонит фоновый проход
+    assert (db.search_index.watermark(), db.conn.total_changes) == (watermark, changes)
+    assert not db.conn.in_transaction and db.search_index.is_stale()
+    assert found_titles(db, "квартальный") == ["Квартальный отчет"]
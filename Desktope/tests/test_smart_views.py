@@ -0,0 +1,62 @@
+# test_smart_views.py
+
+import datetime
+
+from smart_views import view_window
+
+SUNDAY = datetime.date(2030, 1, 6)
+WEDNESDAY = datetime.date(2030, 1, 2)
+
+
+def titles(db, view, today):
+    return [task['title'] for task in db.smart_views.tasks(view, today)
+            if task['title'] != "Поприветствовать Zettelkasten!"]
+
+
+def counts(db, today):
+    return db.smart_views.counts(today)
+
+
+def test_this_week_is_empty_on_sunday(db):
+    db.add_task("Сегодня", due_date=SUNDAY.isoformat())
+    db.add_task("Следующая неделя", due_date="2030-01-07")
+    db.add_task("Зарядка", due_date="2030-01-05", recurrence_rule="FREQ=DAILY")
+
+    start, end = view_window('week', SUNDAY)
+    assert start > end
+    assert titles(db, 'week', SUNDAY) == []
+    assert counts(db, SUNDAY)['week'] == 0
+    assert sorted(titles(db, 'today', SUNDAY)) == ["Зарядка", "Сегодня"]
+    # В среду в неделю попадают дни с четверга по воскресенье; серия начинается в субботу
+    assert titles(db, 'week', WEDNESDAY).count("Зарядка") == 2
+    assert "Сегодня" in titles(db, 'week', WEDNESDAY) and "Следующая неделя" not in titles(db, 'week', WEDNESDAY)
+
+
+def test_completed_task_due_today_leaves_the_list(db):
+    today = WEDNESDAY.isoformat()
+    task_id = db.add_task("Отчет", due_date=today)
+    series_id = db.add_task("Зарядка", due_date=today, recurrence_rule="FREQ=DAILY")
+    assert sorted(titles(db, 'today', WEDNESDAY)) == ["Зарядка", "Отчет"]
+    today_count = counts(db, WEDNESDAY)['today']
+
+    db.update_task_status(task_id, 1)
+    db.complete_occurrence(series_id, today)
+    assert titles(db, 'today', WEDNESDAY) == []
+    assert counts(db, WEDNESDAY)['today'] == today_count - 2
+    assert "Зарядка" in titles(db, 'week', WEDNESDAY)  # Следующие вхождения серии остаются
+
+
+def test_cache_follows_the_day_without_changes(db):
+    db.add_task("Отчет", due_date=WEDNESDAY.isoformat())
+    seq = db.changelog.last_seq()
+    tuesday = WEDNESDAY - datetime.timedelta(days=1)
+    thursday = WEDNESDAY + datetime.timedelta(days=1)
+
+    assert titles(db, 'today', WEDNESDAY) == ["Отчет"]
+    assert titles(db, 'today', thursday) == []
+    assert titles(db, 'overdue', thursday) == ["Отчет"]
+    assert titles(db, 'week', tuesday) == ["Отчет"]
+    assert counts(db, WEDNESDAY)['overdue'] + 1 == counts(db, thursday)['overdue']
+    assert counts(db, tuesday)['week'] == counts(db, WEDNESDAY)['week'] + 1
+    assert titles(db, 'today', WEDNESDAY.isoformat()) == ["Отчет"]  # Дата строкой, как из таймера полуночи
+    assert db.changelog.last_seq() == seq
@@ -0,0 +1,78 @@
+# test_text_index.py
+
+import pytest
+
+import text_index
+from details_store import decode_details
+
+LONG = "Протокол совещания. " * 100  # Длиннее порога сжатия
+
+
+@pytest.fixture
+def decoded(db):
+    """Счетчик распаковок деталей в SQL-запросах."""
+    calls = []
+
+    def counting(body, compressed):
+        calls.append(compressed)
+        return decode_details(body, compressed)
+
+    db.conn.create_function('details_text', 2, counting, deterministic=True)
+    return calls
+
+
+def search_ids(db, query):
+    return sorted(task['id'] for task in db.search_tasks(query))
+
+
+def scan_ids(db, query):
+    """Результат поиска без индекса — распаковкой всех деталей."""
+    available, db.text_index._available = db.text_index._available, False
+    try:
+        return search_ids(db, query)
+    finally:
+        db.text_index._available = available
+
+
+def test_miss_does_not_decompress(db, decoded):
+    for i in range(5):
+        db.add_task(f"Задача {i}", details=LONG + f"шифр-{i}")
+    db.text_index.refresh()
+    decoded.clear()
+    assert search_ids(db, "нет такого") == []
+    assert decoded == []
+    assert len(search_ids(db, "шифр-3")) == 1
+    assert len(decoded) == 1
+
+
+def test_results_match_full_scan(db):
+    ids = [db.add_task(f"Задача {i}", details=LONG + f"Код ABC-{i}") for i in range(6)]
+    db.add_task("Короткая", details="код abc-1 без сжатия")
+    db.text_index.refresh()
+    # Изменения после водяного знака индекс еще не видел — такие задачи проверяются распаковкой
+    db.update_task(ids[0], {'details': LONG + "новый код abc-9"})
+    db.delete_tasks([ids[1]])
+    db.add_task("Новая", details=LONG + "ABC-1")
+    for query in ("abc-1", "ABC-9", "код", "a_c-2", "ab", "Протокол", "совещания. Протокол"):
+        assert search_ids(db, query) == scan_ids(db, query), query
+
+
+def test_search_during_rebuild_and_garbage_rebuild(db, monkeypatch):
+    monkeypatch.setattr(text_index, 'REFRESH_BATCH_SIZE', 2)
+    monkeypatch.setattr(text_index, 'MIN_GARBAGE_DOCS', 1)
+    ids = [db.add_task(f"Задача {i}", details=LONG + f"метка-{i}") for i in range(5)]
+    steps = iter([True, True])
+    db.text_index.refresh(lambda: next(steps, False))
+    assert db.text_index.watermark() is None   # Построение прервано на середине
+    assert search_ids(db, "метка-4") == [ids[4]]
+
+    db.text_index.refresh()
+    for i in range(6):
+        db.update_task(ids[0], {'details': LONG + f"правка-{i}"})
+        db.text_index.refresh()
+    # Отвязанных документов стало больше, чем живых: индекс построен заново
+    assert db.text_index._state()['garbage'] == 0
+    assert db.conn.execute("SELECT COUNT(*) FROM details_fts_docs").fetchone()[0] == 5
+    assert not db.text_index.is_stale()
+    assert search_ids(db, "правка-5") == [ids[0]]
+    assert search_ids(db, "метка-0") == search_ids(db, "правка-4") == []
@@ -0,0 +1,56 @@
+# test_workspaces.py
+
+import sqlite3
+
+import pytest
+
+from workspaces import WorkspaceManager, WorkspaceRegistry
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = WorkspaceManager(WorkspaceRegistry(str(tmp_path / "workspaces.json"), str(tmp_path / "main.db")))
+    manager.open(manager.registry.active).add_task("Основная заметка")
+    yield manager
+    manager.close_all()
+
+
+def make_old_database(path):
+    """БД первой версии приложения: детали в tasks, без журнала и индексов."""
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, details TEXT,
+                    tags TEXT, due_date TEXT, is_completed BOOLEAN DEFAULT 0, is_important BOOLEAN DEFAULT 0,
+                    created_at TEXT NOT NULL)''')
+    conn.execute("INSERT INTO tasks (title, details, created_at) VALUES ('Старая', 'заметка из прошлого', '2024-01-01')")
+    conn.commit()
+    conn.close()
+
+
+def search(manager, query, fuzzy=False):
+    results = list(manager.search_everywhere(query, fuzzy))
+    errors = {entry['name']: error for _, entry, error in results if error is not None}
+    return sorted(task['title'] for task in results[-1][0]), errors
+
+
+def test_search_migrates_old_workspace(manager, tmp_path):
+    make_old_database(tmp_path / "old.db")
+    manager.registry.add(str(tmp_path / "old.db"))
+    assert search(manager, "заметка") == (["Основная заметка", "Старая"], {})
+    assert search(manager, "zametka", fuzzy=True)[1] == {}
+
+
+def test_missing_workspace_reported_separately(manager, tmp_path):
+    manager.registry.add(str(tmp_path / "gone.db"))
+    titles, errors = search(manager, "заметка")
+    assert titles == ["Основная заметка"]
+    assert list(errors) == ["gone"]
+    assert not (tmp_path / "gone.db").exists()
+
+
+def test_broken_pool_is_recreated(manager):
+    assert search(manager, "заметка") == (["Основная заметка"], {})
+    for process in list(manager._pool._processes.values()):
+        process.kill()
+        process.join()
+    search(manager, "заметка")  # Запрос к сломанному пулу завершается ошибкой пространства или новым пулом
+    assert search(manager, "заметка") == (["Основная заметка"], {})
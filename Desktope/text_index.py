@@ -0,0 +1,221 @@
+# text_index.py
+
+import json
+import re
+import sqlite3
+
+from changelog import ChangeLog
+from details_store import decode_details
+
+# Изменения, после которых документ задачи пересоздается или удаляется
+INDEXED_CHANGES = ('created', 'details', 'deleted', 'archived', 'restored')
+# Изменения, после которых сжатые детали задачи могут совпасть с запросом, хотя индекс их еще не видел
+UNINDEXED_CHANGES = ('created', 'details', 'restored')
+REFRESH_BATCH_SIZE = 500
+MIN_GARBAGE_DOCS = 10000    # Отвязанных документов FTS, при которых индекс уже стоит перестроить
+MAX_QUERY_TRIGRAMS = 16     # Больше условий почти не сужает выборку, но замедляет запрос
+MIN_SQLITE_VERSION = (3, 34, 0)  # Токенизатор trigram появился в FTS5 SQLite 3.34
+
+# Сжатые детали задач основной таблицы — только их поиск распаковывал бы
+TEXT_SQL = "SELECT task_id, details_text(body, compressed) FROM task_details WHERE compressed"
+
+
+def like_trigrams(query):
+    """Триграммы непрерывных кусков запроса LIKE (между % и _), не больше MAX_QUERY_TRIGRAMS.
+
+    Пустой список — запрос короче трех символов, и индекс ничего не отсеет.
+    """
+    grams = []
+    for part in re.split(r"[%_]", query):
+        grams.extend(part[i:i + 3] for i in range(len(part) - 2))
+    grams = list(dict.fromkeys(grams))
+    step = max(1, len(grams) // MAX_QUERY_TRIGRAMS)
+    return grams[::step][:MAX_QUERY_TRIGRAMS]
+
+
+class DetailsTextIndex:
+    """Триграммный индекс FTS5 по сжатым деталям — фильтр для поиска по подстроке.
+
+    Без него поиск LIKE распаковывал бы детали каждой задачи. Индекс находит
+    надмножество совпадений (все триграммы запроса есть в тексте), которое затем
+    проверяется обычным LIKE, поэтому результаты поиска не меняются. Несжатые
+    детали LIKE проверяет и без распаковки, они в индекс не входят.
+
+    Таблица FTS хранит только индекс, без текста (content=''), а удалить из нее
+    документ можно лишь по прежнему тексту. Поэтому при изменении деталей документ
+    задачи не удаляется, а отвязывается (details_fts_docs) и добавляется заново;
+    когда отвязанных документов становится больше, чем живых, индекс перестраивается.
+    Индекс догоняет журнал изменений порциями, как TrigramIndex; задачи, изменившиеся
+    после водяного знака, поиск проверяет распаковкой.
+    """
+    def __init__(self, conn, changelog, readonly=False, db_name=None):
+        self.conn = conn
+        self.changelog = changelog
+        self.readonly = readonly
+        self.db_name = db_name  # Для обновления из фонового потока (refresh_detached)
+        self._available = None
+
+    def create_schema(self):
+        """Создает таблицу FTS5, привязку ее документов к задачам и состояние индекса."""
+        self._available = False
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            return  # Поиск распаковывает детали, как раньше
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS details_fts USING fts5(body, content='', detail=none, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            return  # SQLite собран без FTS5
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS details_fts_docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_details_fts_docs_task ON details_fts_docs (task_id)")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS details_fts_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        self._available = True
+
+    def available(self):
+        """Есть ли индекс в этой БД (на чтение БД открывается без create_schema)."""
+        if self._available is None:
+            self._available = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'details_fts_state'").fetchone() is not None
+        return self._available
+
+    def _state(self):
+        return dict(self.conn.execute("SELECT key, value FROM details_fts_state").fetchall())
+
+    def watermark(self):
+        """Последнее учтенное изменение журнала; None — индекса нет или он еще строится."""
+        if not self.available():
+            return None
+        return self._state().get('last_seq')
+
+    def reset(self):
+        """Забывает состояние индекса: следующий refresh() построит его заново."""
+        if self.available():
+            with self.conn:
+                self.conn.execute("DELETE FROM details_fts_state")
+
+    def is_stale(self):
+        """Есть ли изменения журнала, которые индекс еще не учел."""
+        if not self.available():
+            return False
+        watermark = self.watermark()
+        return watermark is None or watermark < self.changelog.last_seq()
+
+    def candidates(self, query):
+        """Что проверять распаковкой при поиске LIKE '%query%' по сжатым деталям.
+
+        Возвращает (ID задач, граница): сжатые детали задач из множества или с ID
+        больше границы (индекс еще строится; None — построен) могут совпасть с
+        запросом, остальные заведомо не совпадают. None — индекс не поможет и
+        распаковать нужно все.
+        """
+        grams = like_trigrams(query)
+        if not grams or not self.available():
+            return None
+        try:
+            state = self._state()
+            watermark = state.get('last_seq', state.get('rebuild_seq'))
+            if watermark is None:
+                return None
+            match = " AND ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+            task_ids = {row[0] for row in self.conn.execute('''
+                SELECT docs.task_id FROM details_fts JOIN details_fts_docs AS docs ON docs.doc_id = details_fts.rowid
+                WHERE details_fts MATCH ?
+            ''', (match,))}
+        except sqlite3.OperationalError:
+            return None  # БД создана SQLite с FTS5, а открыта без него
+        placeholders = ", ".join("?" for _ in UNINDEXED_CHANGES)
+        task_ids.update(row[0] for row in self.conn.execute(
+            f"SELECT task_id FROM task_changes WHERE seq > ? AND field IN ({placeholders})",
+            (watermark, *UNINDEXED_CHANGES)))
+        return task_ids, state.get('rebuild_id')
+
+    def refresh(self, should_continue=None):
+        """Догоняет журнал изменений порциями; возвращает число обработанных задач (см. TrigramIndex.refresh)."""
+        if self.readonly or not self.available():
+            return 0
+        count = 0
+        while should_continue is None or should_continue():
+            done = self._step()
+            if done is None:
+                break
+            count += done
+        return count
+
+    def refresh_detached(self, should_continue=None):
+        """Выполняет refresh() через собственное соединение; безопасно вызывать из фонового потока."""
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.create_function('details_text', 2, decode_details, deterministic=True)
+            return DetailsTextIndex(conn, ChangeLog(conn)).refresh(should_continue)
+        finally:
+            conn.close()
+
+    def _step(self):
+        """Выполняет одну порцию построения или обновления индекса; None — индекс актуален."""
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._state()
+            done = self._rebuild_step(state) if 'last_seq' not in state else self._refresh_step(state)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return done
+
+    def _rebuild_step(self, state):
+        """Индексирует очередные REFRESH_BATCH_SIZE задач со сжатыми деталями по возрастанию ID."""
+        if 'rebuild_seq' not in state:
+            self.conn.execute("INSERT INTO details_fts (details_fts) VALUES ('delete-all')")
+            self.conn.execute("DELETE FROM details_fts_docs")
+            state = {'rebuild_seq': self.changelog.last_seq(), 'rebuild_id': 0}
+        rows = self.conn.execute(f"{TEXT_SQL} AND task_id > ? ORDER BY task_id LIMIT ?",
+                                 (state['rebuild_id'], REFRESH_BATCH_SIZE)).fetchall()
+        if not rows:
+            self.conn.execute("DELETE FROM details_fts_state")
+            self._set_state(last_seq=state['rebuild_seq'], garbage=0)
+            return 0
+        self._add_documents(rows)
+        self._set_state(rebuild_seq=state['rebuild_seq'], rebuild_id=rows[-1][0])
+        return len(rows)
+
+    def _refresh_step(self, state):
+        """Пересоздает документы задач из очередных REFRESH_BATCH_SIZE записей журнала."""
+        placeholders = ", ".join("?" for _ in INDEXED_CHANGES)
+        rows = self.conn.execute(
+            f"SELECT seq, task_id FROM task_changes WHERE seq > ? AND field IN ({placeholders}) ORDER BY seq LIMIT ?",
+            (state['last_seq'], *INDEXED_CHANGES, REFRESH_BATCH_SIZE)).fetchall()
+        if not rows:
+            if (last_seq := self.changelog.last_seq()) > state['last_seq']:
+                self._set_state(last_seq=last_seq)
+            return None
+        task_ids = {row[1] for row in rows}
+        changed = json.dumps(list(task_ids))
+        garbage = state.get('garbage', 0) + self.conn.execute(
+            "DELETE FROM details_fts_docs WHERE task_id IN (SELECT value FROM json_each(?))", (changed,)).rowcount
+        self._add_documents(self.conn.execute(
+            f"{TEXT_SQL} AND task_id IN (SELECT value FROM json_each(?))", (changed,)).fetchall())
+        self._set_state(last_seq=rows[-1][0], garbage=garbage)
+        live = self.conn.execute("SELECT COUNT(*) FROM details_fts_docs").fetchone()[0]
+        if garbage > max(MIN_GARBAGE_DOCS, live):
+            self.conn.execute("DELETE FROM details_fts_state")  # Следующая порция начнет построение заново
+        return len(task_ids)
+
+    def _add_documents(self, rows):
+        """Добавляет в FTS документы для пар (task_id, текст)."""
+        for task_id, text in rows:
+            doc_id = self.conn.execute("INSERT INTO details_fts_docs (task_id) VALUES (?)", (task_id,)).lastrowid
+            self.conn.execute("INSERT INTO details_fts (rowid, body) VALUES (?, ?)", (doc_id, text))
+
+    def _set_state(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO details_fts_state (key, value) VALUES (?, ?)", values.items())
@@ -0,0 +1,260 @@
+# workspaces.py
+
+import datetime
+import heapq
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from database import DatabaseManager
+
+WORKSPACES_FILE = "workspaces.json"   # Список рабочих пространств рядом с БД по умолчанию
+DEFAULT_DB = "zettelkasten.db"
+MAX_OPEN_WORKSPACES = 8     # Сколько БД держать открытыми для быстрого переключения
+MAX_SEARCH_WORKERS = os.cpu_count() or 4  # Больше процессов, чем ядер, поиск по БД не ускоряет
+
+# Соединения только для чтения внутри процесса-исполнителя: путь -> DatabaseManager
+_readers = {}
+
+
+def workspace_name(path):
+    """Название рабочего пространства по умолчанию — имя файла БД без расширения."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _created_key(task):
+    """Ключ сортировки «сначала новые» для слияния уже отсортированных списков."""
+    try:
+        return -datetime.datetime.fromisoformat(task['created_at']).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def search_sort_key(task):
+    """Порядок результатов поиска: сходство нечеткого поиска или порядок search_tasks."""
+    if 'search_score' in task:
+        return (-task['search_score'],)
+    return (not task['is_important'], task['due_date'] is not None, task['due_date'] or '', _created_key(task))
+
+
+def report_sort_key(task):
+    """Порядок отчета: по сроку, затем новые (как ORDER BY due_date ASC, created_at DESC)."""
+    return (task['due_date'] or '', _created_key(task))
+
+
+def _reader(path):
+    """Соединение исполнителя с БД рабочего пространства; остается открытым между запросами.
+
+    Соединение только для чтения не выполняет миграций: до отправки запроса
+    их выполняет основной процесс (WorkspaceManager.ensure_migrated).
+    """
+    if path not in _readers:
+        _readers[path] = DatabaseManager(path, readonly=True)
+    return _readers[path]
+
+
+def search_workspace(path, query, fuzzy=False):
+    """Поиск в одной БД (выполняется в процессе пула); результат отсортирован по search_sort_key.
+
+    Соединение только для чтения не обновляет триграммный индекс: нечеткий поиск
+    видит изменения, уже проиндексированные приложением, открывшим эту БД.
+    """
+    db = _reader(path)
+    if fuzzy:
+        tasks = [dict(task, search_score=score) for score, task in db.search_index.search(query)]
+        db.recurrence.apply_next_occurrences(tasks)
+    else:
+        tasks = db.search_tasks(query)
+    return sorted(tasks, key=search_sort_key)
+
+
+def report_workspace(path, start_date, end_date, completed_only=False):
+    """Задачи отчета одной БД с полными деталями (выполняется в процессе пула)."""
+    db = _reader(path)
+    filter_by = 'completed_between' if completed_only else 'date_range'
+    tasks = db.load_details(db.get_tasks(filter_by=filter_by, start_date=start_date, end_date=end_date))
+    return sorted(tasks, key=report_sort_key)
+
+
+class WorkspaceRegistry:
+    """Список рабочих пространств (файлов БД) и активное пространство в JSON-файле."""
+    def __init__(self, path=WORKSPACES_FILE, default_db=DEFAULT_DB):
+        self.path = path
+        self.entries = []
+        self.active = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = [{'name': entry['name'], 'path': entry['path']} for entry in data.get('workspaces', [])]
+            self.active = data.get('active')
+        if not self.entries:
+            self.add(default_db)
+        if self.find(self.active) is None:
+            self.active = self.entries[0]['path']
+
+    def save(self):
+        """Записывает список атомарно: через временный файл и замену."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'workspaces': self.entries, 'active': self.active}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def find(self, path):
+        """Запись рабочего пространства по пути к БД или None."""
+        if path is None:
+            return None
+        path = os.path.abspath(path)
+        return next((entry for entry in self.entries if entry['path'] == path), None)
+
+    def add(self, db_path, name=None):
+        """Добавляет БД в список (повторно не добавляет); возвращает ее запись."""
+        if entry := self.find(db_path):
+            return entry
+        entry = {'name': name or workspace_name(db_path), 'path': os.path.abspath(db_path)}
+        self.entries.append(entry)
+        self.save()
+        return entry
+
+    def remove(self, db_path):
+        """Убирает БД из списка (сам файл не удаляется); последнее пространство убрать нельзя."""
+        entry = self.find(db_path)
+        if entry is None or len(self.entries) == 1:
+            return False
+        self.entries.remove(entry)
+        if self.active == entry['path']:
+            self.active = self.entries[0]['path']
+        self.save()
+        return True
+
+    def set_active(self, db_path):
+        self.active = os.path.abspath(db_path)
+        self.save()
+
+
+class WorkspaceManager:
+    """Открытые рабочие пространства и поиск/отчеты сразу по всем.
+
+    Недавно использованные БД остаются открытыми (не больше MAX_OPEN_WORKSPACES),
+    поэтому переключение не повторяет миграции и прогрев кэшей. Запросы «по всем
+    пространствам» раздаются пулу процессов — по исполнителю на БД, но не больше
+    MAX_SEARCH_WORKERS, — а уже отсортированные ответы сливаются по мере готовности.
+    Пока БД не больше, чем ядер, общее время близко ко времени запроса к самой
+    большой из них; остальные БД ждут освободившегося исполнителя.
+    """
+    def __init__(self, registry, max_open=MAX_OPEN_WORKSPACES):
+        self.registry = registry
+        self.max_open = max_open
+        self._open = OrderedDict()  # путь -> DatabaseManager, от давно использованных к недавним
+        self._pool = None
+        self._pool_size = 0
+        self._migrated = set()  # Пути БД, схема которых обновлена в этом сеансе
+
+    def open(self, db_path):
+        """Возвращает открытый DatabaseManager пространства, открывая БД при необходимости."""
+        path = os.path.abspath(db_path)
+        if path not in self._open:
+            self._open[path] = DatabaseManager(path)
+            while len(self._open) > self.max_open:
+                _, db = self._open.popitem(last=False)
+                db.close()
+        self._open.move_to_end(path)
+        return self._open[path]
+
+    def ensure_migrated(self, db_path):
+        """Обновляет схему БД пространства перед запросом из пула, если в этом сеансе ее еще не открывали.
+
+        Исполнители открывают БД только на чтение и без миграций, поэтому БД,
+        созданная прежней версией приложения, иначе ломала бы запрос.
+        """
+        path = os.path.abspath(db_path)
+        if path in self._migrated or path in self._open:
+            return
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл БД не найден: {path}")  # Иначе миграция создала бы пустую БД
+        DatabaseManager(path).close()
+        self._migrated.add(path)
+
+    def is_open(self, db_path):
+        return os.path.abspath(db_path) in self._open
+
+    def close(self, db_path):
+        """Закрывает БД пространства, если она открыта."""
+        if db := self._open.pop(os.path.abspath(db_path), None):
+            db.close()
+
+    def close_all(self):
+        """Закрывает все БД и останавливает пул исполнителей."""
+        for db in self._open.values():
+            db.close()
+        self._open.clear()
+        self._drop_pool(wait=True, cancel_futures=True)
+
+    def _drop_pool(self, wait=False, cancel_futures=False):
+        """Останавливает пул; следующий запрос создаст новый."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self._pool = None
+
+    def _executor(self, workers):
+        # Процессы запускаются через spawn: fork процесса с потоками Qt небезопасен
+        workers = min(max(workers, 1), MAX_SEARCH_WORKERS)
+        if self._pool is None or self._pool_size < workers:
+            self._drop_pool()
+            self._pool_size = workers
+            self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _fan_out(self, func, args, key):
+        """Выполняет func(path, *args) для каждого пространства в пуле процессов.
+
+        Отдает (слитый отсортированный результат по готовым пространствам,
+        запись пространства, ошибка или None) после завершения каждого исполнителя.
+        Ошибка одного пространства (файл не найден, не удалась миграция, упал
+        исполнитель) не прерывает запрос к остальным.
+        """
+        merged = []
+        entries = []
+        for entry in self.registry.entries:
+            try:
+                self.ensure_migrated(entry['path'])
+            except Exception as e:
+                yield merged, entry, e
+                continue
+            entries.append(entry)
+        if not entries:
+            return
+        futures = self._submit(func, entries, args)
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                tasks = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._drop_pool()  # Процесс-исполнитель упал: следующий запрос создаст новый пул
+                yield merged, entry, e
+                continue
+            for task in tasks:
+                task['workspace'], task['workspace_name'] = entry['path'], entry['name']
+            merged = list(heapq.merge(merged, tasks, key=key))
+            yield merged, entry, None
+
+    def _submit(self, func, entries, args):
+        """Отправляет запросы пулу; пул, сломавшийся между запросами, пересоздается."""
+        try:
+            executor = self._executor(len(entries))
+            return {executor.submit(func, entry['path'], *args): entry for entry in entries}
+        except BrokenProcessPool:
+            self._drop_pool()
+            executor = self._executor(len(entries))
+            return {executor.submit(func, entry['path'], *args): entry for entry in entries}
+
+    def search_everywhere(self, query, fuzzy=False):
+        """Поиск по всем пространствам; см. _fan_out."""
+        return self._fan_out(search_workspace, (query, fuzzy), search_sort_key)
+
+    def report_everywhere(self, start_date, end_date, completed_only=False):
+        """Задачи отчета по всем пространствам; см. _fan_out."""
+        return self._fan_out(report_workspace, (start_date, end_date, completed_only), report_sort_key)